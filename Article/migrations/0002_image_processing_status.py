@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('xApiArticle', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articleimagemodel',
+            name='processing_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='ready', editable=False, max_length=10),
+        ),
+    ]
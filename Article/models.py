@@ -10,6 +10,13 @@ from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model 
 
 from core.timestamp import TimeStampModel 
+from core.slugs import save_with_unique_slug
+from core.imageencoding import ImageBudgetError
+from core.imageencoding import encode_within
+from core.imageencoding import load_thumbnail
+from core.imagepipeline import ProcessingStatus
+from core.imagepipeline import enqueue
+from core.imagepipeline import is_new_upload
 
 User = get_user_model()
 
@@ -99,9 +106,7 @@ class ArticleModel(TimeStampModel):
 
 
     def save(self, *args, **kwargs):
-        if not self.slug and self.title:
-            self.slug = slugify(self.title) 
-        super().save(*args, **kwargs)
+        save_with_unique_slug(self, self.title, lambda: super(ArticleModel, self).save(*args, **kwargs))
 
 
     def __str__(self)-> str:
@@ -133,6 +138,7 @@ class ArticleImageModel(TimeStampModel):
     is_primary = models.BooleanField(default=False)
     alt_text = models.CharField(max_length=255, null=True, blank=True)
     uid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    processing_status = models.CharField(max_length=10, choices=ProcessingStatus.choices, default=ProcessingStatus.READY, editable=False)
 
     class Meta:
         ordering = ['-created']
@@ -156,36 +162,20 @@ class ArticleImageModel(TimeStampModel):
         Maintains original format if not JPEG.
         """
         try:
-            with Image.open(self.image) as img:
-                # Convert to RGB if not already
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                # Resize to max 800x800 using LANCZOS for good quality
-                img.thumbnail((800, 800), Image.Resampling.LANCZOS)
+            with load_thumbnail(self.image, (800, 800)) as img:
                 # Determine format
                 orig_format = img.format if img.format in ['JPEG', 'PNG', 'GIF'] else 'JPEG'
-                image_io = BytesIO()
-                quality = 95
-                save_kwargs = {'format': orig_format, 'optimize': True}
-                if orig_format == 'JPEG':
-                    save_kwargs['quality'] = quality
-                img.save(image_io, **save_kwargs)
-                # Compress if larger than 150KB (only for JPEG)
-                if orig_format == 'JPEG' and image_io.tell() / 1024 > 150:
-                    for quality in range(90, 69, -5):
-                        image_io.seek(0)
-                        img.save(image_io, format='JPEG', quality=quality, optimize=True)
-                        if image_io.tell() / 1024 <= 150:
-                            break
-                    else:
-                        raise ValidationError("Image is too large to compress below 150KB.")
-                image_io.seek(0)
+                # Compress below 150KB (only JPEG has a quality setting)
+                try:
+                    image_io = encode_within(img, 150 * 1024, format=orig_format, quality=95, min_quality=70, optimize=True).buffer
+                except ImageBudgetError:
+                    raise ValidationError("Image is too large to compress below 150KB.")
                 processed_image = InMemoryUploadedFile(
                     image_io,
                     field_name=None,
                     name=os.path.basename(self.image.name),
                     content_type=f'image/{orig_format.lower()}',
-                    size=image_io.tell(),
+                    size=image_io.getbuffer().nbytes,
                     charset=None
                 )
                 return processed_image
@@ -194,8 +184,11 @@ class ArticleImageModel(TimeStampModel):
 
     def save(self, *args, **kwargs):
         """
-        Save method to process the image before saving.
+        Save method to store the original image and queue its processing.
         """
-        if self.image:
-            self.image = self.make_thumbnail()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        new_upload = is_new_upload(self.image)
+        if new_upload:
+            self.processing_status = ProcessingStatus.PENDING
+        super().save(*args, **kwargs)
+        if new_upload:
+            enqueue(self, 'image')
\ No newline at end of file
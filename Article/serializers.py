@@ -33,7 +33,8 @@ class ArticleImageSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = ArticleImageModel
-        fields = ['id', 'image', 'alt_text']
+        fields = ['id', 'image', 'alt_text', 'processing_status']
+        read_only_fields = ['processing_status']
     
 
 
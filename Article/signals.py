@@ -0,0 +1,43 @@
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
+from django.db.models.signals import post_delete
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from core.cache import bump_version
+from core.timestamp import touched
+from core.timestamp import touch_m2m_owners
+
+from .models import ArticleCategoryModel
+from .models import ArticleMetaTag
+from .models import ArticleModel
+from .models import ArticleImageModel
+
+
+@receiver([post_save, post_delete], sender=ArticleModel)
+@receiver([post_save, post_delete], sender=ArticleCategoryModel)
+@receiver([post_save, post_delete], sender=ArticleMetaTag)
+@receiver([post_save, post_delete], sender=ArticleImageModel)
+def invalidate_article_cache(sender, using, **kwargs):
+    """Expire cached article responses that include the changed model."""
+    bump_version(sender, using=using)
+
+
+@receiver(post_delete, sender=ArticleMetaTag)
+def invalidate_deleted_tag(sender, using, **kwargs):
+    """Deleting a tag removes its m2m rows without m2m_changed, and ArticleModels serialize their tag ids."""
+    bump_version(ArticleModel, using=using)
+
+
+@receiver(pre_delete, sender=ArticleMetaTag)
+def touch_deleted_tag_articles(sender, instance, using, **kwargs):
+    """The cascade removing a deleted tag's m2m rows sends no m2m_changed either."""
+    ArticleModel._default_manager.using(using).filter(meta_tag=instance).update(**touched(ArticleModel))
+
+
+@receiver(m2m_changed, sender=ArticleModel.meta_tag.through)
+def invalidate_article_tags(sender, instance, action, reverse, pk_set, using, **kwargs):
+    """Articles serialize their meta tag ids, so tag assignment changes the article and its ETag."""
+    touch_m2m_owners(ArticleModel, 'meta_tag', instance, action, reverse, pk_set, using)
+    if action.startswith('post_'):
+        bump_version(ArticleModel, using=using)
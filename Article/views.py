@@ -15,12 +15,17 @@ from .serializers import ArticleMetaTagSerializer
 from .serializers import ArticleSerializer 
 from .serializers import ArticleImageSerializer 
 
+from core.cache import CachedResponseMixin
+from core.conditional import ConditionalGetMixin
+from core.counters import ViewCountMixin
+from core.counters import CounterRankingMixin
 from core.core_permissions import IsOwnerOrReadOnly
 from core.pagepagination import DynamicPagination  
+from core.queryoptimizer import QueryOptimizerMixin 
 
 
 
-class ArticleCategoryViewSet(viewsets.ModelViewSet): 
+class ArticleCategoryViewSet(CachedResponseMixin, viewsets.ModelViewSet): 
     """ ViewSet for Article Category """
     queryset                  = ArticleCategoryModel.objects.all()
     serializer_class          = ArticleCategorySerializer
@@ -75,9 +80,11 @@ class ArticleMetaTagViewSet(viewsets.ModelViewSet):
 
 
 
-class ArticleViewSet(viewsets.ModelViewSet):
+class ArticleViewSet(ViewCountMixin, CounterRankingMixin, CachedResponseMixin, ConditionalGetMixin, QueryOptimizerMixin, viewsets.ModelViewSet):
     """ ViewSet for Article """
     queryset                  = ArticleModel.objects.all()
+    cache_models              = (ArticleModel, ArticleImageModel)
+    conditional_related       = ('images',)
     serializer_class          = ArticleSerializer
     http_method_names         = ['get', 'post', 'delete'] 
     permission_classes        = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
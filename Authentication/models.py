@@ -9,6 +9,12 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser, PermissionsMixin
 from django.core.files.uploadedfile import InMemoryUploadedFile 
 
+from core.imageencoding import encode_within
+from core.imageencoding import load_thumbnail
+from core.imagepipeline import ProcessingStatus
+from core.imagepipeline import enqueue
+from core.imagepipeline import is_new_upload
+
 from .managers import CustomUserManager
 
 
@@ -42,6 +48,7 @@ class CustomUser(AbstractUser, PermissionsMixin):
     gender          = models.CharField(max_length=10, choices=GenderChoices.choices, null=True, blank=True)
     dt_of_birth     = models.DateField(null=True, blank=True)
     pro_photo       = models.ImageField(upload_to=uload_to, null=True, blank=True)
+    pro_photo_status = models.CharField(max_length=10, choices=ProcessingStatus.choices, default=ProcessingStatus.READY, editable=False)
     uid             = models.CharField(max_length=32, default=user_unique_key, unique=True)
 
 
@@ -69,44 +76,22 @@ class CustomUser(AbstractUser, PermissionsMixin):
             except CustomUser.DoesNotExist:
                 pass
 
-        if self.pro_photo:
-            thumb = self.make_thumbnail()
-            if thumb:
-                self.pro_photo = InMemoryUploadedFile(
-                    file=thumb,
-                    field_name='ImageField',
-                    name='thumb.jpg',
-                    content_type='image/jpeg',
-                    size=thumb.getbuffer().nbytes,
-                    charset=None
-                )
+        # the original is stored now; the thumbnail is built on the image pipeline
+        new_upload = is_new_upload(self.pro_photo)
+        if new_upload:
+            self.pro_photo_status = ProcessingStatus.PENDING
+
+        super().save(*args, **kwargs)
 
-        super().save(*args, **kwargs)  # ❗ This was missing!
+        if new_upload:
+            enqueue(self, 'pro_photo', status_field='pro_photo_status')
 
 
     def make_thumbnail(self):
         try:
-            self.pro_photo.seek(0)
-            image = Image.open(self.pro_photo)
-            image.thumbnail((300, 300))
-
-            if image.mode in ("RGBA", "P"):
-                image = image.convert("RGB")
-
-            image_io = BytesIO()
-            quality = 85
-
-            while quality >= 30:
-                image_io.seek(0)
-                image_io.truncate()
-                image.save(image_io, format='JPEG', quality=quality)
-                size_kb = image_io.tell() / 1024
-                if size_kb < 100:
-                    break
-                quality -= 5
-
-            image_io.seek(0)
-            return image_io
+            with load_thumbnail(self.pro_photo, (300, 300), resample=Image.Resampling.BICUBIC) as image:
+                # best quality from 85 down to 30 under 100 KB, or quality 30 if nothing fits
+                return encode_within(image, 100 * 1024 - 1, quality=85, min_quality=30, strict=False).buffer
         
 
         except Exception as e:
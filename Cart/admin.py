@@ -5,6 +5,7 @@ from .models import CartModel
 from .models import CartItemModel
 from .models import OrderModel
 from .models import OrderItemModel 
+from .models import recompute_order_totals 
 
 
 
@@ -42,6 +43,12 @@ class OrderModelAdmin(admin.ModelAdmin):
     search_fields = ('author__username',)
     list_filter = ('ord_status',)
     ordering = ('-created',) 
+    actions = ['recompute_totals']
+
+    @admin.action(description="Recompute total amount")
+    def recompute_totals(self, request, queryset):
+        updated = recompute_order_totals(queryset)
+        self.message_user(request, f"Recomputed totals for {updated} orders.")
 
 
 
@@ -0,0 +1,76 @@
+from django.db import transaction
+
+from core.counters import increment_many
+from Product.models import ProductModel
+from Product.inventory import merge_lines
+from Product.inventory import reserve_stock
+
+from .models import CartItemModel
+from .models import OrderModel
+from .models import OrderItemModel
+from .models import order_numbers
+from .models import quantize_amount
+from .models import unit_price_expression
+from .models import recompute_order_totals
+
+
+
+class InsufficientStockError(Exception):
+    """
+    Raised when the cart cannot be checked out because some products are short.
+    `shortages` holds the Product.inventory.StockShortage lines.
+    """
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__("Insufficient stock for some cart items.")
+
+
+
+def place_order(user, cart) -> OrderModel:
+    """
+    Turn a cart into an order in one transaction with a fixed number of queries,
+    whatever the number of cart lines. The order number is reserved before the
+    transaction opens, so checkouts do not hold the number counter while they run:
+
+    1. snapshot the list and discounted unit prices of every line in a single SELECT
+    2. reserve stock for all lines in a single conditional UPDATE
+    3. create the order and bulk_create its items
+    4. compute total_amount from the snapshotted prices in SQL with one UPDATE
+    5. clear the cart with one DELETE
+
+    Raises InsufficientStockError (and rolls everything back) if any line is short.
+    """
+    order_num = order_numbers.next()
+    with transaction.atomic():
+        cart_items  = CartItemModel.objects.filter(cart_id=cart)
+        lines       = list(
+            cart_items.order_by().annotate(unit_price=unit_price_expression()).values_list(
+                'product_id', 'quantity', 'unit_price', 'product_id__price'
+            )
+        )
+
+        shortages = reserve_stock((product_id, quantity) for product_id, quantity, _, _ in lines)
+        if shortages:
+            raise InsufficientStockError(shortages)
+
+        order = OrderModel.objects.create(author=user, cart_id=cart, order_num=order_num)
+        OrderItemModel.objects.bulk_create([
+            OrderItemModel(
+                order_id=order,
+                product_id_id=product_id,
+                quantity=quantity,
+                price=quantize_amount(unit_price) if unit_price is not None else None,
+                list_price=list_price,
+            )
+            for product_id, quantity, unit_price, list_price in lines
+        ])
+
+        recompute_order_totals(OrderModel.objects.filter(pk=order.pk))
+        order.refresh_from_db(fields=['total_amount', 'modified'])
+
+        cart_items.delete()
+
+        sold = merge_lines((product_id, quantity) for product_id, quantity, _, _ in lines)
+        transaction.on_commit(lambda: increment_many(ProductModel, 'sold_count', sold))
+
+    return order
@@ -0,0 +1,29 @@
+from django.db import transaction
+from django.db.models import Max
+from django.core.management.base import BaseCommand
+
+from Cart.models import OrderModel
+from Cart.models import recompute_order_totals
+
+
+class Command(BaseCommand):
+    help = "Recompute total_amount for historical orders in primary-key batches, one UPDATE per batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Orders updated per statement.")
+        parser.add_argument('--start-id', type=int, default=0, help="Resume after this order id.")
+
+    def handle(self, *args, **options):
+        batch_size  = options['batch_size']
+        last_id     = options['start_id']
+        max_id      = OrderModel.objects.aggregate(max_id=Max('pk'))['max_id'] or 0
+        updated     = 0
+
+        while last_id < max_id:
+            upper = last_id + batch_size
+            with transaction.atomic():
+                updated += recompute_order_totals(OrderModel.objects.filter(pk__gt=last_id, pk__lte=upper))
+            last_id = upper
+            self.stdout.write(f"Recomputed totals up to order id {min(last_id, max_id)} ({updated} orders).")
+
+        self.stdout.write(self.style.SUCCESS(f"Recomputed totals for {updated} orders."))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:38
+
+from django.db import migrations
+from django.db.models import Max
+
+from core.sequence import create_sequence, drop_sequence
+
+
+def create_order_num_sequence(apps, schema_editor):
+    OrderModel = apps.get_model('xApiCart', 'OrderModel')
+    last_order_num = OrderModel.objects.using(schema_editor.connection.alias).aggregate(last=Max('order_num'))['last']
+    create_sequence(schema_editor.connection, 'order_num', start=last_order_num + 1 if last_order_num else 1000000000)
+
+
+def drop_order_num_sequence(apps, schema_editor):
+    drop_sequence(schema_editor.connection, 'order_num')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('xApiCart', '0001_initial'),
+        ('xApiCore', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_order_num_sequence, drop_order_num_sequence),
+    ]
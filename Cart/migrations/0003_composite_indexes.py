@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('xApiCart', '0002_order_num_sequence'),
+        ('xApiProduct', '0008_product_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cartitemmodel',
+            index=models.Index(fields=['cart_id', 'product_id'], name='cartitem_cart_product_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordermodel',
+            index=models.Index(fields=['author', 'ord_status'], name='order_author_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordermodel',
+            index=models.Index(fields=['author', 'payment_status'], name='order_author_payment_idx'),
+        ),
+    ]
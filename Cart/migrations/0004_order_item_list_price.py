@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('xApiCart', '0003_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitemmodel',
+            name='list_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:20
+
+from django.db import migrations
+from django.db.models import Max
+
+from core.sequence import create_counter, drop_counter
+
+
+def create_order_num_counter(apps, schema_editor):
+    OrderModel = apps.get_model('xApiCart', 'OrderModel')
+    last_order_num = OrderModel.objects.using(schema_editor.connection.alias).aggregate(last=Max('order_num'))['last']
+    create_counter(apps, schema_editor.connection, 'order_num', start=last_order_num + 1 if last_order_num else 1000000000)
+
+
+def drop_order_num_counter(apps, schema_editor):
+    drop_counter(apps, schema_editor.connection, 'order_num')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('xApiCart', '0004_order_item_list_price'),
+        ('xApiCore', '0003_outbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_order_num_counter, drop_order_num_counter),
+    ]
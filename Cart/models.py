@@ -1,5 +1,7 @@
 import uuid 
 from django.db import models, transaction
+from django.db.models import F, Sum, Value, OuterRef, Subquery, ExpressionWrapper
+from django.db.models.functions import Coalesce, Now, Round
 from django.contrib.auth import get_user_model
 from decimal import Decimal 
 from django.core.exceptions import ValidationError 
@@ -9,6 +11,7 @@ from django.core.validators import MinValueValidator
 from Product.models import ProductModel 
 
 from core.timestamp import TimeStampModel 
+from core.sequence import NumberAllocator 
 
 
 
@@ -71,6 +74,10 @@ class CartItemModel(TimeStampModel):
 
     class Meta:
         ordering = ['-created']  
+        indexes  = [
+            # add-to-cart looks an item up by cart and product
+            models.Index(fields=['cart_id', 'product_id'], name='cartitem_cart_product_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if self.quantity == 0:
@@ -95,6 +102,90 @@ def order_unique_key() -> str:
     return uuid.uuid4().hex[:32].lower() 
 
 
+AMOUNT_FIELD = models.DecimalField(max_digits=12, decimal_places=2)
+
+
+def quantize_amount(value) -> Decimal:
+    """Round a database-computed amount to cents; NULL sums become zero."""
+    return Decimal(value or 0).quantize(Decimal('0.01'))
+
+
+def line_subtotal_expression(prefix: str = 'product_id__') -> ExpressionWrapper:
+    """Undiscounted line amount: price * quantity."""
+    return ExpressionWrapper(F(f'{prefix}price') * F('quantity'), output_field=AMOUNT_FIELD)
+
+
+def line_total_expression(prefix: str = 'product_id__') -> ExpressionWrapper:
+    """Discounted line amount: price * quantity * (1 - discount_percent / 100)."""
+    return ExpressionWrapper(
+        F(f'{prefix}price') * F('quantity') * (Value(1) - F(f'{prefix}discount_percent') / Value(100)),
+        output_field=AMOUNT_FIELD,
+    )
+
+
+def unit_price_expression(prefix: str = 'product_id__') -> ExpressionWrapper:
+    """Discounted unit price: price * (1 - discount_percent / 100)."""
+    return ExpressionWrapper(
+        F(f'{prefix}price') * (Value(1) - F(f'{prefix}discount_percent') / Value(100)), output_field=AMOUNT_FIELD
+    )
+
+
+def order_line_subtotal_expression() -> Coalesce:
+    """
+    Undiscounted amount of an order line: the list price snapshotted at checkout * quantity,
+    or the current product price for lines without a snapshot.
+    """
+    return Coalesce(
+        ExpressionWrapper(F('list_price') * F('quantity'), output_field=AMOUNT_FIELD),
+        line_subtotal_expression(),
+        output_field=AMOUNT_FIELD,
+    )
+
+
+def order_line_total_expression() -> Coalesce:
+    """
+    Amount of an order line: the unit price snapshotted at checkout * quantity,
+    or the current discounted product price for lines without a snapshot.
+    """
+    return Coalesce(
+        ExpressionWrapper(F('price') * F('quantity'), output_field=AMOUNT_FIELD),
+        line_total_expression(),
+        output_field=AMOUNT_FIELD,
+    )
+
+
+def order_total_subquery() -> Coalesce:
+    """
+    Correlated subquery summing the lines of the outer order at their checkout prices,
+    for recomputing total_amount of many orders in a single UPDATE.
+    """
+    totals = OrderItemModel.objects.filter(order_id=OuterRef('pk')).order_by().values('order_id').annotate(
+        total=Round(Sum(order_line_total_expression()), 2)
+    ).values('total')
+    return Coalesce(Subquery(totals), Value(Decimal('0.00')), output_field=AMOUNT_FIELD)
+
+
+def recompute_order_totals(queryset) -> int:
+    """
+    Recompute total_amount for every order in `queryset` with one UPDATE statement.
+    Returns the number of orders updated.
+    """
+    return queryset.order_by().update(total_amount=order_total_subquery(), modified=Now())
+
+
+
+def first_order_num() -> int:
+    """
+    Seed for the order number counter: continue after the highest existing order number.
+    """
+    last_order_num = OrderModel.objects.aggregate(last=models.Max('order_num'))['last']
+    return last_order_num + 1 if last_order_num else FIRST_ORDER_NUM
+
+
+FIRST_ORDER_NUM = 1000000000
+order_numbers   = NumberAllocator('order_num', seed=first_order_num)
+
+
 class OrderModel(TimeStampModel):
 
     STATUS_CHOICES = (
@@ -131,27 +222,41 @@ class OrderModel(TimeStampModel):
 
     class Meta:
         ordering = ['-created'] 
+        indexes  = [
+            # a user's orders by fulfilment and by payment state
+            models.Index(fields=['author', 'ord_status'], name='order_author_status_idx'),
+            models.Index(fields=['author', 'payment_status'], name='order_author_payment_idx'),
+        ]
 
 
     def save(self, *args, **kwargs):
         """start order number from 1000000000"""
         if not self.order_num:
-            last_order = OrderModel.objects.order_by('order_num').last()
-            if last_order:
-                self.order_num = last_order.order_num + 1
-            else:
-                self.order_num = 1000000000
+            self.order_num = order_numbers.next(using=kwargs.get('using') or 'default')
     
         super().save(*args, **kwargs)
 
 
+    def order_totals(self) -> dict:
+        """
+        Subtotal, discount and total of the order, computed by the database in one aggregate query
+        from the prices snapshotted at checkout. The discount is what separates the two, so
+        subtotal - discount == total however the products are repriced later.
+        """
+        totals = self.order_items.order_by().aggregate(
+            subtotal=Sum(order_line_subtotal_expression()),
+            total=Sum(order_line_total_expression()),
+        )
+        subtotal, total = quantize_amount(totals['subtotal']), quantize_amount(totals['total'])
+        return {'subtotal': subtotal, 'discount': subtotal - total, 'total': total}
+
+
     def total_amount_calculation(self):
-        total = 0
-        for item in self.order_items.all():
-            if item.product_id and item.product_id.price:
-                total += Decimal(item.product_id.price) * Decimal(item.quantity) * (Decimal('1.0') - (Decimal(str(item.product_id.discount_percent)) / Decimal('100')))
-        self.total_amount = total
-        self.save()
+        """Recompute total_amount in SQL and persist only that column."""
+        totals = self.order_totals()
+        OrderModel.objects.filter(pk=self.pk).update(total_amount=totals['total'], modified=Now())
+        self.total_amount = totals['total']
+        return totals
 
 
 
@@ -177,6 +282,7 @@ class OrderItemModel(TimeStampModel):
     product_id          = models.ForeignKey(ProductModel, on_delete=models.CASCADE, related_name='order_items')
     quantity            = models.PositiveIntegerField(default=1)
     price               = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    list_price          = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     uid                 = models.CharField(max_length=32, default=order_item_unique_key, unique=True) 
 
     class Meta:
@@ -1,3 +1,89 @@
+from decimal import Decimal
 from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+
+from Product.models import ProductModel
+
+from .models import CartModel
+from .models import CartItemModel
+from .models import OrderModel
+from .models import OrderItemModel
+from .models import recompute_order_totals
+from .checkout import place_order
+from .checkout import InsufficientStockError
+from core.counters import flush_counters
+from core.counters import get_buffer
+
+
+User = get_user_model()
+
+
+
+class CheckoutPipelineTest(TestCase):
+    """
+    Checkout must be atomic and cost a fixed number of queries per order.
+    """
+
+    def make_cart(self, email, lines, stock=10):
+        user = User.objects.create_user(email=email, password='pass', username=email)
+        cart = CartModel.objects.create(author=user)
+        for i in range(lines):
+            product = ProductModel.objects.create(
+                name=f'{email}-{i}', weight=1.0, price=Decimal('10.00'), discount_percent=10, stock=stock,
+            )
+            CartItemModel.objects.create(cart_id=cart, product_id=product, quantity=2)
+        return user, cart
+
+    def checkout_query_count(self, email, lines):
+        user, cart = self.make_cart(email, lines)
+        with CaptureQueriesContext(connection) as queries:
+            order = place_order(user, cart)
+        self.assertEqual(order.total_amount, Decimal('18.00') * lines)
+        self.assertEqual(OrderItemModel.objects.filter(order_id=order).count(), lines)
+        self.assertFalse(CartItemModel.objects.filter(cart_id=cart).exists())
+        return len(queries)
+
+    def test_query_count_is_constant(self):
+        self.assertEqual(self.checkout_query_count('small@xapi.local', 2), self.checkout_query_count('large@xapi.local', 100))
+
+    def test_sold_count_is_buffered_until_commit(self):
+        user, cart = self.make_cart('sold@xapi.local', 2)
+        get_buffer().drain()
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(user, cart)
+        flush_counters()
+        self.assertEqual(set(ProductModel.objects.values_list('sold_count', flat=True)), {2})
+
+    def test_short_stock_rolls_back(self):
+        user, cart = self.make_cart('short@xapi.local', 3, stock=1)
+        with self.assertRaises(InsufficientStockError) as raised:
+            place_order(user, cart)
+        self.assertEqual(len(raised.exception.shortages), 3)
+        self.assertEqual(CartItemModel.objects.filter(cart_id=cart).count(), 3)
+        self.assertFalse(user.orders.exists())
+        self.assertEqual(set(ProductModel.objects.values_list('stock', flat=True)), {1})
+
+    def test_recompute_keeps_checkout_prices(self):
+        user, cart = self.make_cart('reprice@xapi.local', 2)
+        order = place_order(user, cart)
+        self.assertEqual(set(order.order_items.values_list('price', flat=True)), {Decimal('9.00')})
+        ProductModel.objects.update(price=Decimal('25.00'), discount_percent=0)
+
+        recompute_order_totals(OrderModel.objects.filter(pk=order.pk))
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, Decimal('36.00'))
+        self.assertEqual(order.order_totals()['total'], Decimal('36.00'))
+
+    def test_totals_add_up_after_reprice(self):
+        user, cart = self.make_cart('figures@xapi.local', 2)
+        order = place_order(user, cart)
+        expected = {'subtotal': Decimal('40.00'), 'discount': Decimal('4.00'), 'total': Decimal('36.00')}
+        self.assertEqual(order.order_totals(), expected)
+
+        ProductModel.objects.update(price=Decimal('25.00'), discount_percent=0)
+        totals = order.order_totals()
+        self.assertEqual(totals, expected)
+        self.assertEqual(totals['subtotal'] - totals['discount'], totals['total'])
 
-# Create your tests here.
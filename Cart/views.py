@@ -22,15 +22,19 @@ from .serializers import CartItemModelSerializer
 from .serializers import OrderModelSerializer
 from .serializers import OrderItemModelSerializer 
 
+from .checkout import place_order 
+from .checkout import InsufficientStockError 
+
 from Product.models import ProductModel 
 from core.pagepagination import DynamicPagination 
+from core.queryoptimizer import QueryOptimizerMixin 
 from core.core_permissions import IsOwnerStaffOrSuperUser
 from core.core_permissions import CartItemIsOwnerStaffOrSuperUser
 
 
 
 
-class CartModelViewSet(ModelViewSet):
+class CartModelViewSet(QueryOptimizerMixin, ModelViewSet):
     """
     ViewSet for CartModel.
     Handles all cart-related API operations, including listing, creating, and retrieving carts.
@@ -118,7 +122,7 @@ class CartModelViewSet(ModelViewSet):
 
 
 
-class CartItemModelViewSet(ModelViewSet):
+class CartItemModelViewSet(QueryOptimizerMixin, ModelViewSet):
     """
     ViewSet for CartItemModel.
     Handles all cart item-related API operations, including adding, updating, and removing items from a user's cart.
@@ -209,7 +213,7 @@ class CartItemModelViewSet(ModelViewSet):
     
 
 
-class OrderModelViewSet(ModelViewSet):
+class OrderModelViewSet(QueryOptimizerMixin, ModelViewSet):
     """
     ViewSet for OrderModel.
     Handles all order-related API operations, including creating, listing, and retrieving orders.
@@ -245,7 +249,8 @@ class OrderModelViewSet(ModelViewSet):
         - Checks if the user has confirmed the order to prevent accidental orders.
         - Validates that the user has no existing incomplete orders.
         - Ensures the user has an active cart with items before creating an order.
-        - Transfers items from the user's cart to the new order.
+        - Reserves stock for every cart line at once, failing with 409 if any line is short.
+        - Transfers items from the user's cart to the new order through the batched checkout pipeline.
         - Returns a structured response with order details upon successful creation.
         """
         user = request.user
@@ -293,23 +298,19 @@ class OrderModelViewSet(ModelViewSet):
                 },
                 status=status.HTTP_400_BAD_REQUEST
             )
-        # Create a new order for the user
-        order_data = OrderModel.objects.create(
-            author=user,
-            cart_id=cart,
-        )
-        order_data.save()
-        # Move each cart item to the new order as an order item
-        for item in cart_items:
-            order_item = OrderItemModel.objects.create(
-                order_id=order_data,
-                product_id=item.product_id,
-                quantity=item.quantity,
-                price=item.price,
+        # Reserve stock, create the order with its items and clear the cart in one transaction
+        try:
+            order_data = place_order(user, cart)
+        except InsufficientStockError as e:
+            # Return error if any product cannot cover its quantity; nothing was changed
+            return Response(
+                {
+                    "error": "Insufficient stock.",
+                    "message": "Some products in your cart do not have enough stock.",
+                    "items": [shortage._asdict() for shortage in e.shortages],
+                },
+                status=status.HTTP_409_CONFLICT
             )
-            order_item.save()
-        # Clear the cart after transferring items
-        cart_items.delete()
         # Return success response with order details
         return Response({
             'message': 'Order created successfully.',
@@ -344,7 +345,7 @@ class OrderModelViewSet(ModelViewSet):
 
 
 
-class OrderItemModelViewSet(ModelViewSet):
+class OrderItemModelViewSet(QueryOptimizerMixin, ModelViewSet):
     """
     ViewSet for OrderItemModel.
     Handles all order item-related API operations, including listing and retrieving items in a user's orders.
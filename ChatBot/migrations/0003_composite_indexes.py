@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ChatBot', '0002_rename_user_chatsession_author'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', 'created'], name='chatmsg_session_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['author', 'created'], name='chatsession_author_created_idx'),
+        ),
+    ]
@@ -16,6 +16,10 @@ class ChatSession(TimeStampModel):
     
     class Meta:
         ordering = ['-created']   
+        indexes  = [
+            # today's / latest / first session of a user
+            models.Index(fields=['author', 'created'], name='chatsession_author_created_idx'),
+        ]
 
 
 
@@ -42,4 +46,8 @@ class ChatMessage(TimeStampModel):
 
     class Meta:
         ordering = ['-created']
+        indexes  = [
+            # a session's messages in order
+            models.Index(fields=['session', 'created'], name='chatmsg_session_created_idx'),
+        ]
         
@@ -2,6 +2,10 @@ from django.contrib import admin
 
 
 from .models import JournalEntryModel  
+from .models import LedgerPeriodBalanceModel
+from .models import LedgerCloseModel
+from .models import AccountModel
+from .models import AccountBalanceModel
 
 
 
@@ -10,3 +14,34 @@ class JournalEntryAdmin(admin.ModelAdmin):
     list_display = ['ent_name', 'ent_num', 'status', 'author', 'created', 'ended']
     list_filter = ['status', 'author'] 
     search_fields = ['ent_name', 'ent_num'] 
+
+
+
+@admin.register(LedgerPeriodBalanceModel)
+class LedgerPeriodBalanceAdmin(admin.ModelAdmin):
+    list_display = ['account', 'currency', 'period', 'period_start', 'debit', 'credit', 'entries']
+    list_filter = ['period', 'currency']
+    search_fields = ['account']
+
+
+
+@admin.register(LedgerCloseModel)
+class LedgerCloseAdmin(admin.ModelAdmin):
+    list_display = ['name', 'closed_through', 'modified']
+
+
+
+class AccountBalanceInline(admin.TabularInline):
+    model = AccountBalanceModel
+    readonly_fields = ['currency', 'debit', 'credit', 'entries']
+    extra = 0
+    can_delete = False
+
+
+
+@admin.register(AccountModel)
+class AccountAdmin(admin.ModelAdmin):
+    list_display = ['code', 'name', 'account_type', 'is_active']
+    list_filter = ['account_type', 'is_active']
+    search_fields = ['code', 'name']
+    inlines = [AccountBalanceInline]
@@ -0,0 +1,266 @@
+import logging
+from decimal import Decimal
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import F
+from django.db.models import Q
+from django.db.models import Sum
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import AccountModel
+from .models import AccountBalanceModel
+from .models import JournalEntryModel
+from .periods import ONE_DAY
+from .periods import day_start
+from .periods import to_decimal
+
+
+logger = logging.getLogger(__name__)
+
+TYPE = AccountModel.TYPE
+
+# account types of the names the application posts to; other names start unclassified
+DEFAULT_ACCOUNT_TYPES = {
+    'bank_account':         TYPE.ASSET,
+    'cash':                 TYPE.ASSET,
+    'accounts_receivable':  TYPE.ASSET,
+    'inventory':            TYPE.ASSET,
+    'accounts_payable':     TYPE.LIABILITY,
+    'payment_suspense':     TYPE.LIABILITY,
+    'owner_equity':         TYPE.EQUITY,
+    'sales_revenue':        TYPE.INCOME,
+    'service_revenue':      TYPE.INCOME,
+    'purchases':            TYPE.EXPENSE,
+    'rent_expense':         TYPE.EXPENSE,
+    'salary_payment':       TYPE.EXPENSE,
+    'utility_bills':        TYPE.EXPENSE,
+}
+
+LINE_FIELDS = ('status', 'base_currency', 'debit_account_id', 'credit_account_id', 'debit_amount', 'credit_amount')
+
+
+
+def account_code(name: str) -> str:
+    """ Chart-of-accounts code for a free-text account name: 'Bank Account' -> 'bank_account'. """
+    return slugify(name or '').replace('-', '_') or (name or '').strip()
+
+
+def resolve_accounts(names, using: str = 'default') -> dict:
+    """
+    `{name: account id}` for account names, creating missing accounts. Costs two
+    queries for any number of names (three when some are new).
+    """
+    codes = {name: account_code(name) for name in set(names) if name}
+    if not codes:
+        return {}
+    accounts = AccountModel.objects.using(using)
+    known    = dict(accounts.filter(code__in=set(codes.values())).values_list('code', 'pk'))
+    missing  = set(codes.values()) - set(known)
+    if missing:
+        accounts.bulk_create([
+            AccountModel(code=code, name=code.replace('_', ' ').title(), account_type=DEFAULT_ACCOUNT_TYPES.get(code, ''))
+            for code in missing
+        ], ignore_conflicts=True)
+        known = dict(accounts.filter(code__in=set(codes.values())).values_list('code', 'pk'))
+    return {name: known[code] for name, code in codes.items()}
+
+
+def link_accounts(entry, using: str = 'default') -> None:
+    """
+    Point the account foreign keys of `entry` at the accounts its names resolve to, and fill
+    missing names from the accounts. The name wins: an edited `debit_name` / `credit_name`
+    moves the link, so running balances (by account) and trial balances (by name) agree.
+    """
+    linked  = [getattr(entry, f'{side}_account_id') for side in ('debit', 'credit') if getattr(entry, f'{side}_name')]
+    codes   = dict(AccountModel.objects.using(using).filter(pk__in=linked).values_list('pk', 'code')) if any(linked) else {}
+    for side in ('debit', 'credit'):
+        name, account_id = getattr(entry, f'{side}_name'), getattr(entry, f'{side}_account_id')
+        if name and (account_id is None or codes.get(account_id) != account_code(name)):
+            setattr(entry, f'{side}_account_id', resolve_accounts([name], using)[name])
+        elif account_id is not None and not name:
+            setattr(entry, f'{side}_name', AccountModel.objects.using(using).values_list('code', flat=True).get(pk=account_id))
+
+
+
+def line_deltas(values: dict, sign: int = 1, deltas: dict = None) -> dict:
+    """
+    Add the balance lines of one entry (a dict of LINE_FIELDS) to
+    `deltas`: `{(account id, currency): [debit, credit, entries]}`. Only posted entries count.
+    """
+    deltas = defaultdict(lambda: [Decimal('0'), Decimal('0'), 0]) if deltas is None else deltas
+    if values['status'] != JournalEntryModel.STATUS.POSTED:
+        return deltas
+    for side in ('debit', 'credit'):
+        account_id = values[f'{side}_account_id']
+        if account_id is None:
+            continue
+        delta = deltas[(account_id, values['base_currency'])]
+        delta[0 if side == 'debit' else 1] += sign * Decimal(values[f'{side}_amount'] or 0)
+        delta[2] += sign
+    return deltas
+
+
+def entry_values(entry) -> dict:
+    return {field: getattr(entry, field) for field in LINE_FIELDS}
+
+
+def apply_deltas(deltas: dict, using: str = 'default') -> None:
+    """
+    Add `deltas` to the running balances with one `F()` UPDATE per account and currency,
+    in a fixed order so concurrent postings lock rows in the same sequence. Balance rows
+    are created empty first, so concurrent first postings to an account only ever add.
+    """
+    balances = AccountBalanceModel.objects.using(using)
+    now      = timezone.now()
+    with transaction.atomic(using=using):
+        for (account_id, currency), (debit, credit, entries) in sorted(deltas.items()):
+            if not (debit or credit or entries):
+                continue
+            rows    = balances.filter(account_id=account_id, currency=currency)
+            changes = {'debit': F('debit') + debit, 'credit': F('credit') + credit, 'entries': F('entries') + entries, 'modified': now}
+            if not rows.update(**changes):
+                balances.bulk_create([AccountBalanceModel(account_id=account_id, currency=currency)], ignore_conflicts=True)
+                rows.update(**changes)
+
+
+def save_entry(entry, save, using: str = None, update_fields=None) -> None:
+    """
+    Run `save()` for a journal entry and move the running balances by the difference
+    between its stored and its new lines, in the same transaction.
+    """
+    using = using or entry._state.db or 'default'
+    link_accounts(entry, using)
+    with transaction.atomic(using=using):
+        stored = None
+        if entry.pk is not None:
+            stored = JournalEntryModel.objects.using(using).select_for_update().filter(pk=entry.pk).values(*LINE_FIELDS).first()
+        save()
+        if update_fields is not None and stored is not None:
+            # fields left out of update_fields were not written; take the lines from the row
+            current = JournalEntryModel.objects.using(using).filter(pk=entry.pk).values(*LINE_FIELDS).get()
+        else:
+            current = entry_values(entry)
+
+        deltas = line_deltas(current)
+        if stored is not None:
+            line_deltas(stored, -1, deltas)
+        apply_deltas(deltas, using)
+
+
+
+def rebuild_balances(batch_size: int = 10000, using: str = 'default', dry_run: bool = False, log=None) -> list:
+    """
+    Recompute every running balance from the posted journal and correct the rows that
+    drifted (entries changed with `update()`, raw SQL, restores, ...).
+
+    The journal is read in primary-key batches with two GROUP BY queries per batch, so
+    memory stays O(accounts). Entries without account links are linked from their names
+    first. Returns `[(account code, currency, stored (debit, credit), rebuilt (debit, credit))]`
+    for every balance that was wrong. Run it while nothing else is posting.
+    """
+    entries = JournalEntryModel.objects.using(using).order_by()
+    for side in ('debit', 'credit'):
+        unlinked = entries.filter(**{f'{side}_account__isnull': True}).exclude(**{f'{side}_name__isnull': True}).exclude(**{f'{side}_name': ''})
+        names    = unlinked.values_list(f'{side}_name', flat=True).distinct()
+        for name, account_id in resolve_accounts(list(names), using).items():
+            if not dry_run:
+                unlinked.filter(**{f'{side}_name': name}).update(**{f'{side}_account': account_id})
+
+    totals  = defaultdict(lambda: [Decimal('0'), Decimal('0'), 0])
+    posted  = entries.filter(status=JournalEntryModel.STATUS.POSTED)
+    last_pk = 0
+    max_pk  = posted.order_by('-pk').values_list('pk', flat=True).first() or 0
+    while last_pk < max_pk:
+        batch = posted.filter(pk__gt=last_pk, pk__lte=last_pk + batch_size)
+        for side in ('debit', 'credit'):
+            grouped = batch.exclude(**{f'{side}_account': None}).values(f'{side}_account', 'base_currency').annotate(
+                amount=Sum(f'{side}_amount'), lines=Count('pk'),
+            )
+            for row in grouped:
+                total = totals[(row[f'{side}_account'], row['base_currency'])]
+                total[0 if side == 'debit' else 1] += to_decimal(row['amount'])
+                total[2] += row['lines']
+        last_pk += batch_size
+        if log:
+            log(f"Read entries up to id {min(last_pk, max_pk)}.")
+
+    drift   = []
+    stored  = {
+        (row.account_id, row.currency): row
+        for row in AccountBalanceModel.objects.using(using).select_related('account')
+    }
+    codes   = dict(AccountModel.objects.using(using).values_list('pk', 'code'))
+    with transaction.atomic(using=using):
+        for key in sorted(set(stored) | set(totals)):
+            debit, credit, count = totals.get(key, (Decimal('0'), Decimal('0'), 0))
+            row = stored.get(key)
+            if row is not None and (row.debit, row.credit, row.entries) == (debit, credit, count):
+                continue
+            drift.append((codes[key[0]], key[1], (row.debit, row.credit) if row else None, (debit, credit)))
+            if dry_run:
+                continue
+            AccountBalanceModel.objects.using(using).update_or_create(
+                account_id=key[0], currency=key[1], defaults={'debit': debit, 'credit': credit, 'entries': count},
+            )
+    for code, currency, before, after in drift:
+        logger.warning("Account balance %s %s drifted: stored %s, rebuilt %s", code, currency, before, after)
+    return drift
+
+
+
+def balance_sheet(using: str = 'default') -> dict:
+    """
+    Balance sheet per currency from the running balances, one query over
+    AccountBalanceModel: accounts by type with their normal-side balance, and the totals.
+    Net income (income - expense) belongs to equity until the books are closed.
+    """
+    sheets = {}
+    for row in AccountBalanceModel.objects.using(using).select_related('account').order_by('currency', 'account__code'):
+        sheet = sheets.setdefault(row.currency, {
+            'sections': {kind: [] for kind in list(TYPE.values) + ['unclassified']},
+            'totals':   {kind: Decimal('0') for kind in TYPE.values},
+        })
+        account = row.account
+        balance = row.debit - row.credit if account.debit_normal else row.credit - row.debit
+        sheet['sections'][account.account_type or 'unclassified'].append({
+            'code': account.code, 'name': account.name, 'debit': row.debit, 'credit': row.credit, 'balance': balance,
+        })
+        if account.account_type:
+            sheet['totals'][account.account_type] += balance
+
+    for sheet in sheets.values():
+        totals = sheet['totals']
+        totals['net_income']    = totals[TYPE.INCOME] - totals[TYPE.EXPENSE]
+        sheet['balanced']       = totals[TYPE.ASSET] == totals[TYPE.LIABILITY] + totals[TYPE.EQUITY] + totals['net_income']
+    return sheets
+
+
+def account_statement(account, start, end, using: str = 'default'):
+    """
+    `(lines, opening, closing)` of an account between two dates (inclusive): the posted
+    entries touching it, newest first, and its balance per currency before `start` and
+    after `end`. Balances are the running balance minus the movements since each date,
+    read with the (account, created) indexes, so the cost depends on the window, not the journal.
+    """
+    posted  = JournalEntryModel.objects.using(using).filter(status=JournalEntryModel.STATUS.POSTED).order_by()
+    since   = day_start(start)
+    after   = day_start(end + ONE_DAY)
+
+    current = {row.currency: row.debit - row.credit for row in account.balances.using(using).all()}
+    opening = defaultdict(Decimal, current)
+    closing = defaultdict(Decimal, current)
+    for side, sign in (('debit', 1), ('credit', -1)):
+        moved = posted.filter(**{f'{side}_account': account, 'created__gte': since}).values('base_currency').annotate(
+            since_start=Sum(f'{side}_amount'), since_end=Sum(f'{side}_amount', filter=Q(created__gte=after)),
+        )
+        for row in moved:
+            opening[row['base_currency']] -= sign * to_decimal(row['since_start'])
+            closing[row['base_currency']] -= sign * to_decimal(row['since_end'])
+
+    if not account.debit_normal:
+        opening = {currency: -value for currency, value in opening.items()}
+        closing = {currency: -value for currency, value in closing.items()}
+    lines = posted.filter(Q(debit_account=account) | Q(credit_account=account), created__gte=since, created__lt=after).order_by('-created', '-id')
+    return lines, dict(opening), dict(closing)
@@ -0,0 +1,29 @@
+import datetime
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from Ledger.periods import close_periods
+from Ledger.periods import get_watermark
+
+
+class Command(BaseCommand):
+    help = (
+        "Materialize per-day and per-month account balances of posted journal entries up to a date "
+        "(yesterday by default) and advance the ledger close watermark. Run it daily, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--through', help="Last day to close, YYYY-MM-DD. Defaults to yesterday.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Snapshot rows inserted per statement.")
+
+    def handle(self, *args, **options):
+        through = None
+        if options['through']:
+            try:
+                through = datetime.date.fromisoformat(options['through'])
+            except ValueError:
+                raise CommandError("--through must be a date in YYYY-MM-DD format.")
+
+        before      = get_watermark()
+        watermark   = close_periods(through, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Ledger closed through {watermark} (was {before or 'never closed'})."))
@@ -0,0 +1,51 @@
+import time
+from itertools import islice
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from core.rows import detect_format
+from core.rows import read_rows
+from Ledger.posting import post_entries
+from Ledger.posting import PostingError
+
+
+class Command(BaseCommand):
+    help = (
+        "Post journal entries from a CSV or JSONL file (bank statements, payment back-fills) in balanced "
+        "batches. Each batch is one transaction; posting stops at the first batch that is rejected."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file with one entry per row.")
+        parser.add_argument('--file-format', choices=['csv', 'jsonl'], help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=10000, help="Entries per balanced batch.")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Entries per INSERT statement.")
+
+    def handle(self, *args, **options):
+        try:
+            file_format = detect_format(options['path'], options['file_format'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        started, posted = time.perf_counter(), 0
+        with open(options['path'], 'rb') as stream:
+            rows = read_rows(stream, file_format)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                unreadable = [f"line {line}: {error}" for line, _, error in batch if error]
+                if unreadable:
+                    raise CommandError("Unreadable rows:\n" + "\n".join(unreadable))
+                try:
+                    report = post_entries([row for _, row, _ in batch], chunk_size=options['chunk_size'])
+                except PostingError as e:
+                    lines = [
+                        f"line {batch[error['row']][0] if error['row'] is not None else '-'}: {'; '.join(error['errors'])}"
+                        for error in e.errors
+                    ]
+                    raise CommandError(f"Batch after {posted} posted entries was rejected:\n" + "\n".join(lines))
+                posted += report['posted']
+                self.stdout.write(f"Posted {posted} entries (ent_num up to {report['last_ent_num']}).")
+
+        self.stdout.write(self.style.SUCCESS(f"Posted {posted} entries in {time.perf_counter() - started:.1f}s."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from Ledger.balances import rebuild_balances
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the running account balances from the posted journal in primary-key batches, "
+        "link entries to accounts by name, and correct every balance that drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help="Journal entries read per batch.")
+        parser.add_argument('--dry-run', action='store_true', help="Report drifted balances without writing them.")
+
+    def handle(self, *args, **options):
+        drift = rebuild_balances(batch_size=options['batch_size'], dry_run=options['dry_run'], log=self.stdout.write)
+        for code, currency, stored, rebuilt in drift:
+            self.stdout.write(f"{code} {currency}: stored {stored or '-'} -> rebuilt {rebuilt}")
+
+        verb = "Found" if options['dry_run'] else "Corrected"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(drift)} drifted balances."))
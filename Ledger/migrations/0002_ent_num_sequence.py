@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:38
+
+from django.db import migrations
+from django.db.models import Max
+
+from core.sequence import create_sequence, drop_sequence
+
+
+def create_ent_num_sequence(apps, schema_editor):
+    JournalEntryModel = apps.get_model('xApiLedger', 'JournalEntryModel')
+    last_ent_num = JournalEntryModel.objects.using(schema_editor.connection.alias).aggregate(last=Max('ent_num'))['last']
+    create_sequence(schema_editor.connection, 'ent_num', start=int(last_ent_num) + 1 if last_ent_num else 10000)
+
+
+def drop_ent_num_sequence(apps, schema_editor):
+    drop_sequence(schema_editor.connection, 'ent_num')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('xApiLedger', '0001_initial'),
+        ('xApiCore', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_ent_num_sequence, drop_ent_num_sequence),
+    ]
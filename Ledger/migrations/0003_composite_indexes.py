@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('xApiCart', '0003_composite_indexes'),
+        ('xApiLedger', '0002_ent_num_sequence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='journalentrymodel',
+            index=models.Index(fields=['status', 'created'], name='journal_status_created_idx'),
+        ),
+    ]
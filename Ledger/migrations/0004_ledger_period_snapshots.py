@@ -0,0 +1,43 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('xApiLedger', '0003_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerCloseModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(default='journal', max_length=50, unique=True)),
+                ('closed_through', models.DateField(blank=True, null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerPeriodBalanceModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], max_length=10)),
+                ('period_start', models.DateField()),
+                ('account', models.CharField(blank=True, default='', max_length=255)),
+                ('currency', models.CharField(max_length=10)),
+                ('debit', models.DecimalField(decimal_places=4, default=0, max_digits=19)),
+                ('credit', models.DecimalField(decimal_places=4, default=0, max_digits=19)),
+                ('entries', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-period_start', 'account'],
+                'constraints': [models.UniqueConstraint(fields=('period', 'period_start', 'account', 'currency'), name='unique_ledger_period_balance')],
+            },
+        ),
+    ]
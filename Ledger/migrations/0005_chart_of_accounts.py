@@ -0,0 +1,70 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('xApiCart', '0003_composite_indexes'),
+        ('xApiLedger', '0004_ledger_period_snapshots'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('code', models.CharField(max_length=255, unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('account_type', models.CharField(blank=True, choices=[('asset', 'Asset'), ('liability', 'Liability'), ('equity', 'Equity'), ('income', 'Income'), ('expense', 'Expense')], default='', max_length=20)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['code'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AccountBalanceModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('currency', models.CharField(max_length=10)),
+                ('debit', models.DecimalField(decimal_places=4, default=0, max_digits=19)),
+                ('credit', models.DecimalField(decimal_places=4, default=0, max_digits=19)),
+                ('entries', models.IntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='xApiLedger.accountmodel')),
+            ],
+            options={
+                'ordering': ['account', 'currency'],
+            },
+        ),
+        migrations.AddField(
+            model_name='journalentrymodel',
+            name='credit_account',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='credit_entries', to='xApiLedger.accountmodel'),
+        ),
+        migrations.AddField(
+            model_name='journalentrymodel',
+            name='debit_account',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='debit_entries', to='xApiLedger.accountmodel'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentrymodel',
+            index=models.Index(fields=['debit_account', 'created'], name='journal_dr_acct_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentrymodel',
+            index=models.Index(fields=['credit_account', 'created'], name='journal_cr_acct_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='accountbalancemodel',
+            constraint=models.UniqueConstraint(fields=('account', 'currency'), name='unique_account_balance'),
+        ),
+    ]
@@ -5,6 +5,7 @@ from django.db import models
 from django.contrib.auth import get_user_model
 
 from core.timestamp import TimeStampModel
+from core.sequence import NumberAllocator
 from Cart.models import OrderModel
 
 
@@ -20,6 +21,72 @@ def tax_id_generator() -> str:
 
 
 
+def first_entry_num() -> int:
+    """
+    Seed for the journal entry number counter: continue after the highest existing entry number.
+    """
+    last_ent_num = JournalEntryModel.objects.aggregate(last=models.Max('ent_num'))['last']
+    return int(last_ent_num) + 1 if last_ent_num else FIRST_ENTRY_NUM
+
+
+FIRST_ENTRY_NUM = 10000
+entry_numbers   = NumberAllocator('ent_num', seed=first_entry_num)
+
+
+
+class AccountModel(TimeStampModel):
+    """
+    Chart of accounts. Journal entries post to accounts through `debit_account` /
+    `credit_account`; `code` is the name the entries carry in `debit_name` / `credit_name`.
+    """
+
+    class TYPE(models.TextChoices):
+        ASSET       = 'asset', 'Asset'
+        LIABILITY   = 'liability', 'Liability'
+        EQUITY      = 'equity', 'Equity'
+        INCOME      = 'income', 'Income'
+        EXPENSE     = 'expense', 'Expense'
+
+    code            = models.CharField(max_length=255, unique=True)
+    name            = models.CharField(max_length=255)
+    account_type    = models.CharField(max_length=20, choices=TYPE.choices, blank=True, default='')
+    is_active       = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['code']
+
+    def __str__(self) -> str:
+        return f"{self.code} - {self.name}"
+
+    @property
+    def debit_normal(self) -> bool:
+        """ Assets and expenses grow with debits; everything else with credits. """
+        return self.account_type in (self.TYPE.ASSET, self.TYPE.EXPENSE, '')
+
+
+
+class AccountBalanceModel(TimeStampModel):
+    """
+    Running posted totals of one account in one currency, kept up to date by
+    Ledger.balances whenever a posted entry is saved or deleted.
+    """
+    account         = models.ForeignKey(AccountModel, on_delete=models.CASCADE, related_name='balances')
+    currency        = models.CharField(max_length=10)
+    debit           = models.DecimalField(max_digits=19, decimal_places=4, default=0)
+    credit          = models.DecimalField(max_digits=19, decimal_places=4, default=0)
+    entries         = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['account', 'currency']
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'currency'], name='unique_account_balance'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.account.code} {self.currency}: {self.debit - self.credit}"
+
+
+
 class JournalEntryModel(TimeStampModel, ):
     """
     Model to represent a journal entry for accounting purposes.
@@ -73,6 +140,8 @@ class JournalEntryModel(TimeStampModel, ):
     # Account Names
     debit_name             = models.CharField(max_length=255, null=True, blank=True)
     credit_name            = models.CharField(max_length=255, null=True, blank=True)
+    debit_account          = models.ForeignKey(AccountModel, on_delete=models.PROTECT, related_name='debit_entries', null=True, blank=True)
+    credit_account         = models.ForeignKey(AccountModel, on_delete=models.PROTECT, related_name='credit_entries', null=True, blank=True)
 
     # Metadata
     reference_num          = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, null=True, blank=True) 
@@ -83,6 +152,13 @@ class JournalEntryModel(TimeStampModel, ):
 
     class Meta:
         ordering = ['-created']
+        indexes  = [
+            # trial balance: posted entries within a date range
+            models.Index(fields=['status', 'created'], name='journal_status_created_idx'),
+            # account statements
+            models.Index(fields=['debit_account', 'created'], name='journal_dr_acct_created_idx'),
+            models.Index(fields=['credit_account', 'created'], name='journal_cr_acct_created_idx'),
+        ]
 
 
     def __str__(self):
@@ -95,12 +171,57 @@ class JournalEntryModel(TimeStampModel, ):
             self.ended = next_month - datetime.timedelta(days=1)
 
         if not self.ent_num:
-            last_entry = JournalEntryModel.objects.order_by('-ent_num').first()
-            if last_entry and last_entry.ent_num:
-                self.ent_num = last_entry.ent_num + Decimal('1.0000')
-            else:
-                self.ent_num = Decimal('10000.0000')
+            self.ent_num = Decimal(entry_numbers.next(using=kwargs.get('using') or 'default')).quantize(Decimal('1.0000'))
+
+        from .balances import save_entry
+
+        if kwargs.get('update_fields') is not None:
+            # a renamed side is relinked, so its account is written with it
+            update_fields = set(kwargs['update_fields'])
+            kwargs['update_fields'] = update_fields | {f'{side}_account' for side in ('debit', 'credit') if f'{side}_name' in update_fields}
+        save_entry(self, lambda: super(JournalEntryModel, self).save(*args, **kwargs), kwargs.get('using'), kwargs.get('update_fields'))
 
-        super().save(*args, **kwargs)
 
 
+
+
+class LedgerPeriodBalanceModel(models.Model):
+    """
+    Posted debit and credit totals of one account and currency over a closed day or month,
+    materialized by Ledger.periods.close_periods. Trial balances read these instead of
+    the journal for every period up to the close watermark.
+    """
+
+    class PERIOD(models.TextChoices):
+        DAY     = 'day', 'Day'
+        MONTH   = 'month', 'Month'
+
+    period          = models.CharField(max_length=10, choices=PERIOD.choices)
+    period_start    = models.DateField()
+    account         = models.CharField(max_length=255, blank=True, default='')
+    currency        = models.CharField(max_length=10)
+    debit           = models.DecimalField(max_digits=19, decimal_places=4, default=0)
+    credit          = models.DecimalField(max_digits=19, decimal_places=4, default=0)
+    entries         = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-period_start', 'account']
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'period_start', 'account', 'currency'], name='unique_ledger_period_balance'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.account or 'Unnamed'} {self.currency} {self.period} {self.period_start}"
+
+
+
+class LedgerCloseModel(TimeStampModel):
+    """
+    Close watermark of the journal: every day up to and including `closed_through`
+    is materialized in LedgerPeriodBalanceModel. One row per `name`.
+    """
+    name            = models.CharField(max_length=50, unique=True, default='journal')
+    closed_through  = models.DateField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"{self.name} closed through {self.closed_through or '-'}"
@@ -0,0 +1,230 @@
+import datetime
+from decimal import Decimal
+from collections import defaultdict
+from django.db import connections
+from django.db import transaction
+from django.db.models import F
+from django.db.models import Q
+from django.db.models import Sum
+from django.db.models import Count
+from django.db.models import Value
+from django.db.models import DecimalField
+from django.db.models.functions import Coalesce
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import JournalEntryModel
+from .models import LedgerCloseModel
+from .models import LedgerPeriodBalanceModel
+
+
+PERIOD      = LedgerPeriodBalanceModel.PERIOD
+ONE_DAY     = datetime.timedelta(days=1)
+FOUR_PLACES = Decimal('0.0001')
+ZERO        = Value(Decimal('0'), output_field=DecimalField(max_digits=19, decimal_places=4))
+
+
+
+def month_start(day: datetime.date) -> datetime.date:
+    return day.replace(day=1)
+
+
+def next_month(day: datetime.date) -> datetime.date:
+    return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def day_start(day: datetime.date) -> datetime.datetime:
+    """ First instant of `day` in the current time zone. """
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def to_decimal(value) -> Decimal:
+    """ A database sum as a 4-place Decimal; SQLite adds decimal columns as floats. """
+    return Decimal(str(value or 0)).quantize(FOUR_PLACES)
+
+
+
+def posted_entries(first_day: datetime.date, last_day: datetime.date, using: str = 'default'):
+    """ Posted journal entries created between two dates (inclusive), served by (status, created). """
+    return JournalEntryModel.objects.using(using).filter(
+        status=JournalEntryModel.STATUS.POSTED, created__gte=day_start(first_day), created__lt=day_start(last_day + ONE_DAY),
+    ).order_by()
+
+
+def entry_lines(entries) -> list:
+    """
+    The account lines of `entries` as two querysets of (account, currency, debit, credit):
+    `debit_amount` on `debit_name` and `credit_amount` on `credit_name`.
+    """
+    return [
+        entries.annotate(account=Coalesce('debit_name', Value('')), currency=F('base_currency'), debit=F('debit_amount'), credit=ZERO),
+        entries.annotate(account=Coalesce('credit_name', Value('')), currency=F('base_currency'), debit=ZERO, credit=F('credit_amount')),
+    ]
+
+
+def get_watermark(using: str = 'default'):
+    """ Last closed day, or None if nothing has been closed yet. """
+    return LedgerCloseModel.objects.using(using).filter(name='journal').values_list('closed_through', flat=True).first()
+
+
+def reopen_period(day: datetime.date, using: str = 'default') -> None:
+    """
+    Move the watermark back before `day` when a posted entry of a closed day changes,
+    so the day is read from the journal again until the next close rebuilds it.
+    """
+    LedgerCloseModel.objects.using(using).filter(name='journal', closed_through__gte=day).update(
+        closed_through=day - ONE_DAY, modified=timezone.now(),
+    )
+
+
+
+def close_day_rows(first_day: datetime.date, last_day: datetime.date, using: str) -> list:
+    """ Day snapshots for `first_day`..`last_day`, one GROUP BY query per side of the entries. """
+    totals = defaultdict(lambda: [Decimal('0'), Decimal('0'), 0])
+    for lines in entry_lines(posted_entries(first_day, last_day, using)):
+        grouped = lines.annotate(day=TruncDate('created')).values('day', 'account', 'currency').annotate(
+            total_debit=Sum('debit'), total_credit=Sum('credit'), count=Count('pk'),
+        )
+        for row in grouped:
+            total = totals[(row['day'], row['account'], row['currency'])]
+            total[0] += to_decimal(row['total_debit'])
+            total[1] += to_decimal(row['total_credit'])
+            total[2] += row['count']
+
+    return [
+        LedgerPeriodBalanceModel(
+            period=PERIOD.DAY, period_start=day, account=account, currency=currency, debit=debit, credit=credit, entries=entries,
+        )
+        for (day, account, currency), (debit, credit, entries) in totals.items()
+    ]
+
+
+def close_month_rows(month: datetime.date, using: str) -> list:
+    """ Month snapshots of `month`, summed from its day snapshots. """
+    days = LedgerPeriodBalanceModel.objects.using(using).filter(
+        period=PERIOD.DAY, period_start__gte=month, period_start__lt=next_month(month),
+    ).order_by()
+    grouped = days.values('account', 'currency').annotate(
+        total_debit=Sum('debit'), total_credit=Sum('credit'), count=Sum('entries'),
+    )
+    return [
+        LedgerPeriodBalanceModel(
+            period=PERIOD.MONTH, period_start=month, account=row['account'], currency=row['currency'],
+            debit=to_decimal(row['total_debit']), credit=to_decimal(row['total_credit']), entries=row['count'],
+        )
+        for row in grouped
+    ]
+
+
+def close_periods(through: datetime.date = None, using: str = 'default', batch_size: int = 1000) -> datetime.date:
+    """
+    Materialize day and month snapshots for every day after the watermark up to `through`
+    (yesterday by default; the current day stays open) and advance the watermark.
+
+    Works one month at a time, each in its own transaction, so closing years of history
+    holds no long locks and a failure keeps the months already closed. Snapshots after
+    the watermark (left by a reopened period) are rebuilt. Returns the new watermark.
+    """
+    through = through or timezone.localdate() - ONE_DAY
+    with transaction.atomic(using=using):
+        close, _ = LedgerCloseModel.objects.using(using).get_or_create(name='journal')
+    if close.closed_through is None:
+        # start the day before the first posted entry; an empty journal is closed outright
+        first = JournalEntryModel.objects.using(using).filter(status=JournalEntryModel.STATUS.POSTED).order_by('created').first()
+        start = timezone.localtime(first.created).date() - ONE_DAY if first else through
+        LedgerCloseModel.objects.using(using).filter(pk=close.pk, closed_through__isnull=True).update(
+            closed_through=start, modified=timezone.now(),
+        )
+
+    while True:
+        with transaction.atomic(using=using):
+            close       = LedgerCloseModel.objects.using(using).select_for_update().get(pk=close.pk)
+            first_day   = close.closed_through + ONE_DAY
+            if first_day > through:
+                break
+            month       = month_start(first_day)
+            last_day    = min(through, next_month(month) - ONE_DAY)
+
+            snapshots = LedgerPeriodBalanceModel.objects.using(using)
+            snapshots.filter(period=PERIOD.DAY, period_start__gte=first_day).delete()
+            snapshots.filter(period=PERIOD.MONTH, period_start__gte=month).delete()
+            snapshots.bulk_create(close_day_rows(first_day, last_day, using), batch_size=batch_size)
+            if last_day == next_month(month) - ONE_DAY:
+                snapshots.bulk_create(close_month_rows(month, using), batch_size=batch_size)
+
+            close.closed_through = last_day
+            close.save(update_fields=['closed_through', 'modified'])
+    return close.closed_through
+
+
+
+def snapshot_lines(start: datetime.date, end: datetime.date, using: str) -> list:
+    """
+    Snapshot querysets covering the closed days of `start`..`end`: month rows for the
+    whole months inside the range, day rows for the partial months at either end.
+    """
+    snapshots   = LedgerPeriodBalanceModel.objects.using(using).order_by().values_list('account', 'currency', 'debit', 'credit')
+    first_month = start if start.day == 1 else next_month(start)
+    months      = []
+    month       = first_month
+    while next_month(month) - ONE_DAY <= end:
+        months.append(month)
+        month = next_month(month)
+
+    if not months:
+        return [snapshots.filter(period=PERIOD.DAY, period_start__gte=start, period_start__lte=end)]
+    days = Q(period_start__gte=start, period_start__lt=months[0]) | Q(period_start__gte=next_month(months[-1]), period_start__lte=end)
+    return [
+        snapshots.filter(period=PERIOD.MONTH, period_start__gte=months[0], period_start__lte=months[-1]),
+        snapshots.filter(days, period=PERIOD.DAY),
+    ]
+
+
+def trial_balance(start: datetime.date, end: datetime.date, using: str = 'default') -> dict:
+    """
+    Posted debit and credit per account and currency between two dates (inclusive).
+
+    Closed days are read from the period snapshots, days after the watermark from the
+    journal, and both are combined with UNION ALL and grouped in a single query.
+    """
+    watermark   = get_watermark(using)
+    closed_end  = min(end, watermark) if watermark else None
+    open_start  = max(start, watermark + ONE_DAY) if watermark else start
+
+    parts = []
+    if closed_end and start <= closed_end:
+        parts += snapshot_lines(start, closed_end, using)
+    if open_start <= end:
+        parts += [lines.values_list('account', 'currency', 'debit', 'credit') for lines in entry_lines(posted_entries(open_start, end, using))]
+
+    rows = []
+    if parts:
+        union_sql, params = parts[0].union(*parts[1:], all=True).query.get_compiler(using).as_sql()
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                'SELECT account, currency, SUM(debit), SUM(credit) '
+                f'FROM ({union_sql}) lines GROUP BY account, currency ORDER BY account, currency',
+                params,
+            )
+            rows = cursor.fetchall()
+
+    accounts    = []
+    currencies  = defaultdict(lambda: {'debit': Decimal('0'), 'credit': Decimal('0')})
+    for account, currency, debit, credit in rows:
+        debit, credit = to_decimal(debit), to_decimal(credit)
+        if not debit and not credit:
+            continue
+        accounts.append({'account': account, 'currency': currency, 'debit': debit, 'credit': credit, 'balance': debit - credit})
+        currencies[currency]['debit'] += debit
+        currencies[currency]['credit'] += credit
+
+    total_debit     = sum((totals['debit'] for totals in currencies.values()), Decimal('0'))
+    total_credit    = sum((totals['credit'] for totals in currencies.values()), Decimal('0'))
+    return {
+        'total_debit':      total_debit,
+        'total_credit':     total_credit,
+        'balance':          total_debit - total_credit,
+        'currencies':       {currency: {**totals, 'balance': totals['debit'] - totals['credit']} for currency, totals in sorted(currencies.items())},
+        'accounts':         accounts,
+        'closed_through':   watermark,
+    }
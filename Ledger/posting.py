@@ -0,0 +1,193 @@
+import datetime
+from decimal import Decimal
+from collections import defaultdict
+from django.db import transaction
+from django.db import connections
+from django.db.models import DateTimeField
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from Cart.models import OrderModel
+
+from .models import JournalEntryModel
+from .models import entry_numbers
+from .serializers import JournalPostingSerializer
+from .balances import resolve_accounts
+from .balances import line_deltas
+from .balances import entry_values
+from .balances import apply_deltas
+from .periods import reopen_period
+from .periods import FOUR_PLACES
+
+
+BACKDATE_CHUNK_SIZE = 500
+
+
+
+class PostingError(Exception):
+    """
+    Raised when a batch cannot be posted; nothing of the batch is written.
+    `errors` is a list of `{'row': index, 'errors': [...]}`; unbalanced batches use row None.
+    """
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} rows of the batch were rejected.")
+
+
+
+def month_end(day: datetime.date) -> datetime.date:
+    """ The default `ended` of an entry, as JournalEntryModel.save computes it. """
+    first_of_next = (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return first_of_next - datetime.timedelta(days=1)
+
+
+def error_messages(errors) -> list:
+    """ Flat "field: message" strings from serializer errors. """
+    return [
+        message if field == 'non_field_errors' else f"{field}: {message}"
+        for field, messages in errors.items() for message in messages
+    ]
+
+
+def known_orders(rows, using: str) -> set:
+    """ The ids of the orders `rows` reference (`ent` / `ent_id`) that exist, in one query per chunk. """
+    ids = set()
+    for row in rows:
+        try:
+            ids.add(int(row.get('ent') or row.get('ent_id')))
+        except (TypeError, ValueError):
+            continue
+    ids, known = list(ids), set()
+    for start in range(0, len(ids), BACKDATE_CHUNK_SIZE):
+        known.update(OrderModel.objects.using(using).filter(pk__in=ids[start:start + BACKDATE_CHUNK_SIZE]).values_list('pk', flat=True))
+    return known
+
+
+def build_entry(row: dict, author=None, orders: set = None):
+    """
+    A JournalEntryModel (not saved) and its backdated `created` from one row, or a list of errors.
+    The row is validated with JournalPostingSerializer; `orders` are the known order ids of the
+    batch (see known_orders). A missing `reference_num` gets a random one.
+    """
+    serializer = JournalPostingSerializer(data=row, context={'orders': orders})
+    if not serializer.is_valid():
+        return None, None, error_messages(serializer.errors)
+
+    values  = dict(serializer.validated_data)
+    created = values.pop('created', None)
+    values['ent_id'] = values.pop('ent', None)
+    values['ended']  = values.get('ended') or month_end(timezone.localtime(created).date() if created else timezone.localdate())
+    return JournalEntryModel(author=author, **values), created, []
+
+
+def backdate_expression(moments: dict, using: str) -> RawSQL:
+    """
+    `CASE reference_num WHEN ... THEN <created> ... END` for `{reference_num: created}`, as a
+    single raw expression: an ORM Case() with hundreds of When()s costs more to compile
+    than the UPDATE takes to run.
+    """
+    connection  = connections[using]
+    reference   = JournalEntryModel._meta.get_field('reference_num')
+    created     = JournalEntryModel._meta.get_field('created')
+    placeholder = 'CAST(%s AS timestamp with time zone)' if connection.vendor == 'postgresql' else '%s'
+    params      = []
+    for value, moment in moments.items():
+        params += [reference.get_db_prep_value(value, connection), created.get_db_prep_value(moment, connection)]
+    whens = ' '.join([f'WHEN %s THEN {placeholder}'] * len(moments))
+    return RawSQL(f'CASE {connection.ops.quote_name(reference.column)} {whens} END', params, output_field=DateTimeField())
+
+
+def check_balanced(entries) -> list:
+    """ Errors for every currency whose debits and credits differ over the batch (posted entries only). """
+    totals = defaultdict(lambda: [Decimal('0'), Decimal('0')])
+    for entry in entries:
+        if entry.status == JournalEntryModel.STATUS.POSTED:
+            totals[entry.base_currency][0] += entry.debit_amount
+            totals[entry.base_currency][1] += entry.credit_amount
+    return [
+        {'row': None, 'errors': [f"{currency} debits {debit} do not equal credits {credit}."]}
+        for currency, (debit, credit) in sorted(totals.items()) if debit != credit
+    ]
+
+
+def check_references(given: dict, using: str) -> list:
+    """ Errors for the rows whose `reference_num` is already posted; `given` is `{reference_num: row}`. """
+    errors = []
+    posted = JournalEntryModel.objects.using(using).values_list('reference_num', flat=True)
+    chunk  = list(given)
+    for start in range(0, len(chunk), BACKDATE_CHUNK_SIZE):
+        for reference in posted.filter(reference_num__in=chunk[start:start + BACKDATE_CHUNK_SIZE]):
+            errors.append({'row': given[reference], 'errors': [f"reference_num {reference} is already posted."]})
+    return errors
+
+
+
+def post_entries(rows, author=None, using: str = 'default', chunk_size: int = 2000) -> dict:
+    """
+    Post a batch of journal entries in one transaction with a fixed number of statements:
+
+    1. validate every row and check that debits equal credits per currency
+    2. resolve all account names in one lookup
+    3. allocate the batch's `ent_num` range in one step
+    4. `bulk_create` the entries in chunks of `chunk_size`
+    5. backdate `created` (rows carrying one) with one CASE UPDATE per 500 rows
+    6. add the batch to the running account balances, one UPDATE per account and currency
+
+    Raises PostingError, without writing anything, when a row is invalid, the batch is
+    unbalanced or a given `reference_num` is already posted (so a batch re-sent with fixed
+    reference numbers is never posted twice). Returns the number of entries and their
+    `ent_num` range.
+    """
+    rows    = list(rows)
+    orders  = known_orders(rows, using)
+    entries, created, errors, given = [], [], [], {}
+    for index, row in enumerate(rows):
+        entry, moment, row_errors = build_entry(row, author, orders)
+        if not row_errors and row.get('reference_num'):
+            if entry.reference_num in given:
+                row_errors = [f"reference_num {entry.reference_num} repeats row {given[entry.reference_num]}."]
+            given.setdefault(entry.reference_num, index)
+        if row_errors:
+            errors.append({'row': index, 'errors': row_errors})
+            continue
+        entries.append(entry)
+        created.append(moment)
+    errors += check_balanced(entries)
+    errors += check_references(given, using)
+    if errors:
+        raise PostingError(errors)
+    if not entries:
+        return {'posted': 0, 'first_ent_num': None, 'last_ent_num': None}
+
+    accounts = resolve_accounts([name for entry in entries for name in (entry.debit_name, entry.credit_name)], using)
+    for entry in entries:
+        entry.debit_account_id  = accounts[entry.debit_name]
+        entry.credit_account_id = accounts[entry.credit_name]
+
+    # reserved outside the transaction so the whole range is taken in one counter bump
+    numbers = entry_numbers.allocate(len(entries), using=using)
+    for entry, number in zip(entries, numbers):
+        entry.ent_num = Decimal(number).quantize(FOUR_PLACES)
+
+    deltas = None
+    with transaction.atomic(using=using):
+        manager = JournalEntryModel.objects.using(using)
+        for start in range(0, len(entries), chunk_size):
+            manager.bulk_create(entries[start:start + chunk_size])
+
+        # auto_now_add stamps every insert with the current time; keyed on the unique
+        # reference_num because not every backend returns primary keys from bulk_create
+        dated = [(entry.reference_num, moment) for entry, moment in zip(entries, created) if moment]
+        for start in range(0, len(dated), BACKDATE_CHUNK_SIZE):
+            chunk = dict(dated[start:start + BACKDATE_CHUNK_SIZE])
+            manager.filter(reference_num__in=chunk).update(created=backdate_expression(chunk, using))
+
+        for entry in entries:
+            deltas = line_deltas(entry_values(entry), deltas=deltas)
+        apply_deltas(deltas, using)
+
+        if dated:
+            # snapshots of closed days the batch landed in are stale now
+            reopen_period(timezone.localtime(min(moment for _, moment in dated)).date(), using)
+
+    return {'posted': len(entries), 'first_ent_num': numbers[0], 'last_ent_num': numbers[-1]}
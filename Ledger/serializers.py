@@ -1,7 +1,160 @@
+import datetime
+from decimal import Decimal
+from decimal import ROUND_HALF_EVEN
 from rest_framework import serializers 
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.dateparse import parse_date
+
+from Cart.models import OrderModel
+
+from .models import AccountModel
+from .models import AccountBalanceModel
+from .models import JournalEntryModel
 
 
 class TrialBalanceSerializer(serializers.Serializer):
     created = serializers.DateField(required=True) 
     ended = serializers.DateField(required=True)
 
+
+
+
+class AccountBalanceSerializer(serializers.ModelSerializer):
+    balance = serializers.SerializerMethodField()
+
+    class Meta:
+        model  = AccountBalanceModel
+        fields = ['currency', 'debit', 'credit', 'balance', 'entries']
+
+    def get_balance(self, obj):
+        """Balance on the account's normal side."""
+        return str(obj.debit - obj.credit if obj.account.debit_normal else obj.credit - obj.debit)
+
+
+
+class AccountSerializer(serializers.ModelSerializer):
+    balances = AccountBalanceSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = AccountModel
+        fields = ['id', 'code', 'name', 'account_type', 'is_active', 'balances', 'created', 'modified']
+        read_only_fields = ['id', 'created', 'modified']
+
+
+
+class StatementLineSerializer(serializers.ModelSerializer):
+    debit   = serializers.SerializerMethodField()
+    credit  = serializers.SerializerMethodField()
+
+    class Meta:
+        model = JournalEntryModel
+        fields = ['ent_num', 'ent_name', 'ent_description', 'created', 'base_currency', 'debit', 'credit', 'debit_name', 'credit_name']
+
+    def get_debit(self, obj):
+        return str(obj.debit_amount) if obj.debit_account_id == self.context['account'].pk else '0'
+
+    def get_credit(self, obj):
+        return str(obj.credit_amount) if obj.credit_account_id == self.context['account'].pk else '0'
+
+
+
+class StatementParamsSerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if attrs.get('start') and attrs.get('end') and attrs['start'] > attrs['end']:
+            raise serializers.ValidationError("'start' must not be after 'end'.")
+        return attrs
+
+
+
+class BackdateField(serializers.Field):
+    """ A datetime, or a date (taken at noon); naive values are in the current time zone. """
+
+    def to_internal_value(self, data):
+        if isinstance(data, datetime.datetime):
+            moment = data
+        else:
+            moment = parse_datetime(str(data))
+            if moment is None:
+                day = parse_date(str(data))
+                if day is None:
+                    raise serializers.ValidationError(f"'{data}' is not a date or datetime.")
+                moment = datetime.datetime.combine(day, datetime.time(12))
+        return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+    def to_representation(self, value):
+        return value.isoformat()
+
+
+class EntryOrderField(serializers.PrimaryKeyRelatedField):
+    """
+    The order id of an entry. With `orders` in the context (the ids of a batch, loaded
+    in one query) it is checked against those instead of one query per row.
+    """
+
+    def to_internal_value(self, data):
+        orders = self.context.get('orders')
+        if orders is None:
+            return super().to_internal_value(data).pk
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in orders:
+            self.fail('does_not_exist', pk_value=data)
+        return pk
+
+
+def amount_field():
+    return serializers.DecimalField(
+        max_digits=19, decimal_places=4, rounding=ROUND_HALF_EVEN, min_value=Decimal('0'), required=False, allow_null=True,
+    )
+
+
+class JournalPostingSerializer(serializers.Serializer):
+    """
+    Validates one row of a bulk posting (see Ledger.posting). A missing `debit_amount` /
+    `credit_amount` defaults to `amount`; `ent` may also be sent as `ent_id`.
+    """
+    amount          = amount_field()
+    debit_amount    = amount_field()
+    credit_amount   = amount_field()
+    tax_amount      = amount_field()
+    base_currency   = serializers.ChoiceField(choices=JournalEntryModel.CURRENCY.choices, default=JournalEntryModel.CURRENCY.USD)
+    category        = serializers.ChoiceField(choices=JournalEntryModel.CATEGORY.choices, default=JournalEntryModel.CATEGORY.SALES_REVENUE)
+    status          = serializers.ChoiceField(choices=JournalEntryModel.STATUS.choices, default=JournalEntryModel.STATUS.POSTED)
+    ent_name        = serializers.CharField(max_length=255, required=False)
+    ent_description = serializers.CharField(max_length=255, required=False)
+    debit_name      = serializers.CharField(max_length=255)
+    credit_name     = serializers.CharField(max_length=255)
+    ent             = EntryOrderField(queryset=OrderModel.objects.all(), required=False)
+    created         = BackdateField(required=False)
+    ended           = serializers.DateField(required=False)
+    reference_num   = serializers.UUIDField(required=False)
+
+    def to_internal_value(self, data):
+        # CSV cells are strings: empty means "not set"
+        data = {key: value for key, value in data.items() if key and value not in ('', None)}
+        if 'ent' not in data and 'ent_id' in data:
+            data['ent'] = data['ent_id']
+        if isinstance(data.get('base_currency'), str):
+            data['base_currency'] = data['base_currency'].upper()
+        return super().to_internal_value(data)
+
+    def validate(self, attrs):
+        amount = attrs.get('amount')
+        errors = {}
+        for field in ('debit_amount', 'credit_amount'):
+            if attrs.get(field) is None:
+                attrs[field] = amount
+            if attrs[field] is None:
+                errors[field] = "Required when 'amount' is missing."
+        if errors:
+            raise serializers.ValidationError(errors)
+        attrs['amount']     = amount if amount is not None else attrs['debit_amount']
+        attrs['tax_amount'] = attrs.get('tax_amount') or Decimal('0')
+        return attrs
+
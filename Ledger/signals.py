@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import JournalEntryModel
+from .periods import reopen_period
+from .balances import apply_deltas
+from .balances import entry_values
+from .balances import line_deltas
+
+
+@receiver([post_save, post_delete], sender=JournalEntryModel)
+def reopen_closed_period(sender, instance, using, **kwargs):
+    """A changed entry of a closed day makes its snapshots stale; read that day from the journal again."""
+    if instance.created:
+        reopen_period(timezone.localtime(instance.created).date(), using=using)
+
+
+@receiver(post_delete, sender=JournalEntryModel)
+def reverse_account_balances(sender, instance, using, **kwargs):
+    """Take a deleted posted entry out of the running account balances."""
+    apply_deltas(line_deltas(entry_values(instance), -1), using=using)
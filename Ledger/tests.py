@@ -1,3 +1,209 @@
+import datetime
+from decimal import Decimal
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .models import JournalEntryModel
+from .models import LedgerPeriodBalanceModel
+from .models import AccountModel
+from .models import AccountBalanceModel
+from .balances import balance_sheet
+from .balances import rebuild_balances
+from .posting import post_entries
+from .posting import PostingError
+from .periods import close_periods
+from .periods import get_watermark
+from .periods import trial_balance
+
+
+def entry(day, debit_name, credit_name, amount, currency='USD', status=JournalEntryModel.STATUS.POSTED):
+    created = timezone.make_aware(datetime.datetime.combine(day, datetime.time(12)))
+    journal = JournalEntryModel.objects.create(
+        debit_name=debit_name, credit_name=credit_name, debit_amount=amount, credit_amount=amount,
+        base_currency=currency, status=status,
+    )
+    JournalEntryModel.objects.filter(pk=journal.pk).update(created=created)
+    journal.created = created
+    return journal
+
+
+def balances(result) -> dict:
+    return {(row['account'], row['currency']): (row['debit'], row['credit']) for row in result['accounts']}
+
+
+
+class LedgerPeriodTest(TestCase):
+
+    def setUp(self):
+        self.sale = entry(datetime.date(2024, 1, 10), 'Cash', 'Sales', Decimal('100'))
+        entry(datetime.date(2024, 2, 5), 'Cash', 'Sales', Decimal('50'))
+        entry(datetime.date(2024, 2, 20), 'Rent', 'Cash', Decimal('30'), currency='EUR')
+        entry(datetime.date(2024, 3, 3), 'Cash', 'Sales', Decimal('20'))
+        entry(datetime.date(2024, 3, 4), 'Cash', 'Sales', Decimal('999'), status=JournalEntryModel.STATUS.DRAFT)
+
+    def test_snapshots_match_journal(self):
+        start, end  = datetime.date(2024, 1, 1), datetime.date(2024, 3, 31)
+        expected    = trial_balance(start, end)
+        self.assertEqual(balances(expected)[('Cash', 'USD')], (Decimal('170'), Decimal('0')))
+        self.assertEqual(expected['currencies']['EUR'], {'debit': Decimal('30'), 'credit': Decimal('30'), 'balance': Decimal('0')})
+
+        self.assertEqual(close_periods(datetime.date(2024, 2, 29)), datetime.date(2024, 2, 29))
+        self.assertEqual(LedgerPeriodBalanceModel.objects.filter(period='month').count(), 6)
+
+        with self.assertNumQueries(2):     # the watermark, then snapshots and open entries in one query
+            closed = trial_balance(start, end)
+        self.assertEqual(closed['accounts'], expected['accounts'])
+        self.assertEqual(closed['closed_through'], datetime.date(2024, 2, 29))
+
+        partial = balances(trial_balance(datetime.date(2024, 1, 15), datetime.date(2024, 2, 25)))
+        self.assertEqual(partial[('Sales', 'USD')], (Decimal('0'), Decimal('50')))
+        self.assertEqual(partial[('Rent', 'EUR')], (Decimal('30'), Decimal('0')))
+
+    def test_editing_closed_entry_reopens_period(self):
+        close_periods(datetime.date(2024, 2, 29))
+        self.sale.credit_amount = Decimal('80')
+        self.sale.save()
+        self.assertEqual(get_watermark(), datetime.date(2024, 1, 9))
+
+        result = balances(trial_balance(datetime.date(2024, 1, 1), datetime.date(2024, 2, 29)))
+        self.assertEqual(result[('Sales', 'USD')], (Decimal('0'), Decimal('130')))
+
+        close_periods(datetime.date(2024, 2, 29))
+        january = LedgerPeriodBalanceModel.objects.get(period='month', period_start=datetime.date(2024, 1, 1), account='Sales')
+        self.assertEqual(january.credit, Decimal('80'))
+
+
+
+class AccountBalanceTest(TestCase):
+
+    def balance(self, code, currency='USD'):
+        row = AccountBalanceModel.objects.get(account__code=code, currency=currency)
+        return row.debit, row.credit, row.entries
+
+    def test_running_balances_follow_entries(self):
+        sale = entry(datetime.date(2024, 1, 10), 'bank_account', 'sales_revenue', Decimal('100'))
+        entry(datetime.date(2024, 1, 11), 'Bank Account', 'sales_revenue', Decimal('40'))
+        self.assertEqual(sale.debit_account.code, 'bank_account')
+        self.assertEqual(self.balance('bank_account'), (Decimal('140'), Decimal('0'), 2))
+
+        sale.credit_amount = sale.debit_amount = Decimal('90')
+        sale.save()
+        self.assertEqual(self.balance('sales_revenue'), (Decimal('0'), Decimal('130'), 2))
+
+        sale.status = JournalEntryModel.STATUS.DRAFT
+        sale.save(update_fields=['status'])
+        self.assertEqual(self.balance('bank_account'), (Decimal('40'), Decimal('0'), 1))
+
+        JournalEntryModel.objects.filter(debit_name='Bank Account').delete()
+        self.assertEqual(self.balance('bank_account'), (Decimal('0'), Decimal('0'), 0))
+
+    def test_renamed_side_moves_the_account_link(self):
+        sale = entry(datetime.date(2024, 1, 10), 'bank_account', 'sales_revenue', Decimal('100'))
+        sale.debit_name = 'cash'
+        sale.save()
+        self.assertEqual(sale.debit_account.code, 'cash')
+        self.assertEqual(self.balance('bank_account'), (Decimal('0'), Decimal('0'), 0))
+        self.assertEqual(self.balance('cash'), (Decimal('100'), Decimal('0'), 1))
+
+        sale.credit_name = 'Service Revenue'
+        sale.save(update_fields=['credit_name'])
+        self.assertEqual(JournalEntryModel.objects.get(pk=sale.pk).credit_account.code, 'service_revenue')
+        self.assertEqual(self.balance('service_revenue'), (Decimal('0'), Decimal('100'), 1))
+        self.assertEqual(self.balance('sales_revenue'), (Decimal('0'), Decimal('0'), 0))
+
+        # running balances (by account) and the trial balance (by name) agree
+        trial = balances(trial_balance(datetime.date(2024, 1, 1), datetime.date(2024, 1, 31)))
+        self.assertEqual(trial, {('cash', 'USD'): (Decimal('100'), Decimal('0')), ('Service Revenue', 'USD'): (Decimal('0'), Decimal('100'))})
+
+    def test_balance_sheet_and_rebuild(self):
+        entry(datetime.date(2024, 1, 10), 'bank_account', 'sales_revenue', Decimal('100'))
+        entry(datetime.date(2024, 1, 12), 'rent_expense', 'bank_account', Decimal('30'))
+        sheet = balance_sheet()['USD']
+        self.assertTrue(sheet['balanced'])
+        self.assertEqual(sheet['totals']['asset'], Decimal('70'))
+        self.assertEqual(sheet['totals']['net_income'], Decimal('70'))
+
+        JournalEntryModel.objects.filter(debit_name='rent_expense').update(debit_amount=50, credit_amount=50)
+        drift = rebuild_balances(batch_size=1)
+        self.assertEqual({code for code, *_ in drift}, {'bank_account', 'rent_expense'})
+        self.assertEqual(self.balance('bank_account'), (Decimal('100'), Decimal('50'), 2))
+        self.assertEqual(rebuild_balances(), [])
+
+    def test_statement(self):
+        entry(datetime.date(2024, 1, 10), 'bank_account', 'sales_revenue', Decimal('100'))
+        entry(datetime.date(2024, 2, 10), 'bank_account', 'sales_revenue', Decimal('50'))
+        entry(datetime.date(2024, 3, 10), 'rent_expense', 'bank_account', Decimal('30'))
+        staff = get_user_model().objects.create_user(username='auditor', email='auditor@example.com', password='pass1234', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(staff)
+
+        response = client.get('/api/v1/ledger-accounts/sales_revenue/statement/', {'start': '2024-02-01', 'end': '2024-02-29'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['credit'], '50.0000')
+        self.assertEqual(response.data['opening'], {'USD': Decimal('100')})
+        self.assertEqual(response.data['closing'], {'USD': Decimal('150')})
+        self.assertEqual(AccountModel.objects.get(code='rent_expense').account_type, 'expense')
+
+
+
+class JournalPostingTest(TestCase):
+
+    def rows(self, count, **extra):
+        return [
+            {'ent_name': f'Payment {i}', 'debit_name': 'bank_account', 'credit_name': 'sales_revenue', 'amount': '10.50', **extra}
+            for i in range(count)
+        ]
+
+    def test_post_batch(self):
+        close_periods(datetime.date(2024, 3, 31))
+        with CaptureQueriesContext(connection) as queries:
+            report = post_entries(self.rows(25, created='2024-02-10'), chunk_size=10)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "xApiLedger_journalentrymodel"')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(report['posted'], 25)
+        self.assertEqual(report['last_ent_num'] - report['first_ent_num'], 24)
+
+        entries = JournalEntryModel.objects.all()
+        self.assertEqual(entries.count(), 25)
+        self.assertEqual(set(entries.values_list('created__date', flat=True)), {datetime.date(2024, 2, 10)})
+        self.assertEqual(AccountBalanceModel.objects.get(account__code='bank_account').debit, Decimal('262.5'))
+        self.assertEqual(get_watermark(), datetime.date(2024, 2, 9))
+        self.assertEqual(rebuild_balances(), [])
+
+    def test_rejects_whole_batch(self):
+        rows = self.rows(3) + [{'debit_name': 'bank_account', 'credit_name': 'sales_revenue', 'debit_amount': '5', 'credit_amount': '4'}]
+        with self.assertRaises(PostingError) as raised:
+            post_entries(rows)
+        self.assertEqual(raised.exception.errors[0]['row'], None)
+
+        with self.assertRaises(PostingError) as raised:
+            post_entries(self.rows(2) + [{'debit_name': 'bank_account', 'amount': 'ten'}])
+        self.assertEqual(raised.exception.errors[0]['row'], 2)
+        self.assertFalse(JournalEntryModel.objects.exists())
+
+    def test_invalid_rows_are_rejected_by_the_api(self):
+        staff = get_user_model().objects.create_user(username='poster', email='poster@example.com', password='pass1234', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(staff)
+        for invalid in ({'amount': 'NaN'}, {'base_currency': 5}, {'ent': 999999}, {'ent_name': 'x' * 256}):
+            response = client.post('/api/v1/journal-entries/bulk/', {'entries': self.rows(1, **invalid)}, format='json')
+            self.assertEqual(response.status_code, 400, invalid)
+            self.assertEqual(response.data['errors'][0]['row'], 0)
+        self.assertFalse(JournalEntryModel.objects.exists())
+
+        response = client.post('/api/v1/journal-entries/bulk/', {'entries': self.rows(2, base_currency='eur')}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(set(JournalEntryModel.objects.values_list('base_currency', flat=True)), {'EUR'})
+
+    def test_reference_num_posts_once(self):
+        reference = '0f8e7c5a-3d1b-4b2a-9c6e-5a4d3c2b1a00'
+        post_entries(self.rows(1, reference_num=reference))
+        with self.assertRaises(PostingError) as raised:
+            post_entries(self.rows(2) + self.rows(1, reference_num=reference))
+        self.assertEqual(raised.exception.errors[0]['row'], 2)
+        self.assertEqual(JournalEntryModel.objects.count(), 1)
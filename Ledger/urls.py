@@ -3,10 +3,16 @@ from rest_framework.routers import DefaultRouter
 router = DefaultRouter()
 
 from .views import TrialBalanceViewSet
+from .views import AccountViewSet
+from .views import JournalPostingView
+
+router.register(r'ledger-accounts', AccountViewSet, basename='ledger-account')
 
 
 
 
 urlpatterns = [
     path('trial-balance/', TrialBalanceViewSet.as_view(), name='trial-balance-list'),
+    path('journal-entries/bulk/', JournalPostingView.as_view(), name='journal-entry-bulk'),
+    path('', include(router.urls)),
 ]
@@ -1,14 +1,25 @@
-from django.db import models 
 from rest_framework import viewsets 
 from rest_framework.views import APIView 
 from rest_framework.response import Response 
 from rest_framework import permissions 
 from rest_framework import throttling 
+from rest_framework.decorators import action
+from django.utils import timezone
 
 from core.core_permissions import IsOwnerStaffOrSuperUser 
+from core.pagepagination import DynamicPagination
+from core.queryoptimizer import QueryOptimizerMixin
 
-from .models import JournalEntryModel 
+from .models import AccountModel
+from .periods import trial_balance
+from .balances import balance_sheet
+from .balances import account_statement
+from .posting import post_entries
+from .posting import PostingError
 from .serializers import TrialBalanceSerializer 
+from .serializers import AccountSerializer
+from .serializers import StatementLineSerializer
+from .serializers import StatementParamsSerializer
 
 
 
@@ -18,8 +29,9 @@ class TrialBalanceViewSet(APIView):
 
     def post(self, request, *args, **kwargs):
         """
-        Example endpoint to demonstrate trial balance calculation.
-        This can be extended to filter by date range or other parameters.
+        Posted debit and credit between `created` and `ended` (inclusive), in total, per
+        currency and per account. Closed periods are read from the ledger snapshots
+        (see Ledger.periods), so the cost no longer grows with the length of the range.
         """
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -29,15 +41,66 @@ class TrialBalanceViewSet(APIView):
 
         if not start_date or not ended:
             return Response({"error": "Both 'created' and 'ended' dates are required."}, status=400)
-        
-        total_debit = JournalEntryModel.objects.filter(status='posted', created__gte=start_date, created__lte=ended).aggregate(total_debit=models.Sum('debit_amount'))['total_debit'] or 0
-        total_credit = JournalEntryModel.objects.filter(status='posted', created__gte=start_date, created__lte=ended).aggregate(total_credit=models.Sum('credit_amount'))['total_credit'] or 0
-        
-        trial_balance = {
-            'total_debit': total_debit,
-            'total_credit': total_credit,
-            'balance': total_debit - total_credit
-        }
-        
-        return Response(trial_balance)
-    
+        if start_date > ended:
+            return Response({"error": "'created' must not be after 'ended'."}, status=400)
+
+        return Response(trial_balance(start_date, ended))
+
+
+
+class AccountViewSet(QueryOptimizerMixin, viewsets.ModelViewSet):
+    """
+    Chart of accounts with running balances (staff only).
+
+        /ledger-accounts/balance-sheet/                             balance sheet per currency
+        /ledger-accounts/<code>/statement/?start=&end=              entries and opening/closing balance
+
+    Both read the running balances instead of summing the journal.
+    """
+    queryset            = AccountModel.objects.all()
+    serializer_class    = AccountSerializer
+    permission_classes  = [permissions.IsAuthenticated, permissions.IsAdminUser]
+    pagination_class    = DynamicPagination
+    lookup_field        = 'code'
+    http_method_names   = ['get', 'post', 'put', 'patch']
+    throttle_classes    = [throttling.UserRateThrottle]
+
+    @action(detail=False, methods=['get'], url_path='balance-sheet')
+    def balance_sheet(self, request, *args, **kwargs):
+        return Response(balance_sheet())
+
+    @action(detail=True, methods=['get'])
+    def statement(self, request, *args, **kwargs):
+        account = self.get_object()
+        params = StatementParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        end = params.validated_data.get('end') or timezone.localdate()
+        start = params.validated_data.get('start') or end.replace(day=1)
+
+        lines, opening, closing = account_statement(account, start, end)
+        page = self.paginate_queryset(lines)
+        data = StatementLineSerializer(page, many=True, context={'account': account}).data
+        response = self.get_paginated_response(data)
+        response.data.update({'account': account.code, 'start': start, 'end': end, 'opening': opening, 'closing': closing})
+        return response
+
+
+
+class JournalPostingView(APIView):
+    """
+    Bulk posting (staff only): `POST {"entries": [...]}` or a JSON list of entries. The batch
+    is posted in one transaction, and rejected as a whole when a row is invalid or its
+    debits and credits do not balance per currency. See Ledger.posting.post_entries.
+    """
+    permission_classes  = [permissions.IsAuthenticated, permissions.IsAdminUser]
+    throttle_classes    = [throttling.UserRateThrottle]
+
+    def post(self, request, *args, **kwargs):
+        rows = request.data.get('entries') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            return Response({"error": "Send a list of entries, or {'entries': [...]}."}, status=400)
+        try:
+            report = post_entries(rows, author=request.user)
+        except PostingError as e:
+            return Response({"error": str(e), "errors": e.errors}, status=400)
+        return Response(report, status=201)
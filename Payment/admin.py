@@ -2,6 +2,7 @@ from django.contrib import admin
 
 from .models import PaymentModel 
 from .models import PayPalPaymentModel 
+from .models import StripeEventModel
 
 @admin.register(PaymentModel)
 class PaymentAdmin(admin.ModelAdmin):
@@ -23,4 +24,16 @@ class PayPalPaymentAdmin(admin.ModelAdmin):
     list_display = ('order', 'user', 'paypal_payment_status', 'created', 'modified') 
     search_fields = ('order__id', 'user__username', 'paypal_payment_status')
     list_filter = ('paypal_payment_status', 'created', 'modified')
-    readonly_fields = ('created', 'modified') 
\ No newline at end of file
+    readonly_fields = ('created', 'modified') 
+
+
+
+@admin.register(StripeEventModel)
+class StripeEventAdmin(admin.ModelAdmin):
+    """
+    Admin interface for StripeEventModel
+    """
+    list_display = ('event_id', 'event_type', 'status', 'created', 'processed_at')
+    search_fields = ('event_id',)
+    list_filter = ('status', 'event_type')
+    readonly_fields = ('created', 'modified')
@@ -7,4 +7,9 @@ class XapipaymentConfig(AppConfig):
     label = "xApiPayment"  # This label is used to avoid conflicts with other apps 
 
     def ready(self):
-        import Payment.signals 
\ No newline at end of file
+        import Payment.signals 
+        import Payment.webhooks
+        from .gateways import configure_stripe
+
+        # Stripe calls go through the pooled, circuit-broken gateway client
+        configure_stripe()
\ No newline at end of file
@@ -0,0 +1,70 @@
+import stripe
+import requests
+import paypalrestsdk
+from stripe import HTTPClient
+
+from core.gateway import get_client
+from core.gateway import CircuitOpenError
+
+
+
+class StripeGatewayClient(HTTPClient):
+    """
+    Stripe SDK transport over the shared `stripe` gateway client (pooling, deadlines,
+    circuit breaker, latency metrics). Retries are left to the SDK (`stripe.max_network_retries`),
+    which already backs off with jitter and sends an Idempotency-Key with every POST,
+    so calls are not retried by both layers.
+    """
+    name = 'xapi-gateway'
+
+    def __init__(self, gateway: str = 'stripe', **kwargs):
+        super().__init__(**kwargs)
+        self.gateway = gateway
+
+    def request(self, method, url, headers, post_data=None):
+        try:
+            response = get_client(self.gateway).request(method.upper(), url, headers=headers, data=post_data, idempotent=False)
+        except CircuitOpenError as e:
+            raise stripe.error.APIConnectionError(f"Stripe is unavailable: {e}", should_retry=False)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            raise stripe.error.APIConnectionError(f"Could not reach Stripe: {e}", should_retry=True)
+        except requests.exceptions.RequestException as e:
+            raise stripe.error.APIConnectionError(f"Could not reach Stripe: {e}", should_retry=False)
+        return response.content, response.status_code, response.headers
+
+    def request_stream(self, method, url, headers, post_data=None):
+        content, status_code, headers = self.request(method, url, headers, post_data)
+        return content, status_code, headers
+
+    def close(self):
+        get_client(self.gateway).close()
+
+
+
+class PayPalGatewayApi(paypalrestsdk.Api):
+    """
+    paypalrestsdk.Api sending its calls through the shared `paypal` gateway client instead
+    of a new connection per call. Payment creation carries a PayPal-Request-Id, so it is
+    retried like the idempotent lookups.
+    """
+
+    def __init__(self, options=None, gateway: str = 'paypal', **kwargs):
+        super().__init__(options, **kwargs)
+        self.gateway = gateway
+
+    def http_call(self, url, method, **kwargs):
+        if self.proxies:
+            kwargs['proxies'] = self.proxies
+        response = get_client(self.gateway).request(method, url, **kwargs)
+        return self.handle_response(response, response.content.decode('utf-8'))
+
+
+def configure_paypal(options: dict) -> PayPalGatewayApi:
+    """ Make a PayPalGatewayApi the default api of paypalrestsdk, like paypalrestsdk.configure(). """
+    paypalrestsdk.api.__api__ = PayPalGatewayApi(options)
+    return paypalrestsdk.api.__api__
+
+
+def configure_stripe() -> StripeGatewayClient:
+    stripe.default_http_client = StripeGatewayClient()
+    return stripe.default_http_client
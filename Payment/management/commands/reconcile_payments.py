@@ -0,0 +1,68 @@
+import json
+import time
+from django.db.models import Q
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.utils.dateparse import parse_date
+
+from core.rows import detect_format
+from Payment.reconciliation import GATEWAYS
+from Payment.reconciliation import PaymentReconciler
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcile a Stripe or PayPal settlement export (CSV or JSONL) against the recorded payments. "
+        "Reports payments missing on either side, duplicates and amount mismatches; --post books the "
+        "differences of settled payments against the payment_suspense account."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL settlement export, one payment per row.")
+        parser.add_argument('--file-format', choices=['csv', 'jsonl'], help="Defaults to the file extension.")
+        parser.add_argument('--gateway', choices=sorted(GATEWAYS), help="Gateway of rows without a 'gateway' column.")
+        parser.add_argument('--since', help="Only payments created on or after this date (YYYY-MM-DD) are reported unsettled.")
+        parser.add_argument('--until', help="Only payments created before this date (YYYY-MM-DD) are reported unsettled.")
+        parser.add_argument('--chunk-size', type=int, default=20000, help="Export rows matched per step.")
+        parser.add_argument('--post', action='store_true', help="Post correcting journal entries.")
+        parser.add_argument('--output', help="Write every issue to this JSONL file.")
+
+    def window(self, options) -> Q:
+        window = Q()
+        for option, lookup in (('since', 'created__date__gte'), ('until', 'created__date__lt')):
+            if options[option]:
+                day = parse_date(options[option])
+                if day is None:
+                    raise CommandError(f"--{option}: '{options[option]}' is not a date.")
+                window &= Q(**{lookup: day})
+        return window
+
+    def handle(self, *args, **options):
+        try:
+            file_format = detect_format(options['path'], options['file_format'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        window = self.window(options)
+
+        output   = open(options['output'], 'w') if options['output'] else None
+        on_issue = (lambda issue: output.write(json.dumps(issue) + '\n')) if output else None
+        reconciler = PaymentReconciler(
+            gateway=options['gateway'], chunk_size=options['chunk_size'], post=options['post'],
+            payments={gateway: window for gateway in GATEWAYS}, on_issue=on_issue,
+        )
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as stream:
+                report = reconciler.run(stream, file_format)
+        finally:
+            if output:
+                output.close()
+
+        counts = report.counts
+        for issue in report.issues[:20]:
+            self.stdout.write(json.dumps(issue))
+        self.stdout.write(', '.join(f"{key}: {value}" for key, value in counts.items()))
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {counts['lines']} lines in {time.perf_counter() - started:.1f}s, "
+            f"{counts['corrections']} corrections posted."
+        ))
@@ -55,4 +55,34 @@ class PayPalPaymentModel(TimeStampModel):
         ordering = ['-created'] 
 
     def __str__(self)-> str:
-        return f"PayPal Payment for Order {self.order.id} by {self.user.username}"
\ No newline at end of file
+        return f"PayPal Payment for Order {self.order.id} by {self.user.username}"
+
+
+
+class StripeEventModel(TimeStampModel):
+    """
+    A verified Stripe webhook event, stored once per event id so redeliveries are
+    acknowledged without being applied twice. Payment.webhooks applies them in batches.
+    """
+    class STATUS(models.TextChoices):
+        RECEIVED    = 'received', 'Received'
+        PROCESSED   = 'processed', 'Processed'
+        IGNORED     = 'ignored', 'Ignored'
+        FAILED      = 'failed', 'Failed'
+
+    event_id               = models.CharField(max_length=255, unique=True)
+    event_type             = models.CharField(max_length=100)
+    payload                = models.JSONField(default=dict)
+    status                 = models.CharField(max_length=20, choices=STATUS.choices, default=STATUS.RECEIVED)
+    processed_at           = models.DateTimeField(null=True, blank=True)
+    last_error             = models.TextField(blank=True, default='')
+
+    class Meta:
+        ordering = ['-created']
+        indexes  = [
+            # the processor reads the received events oldest first
+            models.Index(fields=['status', 'created'], name='stripeevent_status_created_idx'),
+        ]
+
+    def __str__(self)-> str:
+        return f"{self.event_type} {self.event_id} - {self.status}"
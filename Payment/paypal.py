@@ -1,8 +1,11 @@
 import paypalrestsdk 
 from django.conf import settings 
 
+from .gateways import configure_paypal
 
-paypalrestsdk.configure({
+
+# like paypalrestsdk.configure(), with calls going through the pooled gateway client
+configure_paypal({
     "mode" : settings.PAYPAL_MODE, 
     "client_id" : settings.PAYPAL_CLIENT_ID,
     "client_secret" : settings.PAYPAL_SECRET, 
@@ -0,0 +1,252 @@
+import uuid
+from decimal import Decimal
+from decimal import InvalidOperation
+from itertools import islice
+
+from core.rows import read_rows
+from Ledger.models import JournalEntryModel
+from Ledger.posting import post_entries
+
+from .models import PaymentModel
+from .models import PayPalPaymentModel
+
+
+CENTS       = Decimal('0.01')
+SUSPENSE    = 'payment_suspense'
+NAMESPACE   = uuid.UUID('6f1d3c1e-6a0b-4c55-9d1e-2f7f4b1c8a90')
+
+# local payments per gateway: model, settlement reference field, and whether amounts are in cents
+GATEWAYS = {
+    'stripe':   (PaymentModel, 'stripe_payment_intent', True),
+    'paypal':   (PayPalPaymentModel, 'paypal_payment_id', False),
+}
+
+# accepted column names of a settlement export, first match wins
+COLUMNS = {
+    'gateway':      ('gateway',),
+    'reference':    ('reference', 'payment_intent', 'payment_intent_id', 'paypal_payment_id', 'transaction_id'),
+    'amount':       ('amount', 'gross'),
+    'currency':     ('currency',),
+    'type':         ('type', 'reporting_category'),
+}
+# settlement lines of other types (refunds, fees, payouts) are not payments and are skipped
+PAYMENT_TYPES   = ('', 'charge', 'payment', 'sale')
+LOOKUP_CHUNK_SIZE = 500
+
+ISSUES = ('missing_local', 'missing_settlement', 'duplicate', 'amount_mismatch', 'unreadable')
+
+
+
+def column(row: dict, name: str) -> str:
+    for key in COLUMNS[name]:
+        value = row.get(key)
+        if value not in (None, ''):
+            return str(value).strip()
+    return ''
+
+
+def money(value) -> Decimal:
+    return Decimal(str(value)).quantize(CENTS)
+
+
+
+class ReconciliationReport:
+    """ Counts of a reconciliation run plus the first `max_issues` issues (all of them go to `on_issue`). """
+
+    def __init__(self, max_issues: int = 1000, on_issue=None):
+        self.counts     = {'lines': 0, 'matched': 0, 'skipped': 0, 'corrections': 0, **{kind: 0 for kind in ISSUES}}
+        self.issues     = []
+        self.max_issues = max_issues
+        self.on_issue   = on_issue
+
+    def add_issue(self, kind: str, **details) -> None:
+        self.counts[kind] += 1
+        issue = {'issue': kind, **details}
+        if len(self.issues) < self.max_issues:
+            self.issues.append(issue)
+        if self.on_issue:
+            self.on_issue(issue)
+
+    def as_dict(self) -> dict:
+        return {**self.counts, 'issues': self.issues}
+
+
+
+class PaymentReconciler:
+    """
+    Joins a gateway settlement export (CSV/JSONL) against the local Stripe and PayPal payments.
+
+    The export is streamed `chunk_size` lines at a time. For each chunk the local payments
+    of its references, whenever they were created, are loaded into a hash index
+    (`{reference: payment}`, one query per 500 references) and every line is matched
+    against it. Matched payments are marked in a bitmap indexed by primary key, so memory
+    grows with the chunk, the bitmap (one bit per payment), the references of settled
+    lines without a local payment (to spot their duplicates) and the kept issues, not
+    with the matched lines of the export. After the export, payments of the gateways seen
+    in it that were never matched are reported as missing from the settlement
+    (`payments` narrows these, e.g. to the date range the export covers).
+
+    Issues: `missing_local` (settled, no local payment), `missing_settlement`, `duplicate`
+    (a payment settled more than once) and `amount_mismatch` (amount or currency differ).
+    With `post=True` the difference between settled and recorded amounts of missing_local
+    and mismatched payments is posted to the ledger against `payment_suspense`, in balanced
+    batches through Ledger.posting.post_entries. Each correction has a reference number
+    derived from the payment and the difference, so re-running never posts it twice.
+    Unsettled payments (they may settle in a later export), duplicates and currency
+    mismatches are reported only.
+    """
+
+    def __init__(self, gateway: str = None, chunk_size: int = 20000, post: bool = False, payments=None,
+                 using: str = 'default', max_issues: int = 1000, on_issue=None):
+        self.gateway        = gateway
+        self.chunk_size     = chunk_size
+        self.post           = post
+        self.payments       = payments or {}
+        self.using          = using
+        self.report         = ReconciliationReport(max_issues, on_issue)
+        self.seen           = {name: bytearray() for name in GATEWAYS}
+        self.unmatched      = set()
+        self.corrections    = []
+
+    def run(self, stream, file_format: str) -> ReconciliationReport:
+        rows     = read_rows(stream, file_format)
+        gateways = set()
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            gateways |= self.reconcile_chunk(chunk)
+            self.flush_corrections(self.chunk_size)
+        for gateway in sorted(gateways):
+            self.find_unsettled(gateway)
+        self.flush_corrections(0)
+        return self.report
+
+    def local_payments(self, gateway: str):
+        model, field, _ = GATEWAYS[gateway]
+        return model.objects.using(self.using).exclude(**{f'{field}__isnull': True})
+
+    def local_index(self, gateway: str, references: list) -> dict:
+        """ `{reference: (pk, amount, currency)}` of the local payments of `references`. """
+        _, field, in_cents = GATEWAYS[gateway]
+        index, references = {}, list(references)
+        for start in range(0, len(references), LOOKUP_CHUNK_SIZE):
+            rows = self.local_payments(gateway).filter(
+                **{f'{field}__in': references[start:start + LOOKUP_CHUNK_SIZE]}
+            ).values_list(field, 'pk', 'amount_paid', 'currency')
+            for reference, pk, amount, currency in rows:
+                amount = money(Decimal(amount or 0) / 100 if in_cents else amount or 0)
+                index[reference] = (pk, amount, (currency or '').upper())
+        return index
+
+    def mark_seen(self, gateway: str, pk: int) -> bool:
+        """ Set the bit of a matched payment; False if it was already set (a duplicate). """
+        bitmap = self.seen[gateway]
+        byte, bit = divmod(pk, 8)
+        if byte >= len(bitmap):
+            bitmap.extend(bytes(byte - len(bitmap) + 1024))
+        if bitmap[byte] & (1 << bit):
+            return False
+        bitmap[byte] |= 1 << bit
+        return True
+
+    def was_seen(self, gateway: str, pk: int) -> bool:
+        byte, bit = divmod(pk, 8)
+        bitmap = self.seen[gateway]
+        return byte < len(bitmap) and bool(bitmap[byte] & (1 << bit))
+
+    def reconcile_chunk(self, chunk) -> set:
+        """ Match a chunk of settlement lines; returns the gateways it settles. """
+        lines = []
+        for line, row, error in chunk:
+            self.report.counts['lines'] += 1
+            if error:
+                self.report.add_issue('unreadable', line=line, error=error)
+                continue
+            if column(row, 'type').lower() not in PAYMENT_TYPES:
+                self.report.counts['skipped'] += 1
+                continue
+            gateway, reference = (column(row, 'gateway') or self.gateway or '').lower(), column(row, 'reference')
+            try:
+                amount = money(column(row, 'amount'))
+            except (InvalidOperation, ValueError):
+                self.report.add_issue('unreadable', line=line, error=f"'{column(row, 'amount')}' is not an amount.")
+                continue
+            if gateway not in GATEWAYS or not reference:
+                self.report.add_issue('unreadable', line=line, error="A gateway (stripe or paypal) and a reference are required.")
+                continue
+            lines.append((line, gateway, reference, amount, column(row, 'currency').upper()))
+
+        gateways = {gateway for _, gateway, _, _, _ in lines}
+        indexes  = {gateway: self.local_index(gateway, {ref for _, g, ref, _, _ in lines if g == gateway}) for gateway in gateways}
+        for line, gateway, reference, amount, currency in lines:
+            local = indexes[gateway].get(reference)
+            if local is None:
+                if (gateway, reference) in self.unmatched:
+                    self.report.add_issue('duplicate', line=line, gateway=gateway, reference=reference)
+                    continue
+                self.unmatched.add((gateway, reference))
+                self.report.add_issue('missing_local', line=line, gateway=gateway, reference=reference, settled=str(amount), currency=currency)
+                self.correct(gateway, reference, currency, amount, Decimal('0'))
+                continue
+
+            pk, recorded, recorded_currency = local
+            if not self.mark_seen(gateway, pk):
+                self.report.add_issue('duplicate', line=line, gateway=gateway, reference=reference, payment=pk)
+                continue
+            if amount == recorded and currency in ('', recorded_currency):
+                self.report.counts['matched'] += 1
+                continue
+            self.report.add_issue(
+                'amount_mismatch', line=line, gateway=gateway, reference=reference, payment=pk,
+                settled=str(amount), recorded=str(recorded), currency=currency or recorded_currency, recorded_currency=recorded_currency,
+            )
+            if currency in ('', recorded_currency):
+                self.correct(gateway, reference, recorded_currency, amount, recorded)
+        return gateways
+
+    def find_unsettled(self, gateway: str) -> None:
+        """ Report the local payments of `gateway` (within `payments`) no settlement line matched, in pk order. """
+        _, field, in_cents = GATEWAYS[gateway]
+        payments = self.local_payments(gateway)
+        if gateway in self.payments:
+            payments = payments.filter(self.payments[gateway])
+        payments = payments.order_by('pk').values_list('pk', field, 'amount_paid', 'currency')
+        for pk, reference, amount, currency in payments.iterator(chunk_size=self.chunk_size):
+            if self.was_seen(gateway, pk):
+                continue
+            recorded = money(Decimal(amount or 0) / 100 if in_cents else amount or 0)
+            self.report.add_issue(
+                'missing_settlement', gateway=gateway, reference=reference, payment=pk, recorded=str(recorded), currency=(currency or '').upper(),
+            )
+
+    def correct(self, gateway: str, reference: str, currency: str, settled: Decimal, recorded: Decimal) -> None:
+        """ Queue the journal entry moving `settled - recorded` between the bank and the suspense account. """
+        delta = settled - recorded
+        if not self.post or not delta or currency not in JournalEntryModel.CURRENCY.values:
+            return
+        self.corrections.append({
+            'reference_num':    str(uuid.uuid5(NAMESPACE, f'{gateway}:{reference}:{currency}:{delta}')),
+            'ent_name':         f'Reconciliation {gateway} {reference}',
+            'ent_description':  f'Settled {settled} {currency}, recorded {recorded} {currency}.',
+            'category':         JournalEntryModel.CATEGORY.SALES_REVENUE,
+            'base_currency':    currency,
+            'amount':           abs(delta),
+            'debit_name':       'bank_account' if delta > 0 else SUSPENSE,
+            'credit_name':      SUSPENSE if delta > 0 else 'bank_account',
+        })
+
+    def flush_corrections(self, threshold: int) -> None:
+        """ Post the queued corrections once there are more than `threshold`, skipping those already posted. """
+        if not self.corrections or len(self.corrections) <= threshold:
+            return
+        pending, self.corrections = self.corrections, []
+        posted = set()
+        for start in range(0, len(pending), LOOKUP_CHUNK_SIZE):
+            references = [uuid.UUID(row['reference_num']) for row in pending[start:start + LOOKUP_CHUNK_SIZE]]
+            posted |= {str(reference) for reference in JournalEntryModel.objects.using(self.using).filter(
+                reference_num__in=references,
+            ).values_list('reference_num', flat=True)}
+        rows = [row for row in pending if row['reference_num'] not in posted]
+        if rows:
+            self.report.counts['corrections'] += post_entries(rows, using=self.using)['posted']
@@ -5,6 +5,9 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver 
 from django.core.mail import send_mail 
 from django.conf import settings 
+from django.apps import apps
+
+from core import outbox
 
 from .models import PaymentModel 
 from .models import PayPalPaymentModel 
@@ -33,7 +36,9 @@ def create_journal_entry(instance):
             )
         logger.info(f"Journal entry created for payment: {instance.id}") 
     except Exception as e: 
+        # re-raised so the outbox retries it
         logger.error(f"Error creating journal entry for payment {instance.id}: {e}")
+        raise
 
 
 
@@ -79,7 +84,47 @@ def send_payment_eamil(instance):
         else:
             logger.warning(f"No recipient email provided for order {instance.order.id}.")
     except Exception as e:
+        # re-raised so the outbox retries it
         logger.error(f"Error sending payment confirmation email: {e}")
+        raise
+
+
+
+
+def payment_payload(instance) -> dict:
+    return {'model': instance._meta.label, 'pk': instance.pk}
+
+
+def payment_instance(payload):
+    model = apps.get_model(payload['model'])
+    return model._default_manager.select_related('order', 'user').get(pk=payload['pk'])
+
+
+def queue_payment_effects(instance, reference, using: str = 'default') -> None:
+    """
+    Queue the confirmation email and journal entry of a new payment for the outbox worker.
+    `reference` is the provider's id of the payment; nothing is queued without one.
+    Also called for payments written with bulk_create, which sends no post_save.
+    """
+    if not reference:
+        return
+    if controller.GLOBAL_EMAIL_SYSTEM:
+        # Send payment confirmation email
+        outbox.enqueue('payment.email', payment_payload(instance), using=using)
+
+    if controller.GLOBAL_JOURNAL_SYSTEM:
+        # Create journal entry
+        outbox.enqueue('payment.journal', payment_payload(instance), using=using)
+
+
+@outbox.register('payment.email')
+def handle_payment_email(payload):
+    send_payment_eamil(payment_instance(payload))
+
+
+@outbox.register('payment.journal')
+def handle_payment_journal(payload):
+    create_journal_entry(payment_instance(payload))
 
 
 
@@ -90,15 +135,11 @@ def handle_payment_post_save(sender, instance, created, **kwargs):
     logger.info("SIGNAL CALLED: PaymentModel post_save")
     """
     Signal for handling actions after payment creation.
+    The email and journal entry are queued in the payment's transaction and
+    carried out by the outbox worker (`python manage.py run_outbox_worker`).
     """
     if created:
-        if controller.GLOBAL_EMAIL_SYSTEM and instance.stripe_checkout_id:
-            # Send payment confirmation email
-            send_payment_eamil(instance) 
-
-        if controller.GLOBAL_JOURNAL_SYSTEM and instance.stripe_checkout_id: 
-            # Create journal entry
-            create_journal_entry(instance) 
+        queue_payment_effects(instance, instance.stripe_checkout_id, kwargs.get('using') or 'default')
 
         logger.info(f"Payment processed for order: {instance.order.id}")
 
@@ -112,17 +153,10 @@ def handle_paypal_payment_post_save(sender, instance, created, **kwargs):
     logger.info("SIGNAL CALLED: PayPalPaymentModel post_save")
     """
     Signal for handling actions after PayPal payment creation.
+    Queued for the outbox worker like the Stripe payments.
     """
     if created:
-        if controller.GLOBAL_EMAIL_SYSTEM and instance.paypal_payment_id:
-            # Send payment confirmation email
-            send_payment_eamil(instance) 
-
-        if controller.GLOBAL_JOURNAL_SYSTEM and instance.paypal_payment_id:
-            # Create journal entry
-            create_journal_entry(instance) 
-            
-
+        queue_payment_effects(instance, instance.paypal_payment_id, kwargs.get('using') or 'default')
 
         logger.info(f"PayPal payment processed for order: {instance.order.id}")
 
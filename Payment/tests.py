@@ -1,3 +1,237 @@
+import io
+import hmac
+import json
+import time
+import hashlib
+import datetime
+from pathlib import Path
+from functools import partial
+from unittest import mock
+from decimal import Decimal
 from django.test import TestCase
+from django.test import override_settings
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.utils import timezone
+
+from Cart.models import CartModel
+from Cart.models import OrderModel
+from Ledger.models import JournalEntryModel
+from core import outbox
+from core.models import OutboxMessageModel
+
+from .models import PaymentModel
+from .models import PayPalPaymentModel
+from .models import StripeEventModel
+from . import webhooks
+from .webhooks import process_events
+from .reconciliation import PaymentReconciler
+
+
+User = get_user_model()
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures' / 'stripe'
+
+
+
+class PaymentOutboxTest(TestCase):
+    """ Saving a payment only queues its side effects; the outbox worker carries them out. """
+
+    def test_journal_entry_is_queued(self):
+        user    = User.objects.create_user(username='payer', email='payer@example.com', password='pass1234')
+        order   = OrderModel.objects.create(author=user, cart_id=CartModel.objects.create(author=user), total_amount=Decimal('12.34'))
+        PaymentModel.objects.create(order=order, user=user, amount_paid=1234, currency='usd', stripe_checkout_id='cs_test_1')
+
+        self.assertFalse(JournalEntryModel.objects.exists())
+        self.assertEqual(list(OutboxMessageModel.objects.values_list('topic', 'status')), [('payment.journal', 'pending')])
+
+        self.assertEqual(outbox.drain(), {'done': 1, 'failed': 0})
+        entry = JournalEntryModel.objects.get()
+        self.assertEqual((entry.ent_id, entry.amount, entry.base_currency), (order.pk, Decimal('12.34'), 'USD'))
+        self.assertEqual(OutboxMessageModel.objects.get().status, 'done')
+
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET='whsec_test')
+class StripeWebhookTest(TestCase):
+    """ Recorded Stripe events replayed through the webhook, signed locally. """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user   = User.objects.create_user(username='payer', email='payer@example.com', password='pass1234')
+        self.cart   = CartModel.objects.create(author=self.user)
+
+    def make_order(self):
+        return OrderModel.objects.create(author=self.user, cart_id=self.cart, total_amount=Decimal('42.50'))
+
+    def recorded(self, name, order=None, **session):
+        event = json.loads((FIXTURES / f'{name}.json').read_text())
+        if order is not None:
+            event['data']['object']['metadata'] = {'order_id': str(order.pk), 'user_id': str(self.user.pk)}
+        event['data']['object'].update(session)
+        return event
+
+    def post_event(self, event, secret='whsec_test'):
+        payload     = json.dumps(event)
+        timestamp   = int(time.time())
+        signature   = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+        return self.client.post(
+            '/api/v1/stripe/webhook/', payload, content_type='application/json', HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}',
+        )
+
+    def test_events_are_deduped_and_applied_later(self):
+        order = self.make_order()
+        event = self.recorded('checkout_session_completed', order)
+        self.assertEqual(self.post_event(event).data, {'received': True, 'duplicate': False})
+        self.assertEqual(self.post_event(event).data, {'received': True, 'duplicate': True})
+        self.assertEqual(self.post_event(self.recorded('payment_intent_succeeded')).status_code, 200)
+
+        # acknowledged only: nothing applied yet
+        self.assertEqual(StripeEventModel.objects.count(), 2)
+        self.assertFalse(PaymentModel.objects.exists())
+
+        outbox.drain()
+        payment = PaymentModel.objects.get()
+        self.assertEqual((payment.order_id, payment.amount_paid, payment.stripe_payment_intent), (order.pk, 4250, 'pi_3QxIntent0001'))
+        self.assertEqual(OrderModel.objects.get(pk=order.pk).payment_status, 'paid')
+        self.assertEqual(dict(StripeEventModel.objects.values_list('event_type', 'status')), {
+            'checkout.session.completed': 'processed', 'payment_intent.succeeded': 'ignored',
+        })
+        # the journal entry went through the outbox like any other payment
+        self.assertEqual(JournalEntryModel.objects.get().amount, Decimal('42.50'))
+
+        # the success redirect no longer needs Stripe once the webhook confirmed the payment
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(f'/api/v1/stripe/success/?session_id={payment.stripe_checkout_id}').status_code, 302)
+
+    def test_rejects_bad_signatures(self):
+        event = self.recorded('checkout_session_completed', self.make_order())
+        self.assertEqual(self.post_event(event, secret='whsec_other').status_code, 400)
+        with override_settings(STRIPE_WEBHOOK_SECRET=''):
+            self.assertEqual(self.post_event(event).status_code, 400)
+        self.assertFalse(StripeEventModel.objects.exists())
+
+    def test_batches_apply_each_order_once(self):
+        first, second = self.make_order(), self.make_order()
+        events = [
+            self.recorded('checkout_session_completed', first, id='cs_test_1', payment_intent='pi_1'),
+            self.recorded('checkout_session_completed', first, id='cs_test_2', payment_intent='pi_2'),
+            self.recorded('checkout_session_completed', second, id='cs_test_3', payment_intent='pi_3'),
+            self.recorded('checkout_session_completed', second, id='cs_test_4', payment_status='unpaid'),
+            self.recorded('checkout_session_completed', id='cs_test_5', metadata={'order_id': '999999'}),
+        ]
+        for index, event in enumerate(events):
+            event['id'] = f'evt_{index}'
+            self.assertEqual(self.post_event(event).status_code, 200)
+
+        self.assertEqual(process_events(batch_size=2), {'processed': 3, 'ignored': 1, 'failed': 1})
+        self.assertEqual(sorted(PaymentModel.objects.values_list('stripe_checkout_id', flat=True)), ['cs_test_1', 'cs_test_3'])
+        self.assertIn('999999', StripeEventModel.objects.get(event_id='evt_4').last_error)
+
+    def test_failing_batch_keeps_earlier_batches(self):
+        for index in range(3):
+            event = self.recorded('checkout_session_completed', self.make_order(), id=f'cs_test_{index}', payment_intent=f'pi_{index}')
+            event['id'] = f'evt_{index}'
+            self.post_event(event)
+        OutboxMessageModel.objects.exclude(pk=OutboxMessageModel.objects.earliest('pk').pk).delete()
+
+        apply = webhooks.apply_checkout_sessions
+        def apply_first_batch(events, using):
+            if StripeEventModel.objects.filter(status='processed').exists():
+                raise ConnectionError('database went away')
+            apply(events, using)
+
+        # the handler runs outside the outbox transaction, so batch one stays committed
+        with mock.patch.object(webhooks, 'process_events', partial(process_events, batch_size=2)), \
+                mock.patch.object(webhooks, 'apply_checkout_sessions', apply_first_batch):
+            outbox.drain()
+        self.assertEqual(sorted(PaymentModel.objects.values_list('stripe_checkout_id', flat=True)), ['cs_test_0', 'cs_test_1'])
+        self.assertEqual(StripeEventModel.objects.filter(status='received').get().event_id, 'evt_2')
+        self.assertEqual(OutboxMessageModel.objects.get(topic='stripe.events').status, 'pending')
+
+    def test_clashing_payment_fails_only_its_event(self):
+        paid, clash, fresh = self.make_order(), self.make_order(), self.make_order()
+        PaymentModel.objects.create(order=paid, user=self.user, amount_paid=4250, stripe_checkout_id='cs_paid', stripe_payment_intent='pi_taken')
+        events = [
+            self.recorded('checkout_session_completed', clash, id='cs_test_1', payment_intent='pi_taken'),
+            self.recorded('checkout_session_completed', fresh, id='cs_test_2', payment_intent='pi_2'),
+        ]
+        for index, event in enumerate(events):
+            event['id'] = f'evt_{index}'
+            self.post_event(event)
+
+        with self.assertLogs('Payment.webhooks', level='ERROR'):
+            self.assertEqual(process_events(), {'processed': 1, 'ignored': 0, 'failed': 1})
+        self.assertIn('Payment could not be recorded', StripeEventModel.objects.get(event_id='evt_0').last_error)
+        self.assertEqual(PaymentModel.objects.get(order=fresh).stripe_payment_intent, 'pi_2')
+        self.assertEqual(OrderModel.objects.get(pk=fresh.pk).payment_status, 'paid')
+        self.assertEqual(OrderModel.objects.get(pk=clash.pk).payment_status, 'unpaid')
+
+    def test_success_redirect_racing_the_webhook(self):
+        order   = self.make_order()
+        session = self.recorded('checkout_session_completed', order)['data']['object']
+
+        def retrieve(session_id):
+            # the webhook records the payment while Stripe is being asked
+            PaymentModel.objects.create(order=order, user=self.user, amount_paid=4250, stripe_checkout_id='cs_webhook')
+            return session
+
+        with mock.patch('stripe.checkout.Session.retrieve', side_effect=retrieve):
+            response = self.client.get('/api/v1/stripe/success/', {'session_id': session['id']})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(PaymentModel.objects.get().stripe_checkout_id, 'cs_webhook')
+
+
+
+class ReconciliationTest(TestCase):
+    """ A settlement export joined against recorded payments, across several chunks. """
+
+    EXPORT = (
+        "gateway,reference,amount,currency,type\n"
+        "stripe,pi_1,10.00,USD,charge\n"       # matched
+        "stripe,pi_2,19.50,USD,charge\n"       # recorded 20.00
+        "stripe,pi_9,5.00,USD,charge\n"        # not recorded
+        "stripe,pi_1,10.00,USD,charge\n"       # settled twice
+        "stripe,pi_1,-10.00,USD,refund\n"      # not a payment
+        "paypal,PAY-1,7.25,USD,sale\n"         # matched
+    )
+
+    def setUp(self):
+        User = get_user_model()
+        def order(name):
+            user = User.objects.create_user(username=name, email=f'{name}@example.com', password='pass1234')
+            return OrderModel.objects.create(author=user, cart_id=CartModel.objects.create(author=user), total_amount=Decimal('10'))
+        for intent, cents in (('pi_1', 1000), ('pi_2', 2000), ('pi_3', 300)):
+            placed = order(intent)
+            PaymentModel.objects.create(order=placed, user=placed.author, amount_paid=cents, currency='usd', stripe_payment_intent=intent)
+        placed = order('paypal')
+        PayPalPaymentModel.objects.create(order=placed, user=placed.author, amount_paid=Decimal('7.25'), currency='USD', paypal_payment_id='PAY-1')
+
+    def reconcile(self, post=True, **kwargs):
+        return PaymentReconciler(chunk_size=2, post=post, **kwargs).run(io.StringIO(self.EXPORT), 'csv')
+
+    def test_reports_and_posts_corrections_once(self):
+        report = self.reconcile()
+        self.assertEqual({key: report.counts[key] for key in ('lines', 'matched', 'skipped', 'corrections')},
+                         {'lines': 6, 'matched': 2, 'skipped': 1, 'corrections': 2})
+        self.assertEqual({issue['issue']: issue['reference'] for issue in report.issues}, {
+            'amount_mismatch': 'pi_2', 'missing_local': 'pi_9', 'duplicate': 'pi_1', 'missing_settlement': 'pi_3',
+        })
+        corrections = {entry.ent_name: (entry.debit_name, entry.credit_name, entry.debit_amount)
+                       for entry in JournalEntryModel.objects.filter(ent_name__startswith='Reconciliation')}
+        self.assertEqual(corrections, {
+            'Reconciliation stripe pi_2': ('payment_suspense', 'bank_account', Decimal('0.50')),
+            'Reconciliation stripe pi_9': ('bank_account', 'payment_suspense', Decimal('5.00')),
+        })
+
+        rerun = self.reconcile()
+        self.assertEqual(rerun.counts['corrections'], 0)
+        self.assertEqual(rerun.counts['amount_mismatch'], 1)
+
+    def test_window_only_narrows_unsettled_payments(self):
+        PaymentModel.objects.update(created=timezone.now() - datetime.timedelta(days=3))
+        report = self.reconcile(payments={'stripe': Q(created__date__gte=timezone.localdate())})
+        self.assertEqual((report.counts['matched'], report.counts['missing_local']), (2, 1))
+        self.assertEqual(report.counts['missing_settlement'], 0)
 
-# Create your tests here.
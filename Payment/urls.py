@@ -6,6 +6,7 @@ from .views import  StripeSuccessApiView
 from .views import  StripeCancelApiView
 from .views import  PayPalPayment 
 from .views import PayPalSuccessViewSet
+from .views import StripeWebhookView
 
 
 router = DefaultRouter()
@@ -19,5 +20,6 @@ urlpatterns = [
     # path('paypal/cancel/', PayPalCancelView.as_view(), name='paypal-cancel'),
     path('stripe/success/', StripeSuccessApiView.as_view(), name='stripe-success'),
     path('stripe/cancel/', StripeCancelApiView.as_view(), name='stripe-cancel'),
+    path('stripe/webhook/', StripeWebhookView.as_view(), name='stripe-webhook'),
     path('', include(router.urls)),
 ]
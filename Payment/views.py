@@ -2,6 +2,8 @@ import stripe
 import logging
 from decouple import config
 from django.shortcuts import redirect 
+from django.db import transaction
+from django.db import IntegrityError
 
 
 from rest_framework.views import APIView
@@ -23,11 +25,15 @@ from Cart.models import OrderItemModel
 
 
 from core.paymentprocessor import PaymentProcessor 
+from core.paymentprocessor import PAYPAL_PAYMENT_SPEC
 
 
 from .models import PaymentModel
 from .models import PayPalPaymentModel  
 from .serializers import OrderPaymentProcessorSerializer 
+from .webhooks import verify_event
+from .webhooks import record_event
+from .webhooks import WebhookError
 from core.core_permissions import CartItemIsOwnerStaffOrSuperUser 
 
 
@@ -185,6 +191,10 @@ class StripeSuccessApiView(APIView):
             # 400 Bad Request: session_id is required
             return Response({"error": "Missing session_id"}, status=400)
         try:
+            if PaymentModel.objects.filter(stripe_checkout_id=session_id).exists():
+                # already confirmed by the webhook, no need to ask Stripe
+                return redirect(f"http://localhost:5173/orders")
+
             # Retrieve the Stripe session using the session_id
             session = stripe.checkout.Session.retrieve(session_id)
 
@@ -195,32 +205,39 @@ class StripeSuccessApiView(APIView):
             order = get_object_or_404(OrderModel, id=successfull_payer_data.get("order_id"))
             user = get_object_or_404(User, id=successfull_payer_data.get("user_id"))
 
-            # Create a PaymentModel record for the successful payment
-            PaymentModel.objects.create(
-                order=order,
-                user=user,
-                amount_paid=successfull_payer_data.get("amount_paid"),
-                currency=successfull_payer_data.get("currency"),
-                stripe_checkout_id=successfull_payer_data.get("stripe_checkout_id"),
-                stripe_payment_intent=successfull_payer_data.get("stripe_payment_intent"),
-                stripe_payment_status=successfull_payer_data.get("stripe_payment_status"),
-                stripe_payment_method=successfull_payer_data.get("payment_method"),
-                receipt_url=session_data.get("receipt_url"),
-                name_of_payer=successfull_payer_data.get("customer_name"),
-                email_of_payer=successfull_payer_data.get("customer_email"),
-            )
+            # the payment and the order update commit together
+            with transaction.atomic():
+                # Create a PaymentModel record for the successful payment
+                PaymentModel.objects.create(
+                    order=order,
+                    user=user,
+                    amount_paid=successfull_payer_data.get("amount_paid"),
+                    currency=successfull_payer_data.get("currency"),
+                    stripe_checkout_id=successfull_payer_data.get("stripe_checkout_id"),
+                    stripe_payment_intent=successfull_payer_data.get("stripe_payment_intent"),
+                    stripe_payment_status=successfull_payer_data.get("stripe_payment_status"),
+                    stripe_payment_method=successfull_payer_data.get("payment_method"),
+                    receipt_url=session_data.get("receipt_url"),
+                    name_of_payer=successfull_payer_data.get("customer_name"),
+                    email_of_payer=successfull_payer_data.get("customer_email"),
+                )
 
-            # Update the order status to reflect payment and fulfillment
-            order.payment_status = "paid"
-            order.is_confirmed = True
-            order.ord_status = "completed"
-            order.shipping_status = "shipped"
-            order.save()
+                # Update the order status to reflect payment and fulfillment
+                order.payment_status = "paid"
+                order.is_confirmed = True
+                order.ord_status = "completed"
+                order.shipping_status = "shipped"
+                order.save()
 
             # 200 OK: Payment processed successfully
             return redirect(f"http://localhost:5173/orders")
             # return Response(successfull_payer_data, status=status.HTTP_200_OK)
 
+        except IntegrityError:
+            # the webhook recorded this payment at the same moment
+            logger.info("Stripe session %s was already recorded.", session_id)
+            return redirect(f"http://localhost:5173/orders")
+
         except OrderModel.DoesNotExist:
             # 404 Not Found: Order not found
             logger.error("Order with ID %s not found.", successfull_payer_data.get("order_id"))
@@ -238,6 +255,30 @@ class StripeSuccessApiView(APIView):
         
 
 
+class StripeWebhookView(APIView):
+    """
+    Receives Stripe webhook events.
+    - Verifies the `Stripe-Signature` header with STRIPE_WEBHOOK_SECRET.
+    - Stores each event once by id and queues it; redeliveries are acknowledged as duplicates.
+    - Answers right away; the outbox worker applies the events in batches (see Payment.webhooks).
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def post(self, request):
+        try:
+            event = verify_event(request.body, request.META.get("HTTP_STRIPE_SIGNATURE"))
+        except WebhookError as e:
+            # 400 Bad Request: not a genuine Stripe event
+            logger.warning("Rejected Stripe webhook: %s", str(e))
+            return Response({"error": "Invalid webhook signature."}, status=status.HTTP_400_BAD_REQUEST)
+
+        created = record_event(event)
+        # 200 OK: Stripe stops redelivering once it gets a 2xx
+        return Response({"received": True, "duplicate": not created}, status=status.HTTP_200_OK)
+
+
+
 from .paypal import paypalrestsdk 
 
 
@@ -380,24 +421,22 @@ class PayPalSuccessViewSet(APIView):
             payment = paypalrestsdk.Payment.find(payment_id)
 
             if payment.execute({"payer_id": payer_id}):
-                transaction = payment.transactions[0]
-                sku = transaction.item_list.items[0].sku
-                order_id = sku.split("_")[-1]
+                paypal_payer_data = PaymentProcessor(payment.to_dict(), spec=PAYPAL_PAYMENT_SPEC).get_payment_data()
 
-                order = get_object_or_404(OrderModel, id=order_id)
+                order = get_object_or_404(OrderModel, id=paypal_payer_data.get("order_id"))
                 user_id = order.author.id if order.author else None
 
                 PayPalPaymentModel.objects.create(
                     order=order,
                     user_id=user_id,
-                    name_of_payer=f"{payment.payer.payer_info.first_name} {payment.payer.payer_info.last_name}",
-                    email_of_payer=payment.payer.payer_info.email,
-                    amount_paid=float(transaction.amount.total),
-                    currency=transaction.amount.currency,
-                    paypal_payment_id=payment.id,
+                    name_of_payer=paypal_payer_data.get("customer_name"),
+                    email_of_payer=paypal_payer_data.get("customer_email"),
+                    amount_paid=paypal_payer_data.get("amount_paid"),
+                    currency=paypal_payer_data.get("currency"),
+                    paypal_payment_id=paypal_payer_data.get("paypal_payment_id"),
                     paypal_payer_id=payer_id,
                     paypal_token=token,
-                    paypal_payment_status=payment.state,
+                    paypal_payment_status=paypal_payer_data.get("paypal_payment_status"),
                 )
 
                 order.payment_status = "paid"
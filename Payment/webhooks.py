@@ -0,0 +1,202 @@
+import json
+import logging
+import stripe
+from django.conf import settings
+from django.db import connections
+from django.db import transaction
+from django.db import DataError
+from django.db import IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+
+from Cart.models import OrderModel
+from core import outbox
+from core.metrics import metrics
+from core.paymentprocessor import PaymentProcessor
+
+from .models import PaymentModel
+from .models import StripeEventModel
+from .signals import queue_payment_effects
+
+
+logger = logging.getLogger(__name__)
+
+STATUS          = StripeEventModel.STATUS
+# events that confirm a checkout; async payment methods complete unpaid and succeed later
+CHECKOUT_EVENTS = ('checkout.session.completed', 'checkout.session.async_payment_succeeded')
+
+
+
+class WebhookError(Exception):
+    """ The webhook request is not a genuine Stripe event. """
+
+
+
+def verify_event(payload: bytes, signature: str) -> dict:
+    """
+    The event of a webhook request, after checking its `Stripe-Signature` against
+    STRIPE_WEBHOOK_SECRET (and its timestamp against Stripe's tolerance). Raises WebhookError.
+    """
+    secret = getattr(settings, 'STRIPE_WEBHOOK_SECRET', '')
+    if not secret:
+        raise WebhookError("STRIPE_WEBHOOK_SECRET is not configured.")
+    try:
+        stripe.Webhook.construct_event(payload, signature or '', secret)
+    except (ValueError, stripe.error.SignatureVerificationError) as e:
+        raise WebhookError(str(e))
+    # the verified bytes, as plain dicts (the stripe.Event is not needed)
+    return json.loads(payload)
+
+
+def record_event(event: dict, using: str = 'default') -> bool:
+    """
+    Store a verified event and queue the processor, in one transaction. Returns False
+    for an event id already stored (Stripe redelivers until it gets a 2xx).
+    """
+    with transaction.atomic(using=using):
+        _, created = StripeEventModel.objects.using(using).get_or_create(
+            event_id=event['id'], defaults={'event_type': event.get('type', ''), 'payload': event},
+        )
+        if created:
+            outbox.enqueue('stripe.events', using=using)
+    metrics.incr('stripe.events.received' if created else 'stripe.events.duplicate')
+    return created
+
+
+
+def insert_payments(pending: list, using: str = 'default') -> list:
+    """
+    Insert the payments of `(event, payment)` pairs with one bulk insert in a savepoint.
+    When that clashes (the success redirect recorded one of them at the same moment, a
+    reused payment intent, ...), insert them one savepoint each instead, so one bad event
+    cannot hold back the others: a clash with the payment now recorded for the order or
+    checkout counts as processed, anything else fails that event. Returns the payments inserted.
+    """
+    payments = [payment for _, payment in pending]
+    try:
+        with transaction.atomic(using=using):
+            PaymentModel.objects.using(using).bulk_create(payments)
+        return payments
+    except (IntegrityError, DataError):
+        pass
+
+    inserted = []
+    for event, payment in pending:
+        try:
+            with transaction.atomic(using=using):
+                # bulk_create of one row: no post_save, effects are queued by the caller
+                PaymentModel.objects.using(using).bulk_create([payment])
+            inserted.append(payment)
+        except (IntegrityError, DataError) as e:
+            payment.pk = None
+            if not PaymentModel.objects.using(using).filter(
+                Q(order_id=payment.order_id) | Q(stripe_checkout_id=payment.stripe_checkout_id)
+            ).exists():
+                event.status, event.last_error = STATUS.FAILED, f"Payment could not be recorded: {e}"
+    return inserted
+
+
+def apply_checkout_sessions(events: list, using: str = 'default') -> None:
+    """
+    Apply a batch of checkout events: one query for their orders, one for the payments
+    already recorded (by the success redirect or an earlier event), one bulk insert of
+    the new payments (see insert_payments) and one UPDATE marking their orders paid.
+    Sets the status of every event.
+    """
+    sessions = {}
+    payloads = PaymentProcessor.batch([event.payload.get('data', {}).get('object', {}) for event in events])
+    for event, data in zip(events, payloads):
+        if not data.get('stripe_checkout_id'):
+            event.status, event.last_error = STATUS.FAILED, "Event carries no checkout session."
+        elif data.get('stripe_payment_status') != 'paid':
+            event.status = STATUS.IGNORED
+        else:
+            sessions[event.pk] = data
+    if not sessions:
+        return
+
+    orders   = OrderModel.objects.using(using).in_bulk({data['order_id'] for data in sessions.values()})
+    recorded = PaymentModel.objects.using(using).filter(
+        Q(order_id__in=orders) | Q(stripe_checkout_id__in=[data['stripe_checkout_id'] for data in sessions.values()])
+    ).values_list('order_id', 'stripe_checkout_id')
+    paid_orders    = {order_id for order_id, _ in recorded}
+    paid_checkouts = {checkout_id for _, checkout_id in recorded}
+
+    pending = []
+    for event in events:
+        data = sessions.get(event.pk)
+        if data is None:
+            continue
+        order = orders.get(data['order_id'])
+        if order is None:
+            event.status, event.last_error = STATUS.FAILED, f"Order {data['order_id']} not found."
+            continue
+        event.status = STATUS.PROCESSED
+        if order.pk in paid_orders or data['stripe_checkout_id'] in paid_checkouts:
+            continue    # already confirmed
+        paid_orders.add(order.pk)
+        paid_checkouts.add(data['stripe_checkout_id'])
+        pending.append((event, PaymentModel(
+            order=order,
+            user_id=order.author_id,
+            amount_paid=data.get("amount_paid"),
+            currency=data.get("currency"),
+            stripe_checkout_id=data.get("stripe_checkout_id"),
+            stripe_payment_intent=data.get("stripe_payment_intent"),
+            stripe_payment_status=data.get("stripe_payment_status"),
+            stripe_payment_method=data.get("payment_method"),
+            receipt_url=data.get("receipt_url"),
+            name_of_payer=data.get("customer_name"),
+            email_of_payer=data.get("customer_email"),
+        )))
+    payments = insert_payments(pending, using) if pending else []
+    if not payments:
+        return
+
+    OrderModel.objects.using(using).filter(pk__in=[payment.order_id for payment in payments]).update(
+        payment_status="paid", is_confirmed=True, ord_status="completed", shipping_status="shipped", modified=timezone.now(),
+    )
+    # bulk_create sends no post_save
+    for payment in payments:
+        queue_payment_effects(payment, payment.stripe_checkout_id, using)
+    metrics.incr('stripe.payments.created', len(payments))
+
+
+def process_events(batch_size: int = 100, using: str = 'default') -> dict:
+    """
+    Apply the received events oldest first, `batch_size` per transaction, and return how
+    many ended in each status. Events other than CHECKOUT_EVENTS are marked ignored;
+    events that cannot be applied (unknown order, ...) are marked failed with the reason.
+    """
+    counts = {status: 0 for status in (STATUS.PROCESSED, STATUS.IGNORED, STATUS.FAILED)}
+    events = StripeEventModel.objects.using(using).filter(status=STATUS.RECEIVED).order_by('created', 'pk')
+    if connections[using].features.has_select_for_update_skip_locked:
+        events = events.select_for_update(skip_locked=True)
+    while True:
+        with transaction.atomic(using=using):
+            batch = list(events[:batch_size])
+            if not batch:
+                break
+            for event in batch:
+                if event.event_type not in CHECKOUT_EVENTS:
+                    event.status = STATUS.IGNORED
+            with metrics.timer('stripe.events.batch_seconds'):
+                apply_checkout_sessions([event for event in batch if event.event_type in CHECKOUT_EVENTS], using)
+
+            now = timezone.now()
+            for event in batch:
+                event.processed_at = event.modified = now
+                counts[event.status] += 1
+                if event.status == STATUS.FAILED:
+                    logger.error("Stripe event %s (%s) failed: %s", event.event_id, event.event_type, event.last_error)
+            StripeEventModel.objects.using(using).bulk_update(batch, ['status', 'processed_at', 'last_error', 'modified'])
+    for status, count in counts.items():
+        if count:
+            metrics.incr(f'stripe.events.{status}', count)
+    return counts
+
+
+@outbox.register('stripe.events', atomic=False)
+def handle_stripe_events(payload):
+    # each batch commits (and releases its row locks) on its own; re-running only finds received events
+    process_events()
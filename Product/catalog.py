@@ -0,0 +1,262 @@
+import csv
+import json
+from decimal import Decimal
+from itertools import islice
+from django.db import transaction
+from django.db import DatabaseError
+
+from core.cache import bump_version
+from core.slugs import unique_slugs
+from core.rows import detect_format
+from core.rows import read_rows
+
+from .models import ProductModel
+from .models import ProductCategoryModel
+from .models import ProductMetaTagModel
+from .search import get_search_backend
+from .serializers import ProductImportSerializer
+
+
+# columns written on export and accepted on import, besides `category` and `meta_tags`
+PRODUCT_COLUMNS = [
+    'sku', 'uid', 'name', 'title', 'slug', 'description', 'weight', 'price', 'discount_percent', 'stock',
+    'warranty_information', 'shipping_information', 'return_policy', 'min_order_quantity',
+    'is_available', 'is_approved',
+]
+EXPORT_COLUMNS  = PRODUCT_COLUMNS + ['category', 'meta_tags']
+
+# columns an import may overwrite on existing products; ids, counters and author are kept
+UPDATE_FIELDS   = [column for column in PRODUCT_COLUMNS if column not in ('sku', 'uid')] + ['category', 'modified']
+REQUIRED_ON_CREATE = ('weight', 'discount_percent')
+
+
+
+class ImportReport:
+    """ Outcome of a catalog import: counts plus `(line, errors)` for every rejected row. """
+
+    def __init__(self):
+        self.created    = 0
+        self.updated    = 0
+        self.errors     = []
+
+    def add_error(self, line: int, errors) -> None:
+        self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self) -> dict:
+        return {'created': self.created, 'updated': self.updated, 'failed': len(self.errors), 'errors': self.errors}
+
+
+
+class CatalogImporter:
+    """
+    Streaming upsert of products from CSV/JSONL.
+
+    Rows are read lazily and handled `chunk_size` at a time, each chunk in its own
+    transaction with a fixed number of queries:
+
+    1. validate every row with ProductImportSerializer (no queries)
+    2. load the existing products of the chunk by sku and by uid
+    3. `bulk_create(update_conflicts=True)` keyed on sku (or uid for rows without one)
+    4. replace the meta tags of the chunk's products in two statements
+    5. re-index the chunk for search
+
+    Categories (by name, slug or uid) and meta tags (by tag) are resolved through maps
+    loaded once per import. Rows that fail validation are reported with their line number
+    and skipped; the rest of the chunk is still imported.
+    """
+
+    def __init__(self, author=None, chunk_size: int = 1000, using: str = 'default'):
+        self.author     = author
+        self.chunk_size = chunk_size
+        self.using      = using
+        self.report     = ImportReport()
+        self.categories = {}
+        for pk, name, slug, uid in ProductCategoryModel.objects.using(using).values_list('pk', 'cate_name', 'slug', 'uid'):
+            for key in (name, slug, uid):
+                if key:
+                    self.categories[key.lower()] = pk
+        self.tags = {
+            tag.lower(): pk for pk, tag in ProductMetaTagModel.objects.using(using).values_list('pk', 'tag') if tag
+        }
+
+    def run(self, stream, file_format: str) -> ImportReport:
+        rows = read_rows(stream, file_format)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk)
+        return self.report
+
+    def clean_chunk(self, chunk) -> dict:
+        """ Validated rows keyed by their upsert key; a later row for the same key wins. """
+        cleaned = {}
+        for line, row, error in chunk:
+            if error:
+                self.report.add_error(line, [error])
+                continue
+            serializer = ProductImportSerializer(data=row)
+            if not serializer.is_valid():
+                self.report.add_error(line, serializer.errors)
+                continue
+            data = serializer.validated_data
+
+            errors = []
+            category = data.pop('category', None)
+            if category is not None:
+                data['category_id'] = self.categories.get(category.lower())
+                if data['category_id'] is None:
+                    errors.append(f"Unknown category '{category}'.")
+            if 'meta_tags' in data:
+                tag_ids = [self.tags.get(tag.lower()) for tag in data['meta_tags']]
+                unknown = [tag for tag, pk in zip(data['meta_tags'], tag_ids) if pk is None]
+                if unknown:
+                    errors.append(f"Unknown meta tags: {', '.join(unknown)}.")
+                data['meta_tags'] = tag_ids
+            if errors:
+                self.report.add_error(line, errors)
+                continue
+
+            key = ('sku', data['sku']) if data.get('sku') else ('uid', data['uid'])
+            cleaned[key] = (line, data)
+        return cleaned
+
+    def import_chunk(self, chunk) -> None:
+        cleaned = self.clean_chunk(chunk)
+        if not cleaned:
+            return
+
+        products = ProductModel.objects.using(self.using)
+        skus     = [value for (kind, value) in cleaned if kind == 'sku']
+        uids     = [data['uid'] for (_, (_, data)) in cleaned.items() if data.get('uid')]
+        by_sku   = products.in_bulk(skus, field_name='sku') if skus else {}
+        by_uid   = products.in_bulk(uids, field_name='uid') if uids else {}
+
+        groups   = {'sku': [], 'uid': []}
+        new_rows = []
+        for (kind, value), (line, data) in cleaned.items():
+            existing = by_sku.get(value) if kind == 'sku' else None
+            if existing is None and data.get('uid') in by_uid:
+                # known product getting a new sku: upsert on its uid instead
+                existing, kind = by_uid[data['uid']], 'uid'
+            if existing is None:
+                missing = [field for field in REQUIRED_ON_CREATE if data.get(field) is None]
+                if missing:
+                    self.report.add_error(line, {field: ['This field is required for new products.'] for field in missing})
+                    continue
+                product = ProductModel(author=self.author)
+                new_rows.append((product, data))
+            else:
+                # start from the stored row so columns missing from the file keep their values
+                product = ProductModel(**{
+                    field.attname: getattr(existing, field.attname)
+                    for field in ProductModel._meta.concrete_fields if not field.primary_key
+                })
+            for field, value in data.items():
+                if field != 'meta_tags':
+                    setattr(product, field, value)
+            groups[kind].append((line, product, data.get('meta_tags'), existing is not None))
+
+        # new products without a slug get one, unique across the table and the chunk
+        unslugged = [(product, data) for product, data in new_rows if not product.slug and data.get('title')]
+        for (product, data), slug in zip(unslugged, unique_slugs(ProductModel, [d['title'] for _, d in unslugged], using=self.using)):
+            product.slug = slug
+
+        rows = groups['sku'] + groups['uid']
+        if not rows:
+            return
+        try:
+            with transaction.atomic(using=self.using):
+                for kind, group in groups.items():
+                    if group:
+                        products.bulk_create(
+                            [product for _, product, _, _ in group],
+                            update_conflicts=True,
+                            unique_fields=[kind],
+                            update_fields=UPDATE_FIELDS + (['sku'] if kind == 'uid' else []),
+                        )
+                ids = self.resolve_ids(groups)
+                self.replace_meta_tags(rows, ids)
+                self.reindex(pk for pk in ids if pk is not None)
+        except DatabaseError as e:
+            for line, _, _, _ in rows:
+                self.report.add_error(line, [f'Database error: {e}'])
+            return
+
+        self.report.updated += sum(1 for *_, exists in rows if exists)
+        self.report.created += sum(1 for *_, exists in rows if not exists)
+        bump_version(ProductModel, using=self.using)
+
+    def resolve_ids(self, groups: dict) -> list:
+        """
+        Primary keys of the upserted rows, in `groups['sku'] + groups['uid']` order, looked up
+        by the key each group was upserted on (not every backend returns them from an upsert).
+        A row upserted on its sku keeps the stored uid, whatever uid the file gave it.
+        """
+        ids = []
+        for kind, group in groups.items():
+            keys = [getattr(product, kind) for _, product, _, _ in group]
+            pks  = dict(ProductModel.objects.using(self.using).filter(**{f'{kind}__in': keys}).values_list(kind, 'pk')) if keys else {}
+            ids += [pks.get(key) for key in keys]
+        return ids
+
+    def replace_meta_tags(self, rows, ids: list) -> None:
+        tagged = {pk: tags for (_, _, tags, _), pk in zip(rows, ids) if tags is not None and pk is not None}
+        if not tagged:
+            return
+        through = ProductModel.meta_tag.through
+        through.objects.using(self.using).filter(productmodel_id__in=tagged).delete()
+        through.objects.using(self.using).bulk_create([
+            through(productmodel_id=product_id, productmetatagmodel_id=tag_id)
+            for product_id, tags in tagged.items() for tag_id in set(tags)
+        ])
+
+    def reindex(self, pks) -> None:
+        backend = get_search_backend(self.using)
+        if backend:
+            backend.reindex(pks)
+
+
+
+def export_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return value
+
+
+def export_records(queryset, chunk_size: int = 2000):
+    """ Yield one dict per product with EXPORT_COLUMNS, reading the table in chunks. """
+    queryset = queryset.select_related('category').prefetch_related('meta_tag').order_by('pk')
+    for product in queryset.iterator(chunk_size=chunk_size):
+        record = {column: getattr(product, column) for column in PRODUCT_COLUMNS}
+        record['category']  = (product.category.slug or product.category.cate_name) if product.category else None
+        record['meta_tags'] = [tag.tag for tag in product.meta_tag.all() if tag.tag]
+        yield record
+
+
+class _Echo:
+    """ File-like object whose write() hands the line back, for csv.writer. """
+    def write(self, value):
+        return value
+
+
+def export_lines(queryset, file_format: str, chunk_size: int = 2000):
+    """
+    Yield the catalog as CSV or JSONL lines at constant memory, for
+    StreamingHttpResponse or a file.
+    """
+    records = export_records(queryset, chunk_size)
+    if file_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(EXPORT_COLUMNS)
+        for record in records:
+            record['meta_tags'] = '|'.join(record['meta_tags'])
+            yield writer.writerow([export_value(record[column]) for column in EXPORT_COLUMNS])
+        return
+
+    for record in records:
+        if isinstance(record['price'], Decimal):
+            record['price'] = str(record['price'])
+        yield json.dumps(record) + '\n'
@@ -0,0 +1,139 @@
+from decimal import Decimal
+from decimal import InvalidOperation
+from django.conf import settings
+from django.db.models import Q
+from django.db.models import Count
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.exceptions import ValidationError
+
+from .models import ProductModel
+
+
+TRUE_VALUES     = ('1', 'true', 'yes')
+FALSE_VALUES    = ('0', 'false', 'no')
+RATING_STEPS    = (1, 2, 3, 4)
+
+
+
+def price_edges() -> list:
+    return list(getattr(settings, 'PRODUCT_PRICE_FACETS', [0, 25, 50, 100, 250, 500]))
+
+
+def price_buckets() -> list:
+    """ `(label, Q)` for every price range facet, e.g. ('25-50', Q(price__gte=25, price__lt=50)). """
+    edges   = price_edges()
+    buckets = [
+        (f'{low}-{high}', Q(price__gte=low, price__lt=high)) for low, high in zip(edges, edges[1:])
+    ]
+    buckets.append((f'{edges[-1]}+', Q(price__gte=edges[-1])))
+    return buckets
+
+
+
+class ProductFacetFilter(BaseFilterBackend):
+    """
+    Server-side product filters, all backed by indexed columns:
+
+        ?category=3,5               category ids
+        ?price_min=10&price_max=50  price range (inclusive)
+        ?is_available=true          availability
+        ?is_approved=true           approval
+        ?rating_min=4               minimum rating
+        ?meta_tag=2,7               any of these meta tag ids
+
+    With `?facets=true` the list response also carries `facets` for the filtered products: counts by
+    category, availability, approval, price range and minimum rating from one grouped
+    aggregate query, and counts by meta tag from a second one (the tag join would
+    multiply the rows of the first). Facets are computed after every filter is applied.
+    """
+
+    def parse_ids(self, request, name: str) -> list:
+        value = request.query_params.get(name)
+        if not value:
+            return []
+        try:
+            return [int(part) for part in value.split(',') if part.strip()]
+        except ValueError:
+            raise ValidationError({name: 'Use comma separated ids.'})
+
+    def parse_bool(self, request, name: str):
+        value = request.query_params.get(name)
+        if value is None or value == '':
+            return None
+        if value.lower() in TRUE_VALUES:
+            return True
+        if value.lower() in FALSE_VALUES:
+            return False
+        raise ValidationError({name: 'Use true or false.'})
+
+    def parse_decimal(self, request, name: str):
+        value = request.query_params.get(name)
+        if value is None or value == '':
+            return None
+        try:
+            return Decimal(value)
+        except InvalidOperation:
+            raise ValidationError({name: 'Use a number.'})
+
+    def filter_queryset(self, request, queryset, view):
+        categories = self.parse_ids(request, 'category')
+        if categories:
+            queryset = queryset.filter(category_id__in=categories)
+
+        price_min, price_max = self.parse_decimal(request, 'price_min'), self.parse_decimal(request, 'price_max')
+        if price_min is not None:
+            queryset = queryset.filter(price__gte=price_min)
+        if price_max is not None:
+            queryset = queryset.filter(price__lte=price_max)
+
+        for name in ('is_available', 'is_approved'):
+            value = self.parse_bool(request, name)
+            if value is not None:
+                queryset = queryset.filter(**{name: value})
+
+        rating_min = self.parse_decimal(request, 'rating_min')
+        if rating_min is not None:
+            queryset = queryset.filter(rating__gte=rating_min)
+
+        tags = self.parse_ids(request, 'meta_tag')
+        if tags:
+            # a semi-join keeps one row per product, so no DISTINCT is needed
+            tagged = ProductModel.meta_tag.through.objects.filter(productmetatagmodel_id__in=tags)
+            queryset = queryset.filter(pk__in=tagged.values('productmodel_id'))
+
+        # the view builds the facets from this queryset once the page is known (see ProductViewSet)
+        view.faceted_queryset = queryset
+        return queryset
+
+
+
+def compute_facets(queryset) -> dict:
+    """ Facet counts for `queryset`: one GROUP BY category query plus one for meta tags. """
+    queryset    = queryset.order_by()
+    buckets     = price_buckets()
+    aggregates  = {
+        'total':        Count('pk'),
+        'available':    Count('pk', filter=Q(is_available=True)),
+        'approved':     Count('pk', filter=Q(is_approved=True)),
+    }
+    aggregates.update({f'price_{index}': Count('pk', filter=q) for index, (_, q) in enumerate(buckets)})
+    aggregates.update({f'rating_{step}': Count('pk', filter=Q(rating__gte=step)) for step in RATING_STEPS})
+
+    rows = list(queryset.values('category_id').annotate(**aggregates))
+
+    def total(key):
+        return sum(row[key] for row in rows)
+
+    tags = (
+        ProductModel.meta_tag.through.objects.filter(productmodel_id__in=queryset.values('pk'))
+        .values('productmetatagmodel_id').annotate(count=Count('productmodel_id')).order_by('-count')
+    )
+    return {
+        'count':        total('total'),
+        'category':     {str(row['category_id']): row['total'] for row in rows},
+        'is_available': {'true': total('available'), 'false': total('total') - total('available')},
+        'is_approved':  {'true': total('approved'), 'false': total('total') - total('approved')},
+        'price':        {label: total(f'price_{index}') for index, (label, _) in enumerate(buckets)},
+        'rating_min':   {str(step): total(f'rating_{step}') for step in RATING_STEPS},
+        'meta_tag':     {str(row['productmetatagmodel_id']): row['count'] for row in tags},
+    }
@@ -0,0 +1,107 @@
+from collections import namedtuple
+from django.db import transaction
+from django.db.models import F
+from django.db.models import Case
+from django.db.models import When
+from django.db.models import Value
+from django.db.models import IntegerField
+from django.db.models.functions import Now
+
+from core.cache import bump_version
+
+from .models import ProductModel
+
+
+
+StockShortage = namedtuple('StockShortage', ['product_id', 'requested', 'available'])
+
+
+
+def merge_lines(lines) -> dict:
+    """
+    Collapse (product_id, quantity) lines into one quantity per product.
+    """
+    quantities = {}
+    for product_id, quantity in lines:
+        quantity = int(quantity)
+        if quantity <= 0:
+            raise ValueError("Reserved quantity must be positive.")
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+
+def quantity_case(quantities: dict) -> Case:
+    """
+    Build a `CASE id WHEN .. THEN quantity END` expression so one UPDATE can
+    apply a different quantity to every product.
+    """
+    return Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def find_shortages(quantities: dict, using: str = 'default') -> list:
+    """Return a StockShortage for every product that cannot cover its quantity."""
+    available = dict(
+        ProductModel.objects.using(using).filter(pk__in=quantities).values_list('pk', 'stock')
+    )
+    return [
+        StockShortage(product_id, quantity, available.get(product_id))
+        for product_id, quantity in quantities.items()
+        if available.get(product_id) is None or available[product_id] < quantity
+    ]
+
+
+
+def reserve_stock(lines, using: str = 'default', attempts: int = 3) -> list:
+    """
+    Atomically take stock for many products in a single conditional UPDATE:
+
+        UPDATE product SET stock = stock - n WHERE id IN (..) AND stock >= n
+
+    Reservation is all-or-nothing. Returns an empty list on success, otherwise
+    the StockShortage lines that could not be covered, and no stock is taken.
+    Safe to call inside an outer transaction; a failed reservation only rolls
+    back its own savepoint.
+    """
+    quantities = merge_lines(lines)
+    if not quantities:
+        return []
+
+    needed = quantity_case(quantities)
+    for _ in range(attempts):
+        with transaction.atomic(using=using):
+            updated = ProductModel.objects.using(using).filter(
+                pk__in=quantities, stock__gte=needed
+            ).update(stock=F('stock') - needed, modified=Now())
+            if updated == len(quantities):
+                bump_version(ProductModel, using=using)
+                return []
+            transaction.set_rollback(True, using=using)
+
+        shortages = find_shortages(quantities, using=using)
+        if shortages:
+            return shortages
+        # stock was replenished between the UPDATE and the check, try again
+
+    # the stock kept moving under us; report every line as unreserved
+    return [StockShortage(product_id, quantity, None) for product_id, quantity in quantities.items()]
+
+
+def release_stock(lines, using: str = 'default') -> int:
+    """
+    Give previously reserved stock back in a single UPDATE.
+    Returns the number of product rows updated.
+    """
+    quantities = merge_lines(lines)
+    if not quantities:
+        return 0
+
+    returned = quantity_case(quantities)
+    updated  = ProductModel.objects.using(using).filter(
+        pk__in=quantities, stock__isnull=False
+    ).update(stock=F('stock') + returned, modified=Now())
+    if updated:
+        bump_version(ProductModel, using=using)
+    return updated
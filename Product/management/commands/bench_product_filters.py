@@ -0,0 +1,113 @@
+import time
+import random
+from statistics import median
+from django.db import connection
+from django.core.management.base import BaseCommand
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from Product.models import ProductModel
+from Product.models import ProductCategoryModel
+from Product.models import ProductMetaTagModel
+from Product.facets import ProductFacetFilter
+from Product.facets import compute_facets
+
+
+class FilterView:
+    """ Stand-in for ProductViewSet; the filter backend stores the filtered queryset on it. """
+
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the catalog filters and facet counts on a generated catalog "
+        "(1M products by default) in a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1_000_000)
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--tags', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per case; the median is reported.")
+        parser.add_argument('--keepdb', action='store_true', help="Keep the generated database for the next run.")
+        parser.add_argument('--explain', action='store_true', help="Print the query plan of every filter.")
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            self.seed(options)
+            self.run_cases(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+    def seed(self, options):
+        existing = ProductModel.objects.count()
+        if existing >= options['products']:
+            self.stdout.write(f"Reusing {existing} products.")
+            return
+
+        rng = random.Random(42)
+        ProductCategoryModel.objects.bulk_create(
+            [ProductCategoryModel(cate_name=f'Category {i}', slug=f'category-{i}') for i in range(options['categories'])]
+        )
+        ProductMetaTagModel.objects.bulk_create([ProductMetaTagModel(tag=f'tag-{i}') for i in range(options['tags'])])
+        category_ids = [category.pk for category in ProductCategoryModel.objects.all()]
+        tag_ids = [tag.pk for tag in ProductMetaTagModel.objects.all()]
+        through = ProductModel.meta_tag.through
+
+        started = time.perf_counter()
+        for start in range(existing, options['products'], options['batch_size']):
+            size = min(options['batch_size'], options['products'] - start)
+            ProductModel.objects.bulk_create([
+                ProductModel(
+                    sku=f'SKU{start + i:08d}', name=f'Product {start + i}', category_id=rng.choice(category_ids),
+                    price=f'{rng.lognormvariate(4, 1):.2f}'[:10], weight=1.0, discount_percent=0, stock=rng.randint(0, 50),
+                    is_available=rng.random() < 0.8, is_approved=rng.random() < 0.6, rating=round(rng.uniform(0, 5), 1),
+                )
+                for i in range(size)
+            ])
+            pks = ProductModel.objects.filter(sku__gte=f'SKU{start:08d}', sku__lt=f'SKU{start + size:08d}').values_list('pk', flat=True)
+            through.objects.bulk_create([
+                through(productmodel_id=pk, productmetatagmodel_id=tag_id)
+                for pk in pks for tag_id in rng.sample(tag_ids, rng.randint(0, 2))
+            ])
+            self.stdout.write(f"\r{start + size} products", ending='')
+        self.stdout.write(f"\nSeeded in {time.perf_counter() - started:.0f}s.")
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')     # let the planner see the new index statistics
+
+    def timed(self, fn, repeat):
+        timings, result = [], None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result  = fn()
+            timings.append((time.perf_counter() - started) * 1000)
+        return median(timings), result
+
+    def run_cases(self, options):
+        category = ProductCategoryModel.objects.values_list('pk', flat=True).first()
+        tag      = ProductMetaTagModel.objects.values_list('pk', flat=True).first()
+        cases    = [
+            {},
+            {'category': category},
+            {'category': category, 'is_available': 'true', 'price_min': 20, 'price_max': 100},
+            {'is_available': 'true', 'is_approved': 'true', 'price_max': 50},
+            {'is_available': 'true', 'rating_min': 4.5},
+            {'meta_tag': tag, 'is_available': 'true'},
+        ]
+        factory = APIRequestFactory()
+        backend = ProductFacetFilter()
+
+        self.stdout.write(f"{'filters':<70} {'matches':>9} {'page ms':>9} {'facets ms':>10}")
+        for params in cases:
+            request     = Request(factory.get('/', params))
+            view        = FilterView()
+            queryset    = backend.filter_queryset(request, ProductModel.objects.all(), view)
+
+            page_ms, count = self.timed(lambda: (queryset.count(), list(queryset[:20]))[0], options['repeat'])
+            facets_ms, _   = self.timed(lambda: compute_facets(view.faceted_queryset), options['repeat'])
+            label = '&'.join(f'{key}={value}' for key, value in params.items()) or '(none)'
+            self.stdout.write(f"{label:<70} {count:>9} {page_ms:>9.1f} {facets_ms:>10.1f}")
+            if options['explain']:
+                self.stdout.write(queryset.order_by().values('pk').explain())
@@ -0,0 +1,23 @@
+import sys
+from django.core.management.base import BaseCommand
+
+from Product.models import ProductModel
+from Product.catalog import export_lines
+
+
+class Command(BaseCommand):
+    help = "Write the product catalog as CSV or JSONL, reading the table in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file-format', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--output', help="Output file (default: stdout).")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Products fetched per query.")
+
+    def handle(self, *args, **options):
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            for line in export_lines(ProductModel.objects.all(), options['file_format'], options['chunk_size']):
+                output.write(line)
+        finally:
+            if output is not sys.stdout:
+                output.close()
@@ -0,0 +1,37 @@
+import json
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from Product.catalog import CatalogImporter
+from Product.catalog import detect_format
+
+
+class Command(BaseCommand):
+    help = "Upsert products from a CSV or JSONL file, matched by sku (or uid), streaming it in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file.")
+        parser.add_argument('--file-format', choices=['csv', 'jsonl'], help="Defaults to the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Rows validated and written per transaction.")
+        parser.add_argument('--errors', help="Write per-row errors to this JSONL file instead of the console.")
+
+    def handle(self, *args, **options):
+        try:
+            file_format = detect_format(options['path'], options['file_format'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        with open(options['path'], 'rb') as stream:
+            report = CatalogImporter(chunk_size=options['chunk_size']).run(stream, file_format)
+
+        if options['errors']:
+            with open(options['errors'], 'w') as errors:
+                for error in report.errors:
+                    errors.write(json.dumps(error) + '\n')
+        else:
+            for error in report.errors:
+                self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'])}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.created} products created, {report.updated} updated, {len(report.errors)} rows rejected."
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Product.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index from the product table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help="Database alias to rebuild.")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Products indexed per batch.")
+
+    def handle(self, *args, **options):
+        backend = get_search_backend(options['database'])
+        if backend is None:
+            raise CommandError("No full-text search backend is configured for this database.")
+
+        total = backend.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} products."))
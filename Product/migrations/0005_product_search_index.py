@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from Product.search import get_search_backend
+
+    backend = get_search_backend(schema_editor.connection.alias)
+    if backend:
+        backend.install()
+
+
+def uninstall_search_index(apps, schema_editor):
+    from Product.search import get_search_backend
+
+    backend = get_search_backend(schema_editor.connection.alias)
+    if backend:
+        backend.uninstall()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('xApiProduct', '0004_alter_wishlistproduct_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('xApiProduct', '0006_image_processing_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimagemodel',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
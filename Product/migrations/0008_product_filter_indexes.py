@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('xApiProduct', '0007_product_image_derivatives'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productmodel',
+            index=models.Index(fields=['category', 'is_available', 'price'], name='product_cat_avail_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productmodel',
+            index=models.Index(fields=['category', '-created'], name='product_cat_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productmodel',
+            index=models.Index(fields=['is_available', 'is_approved', 'price'], name='product_avail_appr_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productmodel',
+            index=models.Index(fields=['is_available', 'rating'], name='product_avail_rating_idx'),
+        ),
+    ]
@@ -5,6 +5,10 @@ from datetime import datetime
 from io import BytesIO
 from PIL import Image
 from django.db import models
+from django.db import transaction
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models.functions import Now
 from django.contrib.auth import get_user_model
 from django.utils.text import slugify
 from PIL import UnidentifiedImageError 
@@ -12,6 +16,16 @@ from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.core.exceptions import ValidationError
 
 from core.timestamp import TimeStampModel 
+from core.cache import bump_version
+from core.slugs import save_with_unique_slug
+from core.imageencoding import encode_within
+from core.imageencoding import load_thumbnail
+from core.imagepipeline import ProcessingStatus
+from core.imagepipeline import enqueue
+from core.imagepipeline import is_new_upload
+
+from .search import SEARCH_COLUMNS
+from .search import get_search_backend 
 
 
 
@@ -45,15 +59,7 @@ class ProductCategoryModel(TimeStampModel):
     
 
     def save(self, *args, **kwargs):
-        if self.cate_name and not self.slug:
-            base_slug = slugify(self.cate_name)
-            slug = base_slug
-            counter = 1
-            while ProductCategoryModel.objects.filter(slug=slug).exclude(pk=self.pk).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
-        super().save(*args, **kwargs)
+        save_with_unique_slug(self, self.cate_name, lambda: super(ProductCategoryModel, self).save(*args, **kwargs))
 
 
 
@@ -112,6 +118,28 @@ def product_unique_key() -> str:
     return uuid.uuid4().hex[:32].lower() 
 
 
+class ProductQuerySet(models.QuerySet):
+    """
+    Keeps the full-text index in step with queryset updates: `update()` of an indexed
+    column re-indexes the updated rows. Queryset deletes are handled by the post_delete
+    receiver in Product.signals; raw SQL and `bulk_update()` need a
+    `rebuild_product_search` (or `get_search_backend().reindex(pks)`) afterwards.
+    """
+
+    def update(self, **kwargs):
+        backend = get_search_backend(self.db)
+        if backend is None or not set(kwargs) & set(SEARCH_COLUMNS):
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            pks     = list(self.values_list('pk', flat=True))
+            updated = super().update(**kwargs)
+            backend.reindex(pks)
+        return updated
+
+    update.alters_data = True
+
+
+
 class ProductModel(TimeStampModel):
     """
     Model for products.
@@ -148,9 +176,18 @@ class ProductModel(TimeStampModel):
 
     uid                  = models.CharField(max_length=255, default=product_unique_key, unique=True)
 
+    objects              = ProductQuerySet.as_manager()
+
 
     class Meta:
         ordering = ['-created']
+        indexes  = [
+            # catalog filters (Product.facets): category browsing, then the global availability filters
+            models.Index(fields=['category', 'is_available', 'price'], name='product_cat_avail_price_idx'),
+            models.Index(fields=['category', '-created'], name='product_cat_created_idx'),
+            models.Index(fields=['is_available', 'is_approved', 'price'], name='product_avail_appr_price_idx'),
+            models.Index(fields=['is_available', 'rating'], name='product_avail_rating_idx'),
+        ]
        
 
     def __str__(self) -> str:
@@ -158,35 +195,26 @@ class ProductModel(TimeStampModel):
     
 
     def save(self, *args, **kwargs):
-        if self.title and not self.slug:
-            base_slug  = slugify(self.title)
-            slug       = base_slug
-            counter    = 1
-
-            while ProductModel.objects.filter(slug=slug).exclude(pk=self.pk).exists():
-                slug        = f"{base_slug}-{counter}"
-                counter     += 1
-            self.slug = slug
+        save_with_unique_slug(self, self.title, lambda: super(ProductModel, self).save(*args, **kwargs))
 
-        super().save(*args, **kwargs)
+        # keep the full-text index in step with the row; deletes are handled in Product.signals
+        backend = get_search_backend(self._state.db)
+        if backend:
+            backend.index([self])
 
 
     def update_stock(self, quantity: int) -> None:
         """Update the stock of the product."""
         if self.stock is None:
             raise ValueError("Stock cannot be None.")
-        self.stock += quantity
-        self.save()
+        self._adjust_stock(quantity)
 
 
     def reduce_stock(self, quantity: int) -> None:
         """Reduce the stock of the product."""
         if self.stock is None:
             raise ValueError("Stock cannot be None.")
-        if self.stock >= quantity:
-            self.stock -= quantity
-            self.save()
-        else:
+        if not self._adjust_stock(-quantity, stock__gte=quantity):
             raise ValueError("Insufficient stock to reduce.")
         
 
@@ -196,8 +224,21 @@ class ProductModel(TimeStampModel):
             raise ValueError("Restock quantity must be positive.")
         if self.stock is None:
             raise ValueError("Stock cannot be None.")
-        self.stock += quantity
-        self.save()
+        self._adjust_stock(quantity)
+
+
+    def _adjust_stock(self, delta: int, **conditions) -> bool:
+        """
+        Apply `stock = stock + delta` as a single conditional UPDATE, so concurrent
+        callers never lose each other's changes, then reload the stock value.
+        """
+        updated = ProductModel.objects.filter(pk=self.pk, stock__isnull=False, **conditions).update(
+            stock=models.F('stock') + delta, modified=Now()
+        )
+        if updated:
+            bump_version(ProductModel, using=self._state.db)
+        self.refresh_from_db(fields=['stock', 'modified'])
+        return bool(updated)
     
     def is_product_available(self) -> bool:
         return self.is_available and (self.stock is not None and self.stock > 0)
@@ -248,6 +289,8 @@ class ProductImageModel(TimeStampModel):
     unique_id        = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     is_primary       = models.BooleanField(default=False)
     alt_text         = models.CharField(max_length=255, null=True, blank=True)
+    processing_status = models.CharField(max_length=10, choices=ProcessingStatus.choices, default=ProcessingStatus.READY, editable=False)
+    derivatives      = models.JSONField(default=dict, blank=True, editable=False)  # {format: {width: storage name}}
 
     class Meta:
         ordering = ['-created']
@@ -276,36 +319,15 @@ class ProductImageModel(TimeStampModel):
         Create a thumbnail of the original image, targeting a file size under 200 KB.
         """
         try:
-            with Image.open(self.product_image) as image:
-                # Convert to RGB for all non-RGB images
-                if image.mode != "RGB":
-                    image = image.convert("RGB")
-
-                # Resize to max 800x800, maintaining aspect ratio
-                image.thumbnail((800, 800), Image.Resampling.LANCZOS)
-
-                # Save to BytesIO with quality optimization
-                image_io = BytesIO()
-                quality = 95
-                image.save(image_io, format="JPEG", quality=quality)
-
-                # Optimize size if over 200 KB
-                if image_io.tell() / 1024 > 200:
-                    for q in range(90, 29, -5):
-                        image_io = BytesIO()
-                        image.save(image_io, format="JPEG", quality=q)
-                        if image_io.tell() / 1024 <= 200:
-                            break
-                    else:
-                        raise ValidationError("Could not reduce image size below 200 KB.")
-
-                image_io.seek(0)
+            with load_thumbnail(self.product_image, (800, 800)) as image:
+                image_io = encode_within(image, 200 * 1024, quality=95, min_quality=30).buffer
+
                 return InMemoryUploadedFile(
                     image_io,
                     "ImageField",
                     f"thumb_{os.path.basename(self.product_image.name)}",
                     "image/jpeg",
-                    image_io.tell(),
+                    image_io.getbuffer().nbytes,
                     None
                 )
         except UnidentifiedImageError:
@@ -313,14 +335,57 @@ class ProductImageModel(TimeStampModel):
         except Exception as e:
             raise ValidationError(f"Failed to create thumbnail: {str(e)}")
 
+    def make_derivatives(self) -> dict:
+        """
+        Render the original image at every `PRODUCT_IMAGE_WIDTHS` width in every
+        `PRODUCT_IMAGE_FORMATS` format, next to it in the `image_upload_to` layout.
+        Each rendition has the configured width and a proportional height, whatever the
+        aspect ratio. Images are never upscaled: widths above the source's collapse into
+        one rendition at the source width, keyed by that width.
+        Called by the image pipeline; returns the new `derivatives` column value.
+        """
+        widths  = sorted(set(settings.PRODUCT_IMAGE_WIDTHS), reverse=True)
+        quality = settings.PRODUCT_IMAGE_QUALITY
+        stem    = os.path.splitext(image_upload_to(self, self.product_image.name))[0]
+        storage = self.product_image.storage
+
+        derivatives = {fmt.lower(): {} for fmt in settings.PRODUCT_IMAGE_FORMATS}
+        # decode once at the largest width, then scale each rendition from the previous one
+        with load_thumbnail(self.product_image, (widths[0], None)) as image:
+            rendition = image
+            for width in widths:
+                width = min(width, rendition.width)
+                if str(width) in derivatives[settings.PRODUCT_IMAGE_FORMATS[0].lower()]:
+                    continue    # the source is narrower than this width too
+                if width < rendition.width:
+                    height    = max(1, round(image.height * width / image.width))
+                    rendition = rendition.resize((width, height), Image.Resampling.LANCZOS)
+                for fmt in settings.PRODUCT_IMAGE_FORMATS:
+                    buffer = BytesIO()
+                    rendition.save(buffer, format=fmt, quality=quality)
+                    name = storage.save(f"{stem}_{width}w.{fmt.lower()}", ContentFile(buffer.getvalue()))
+                    derivatives[fmt.lower()][str(width)] = name
+
+        self.derivatives = derivatives
+        return {'derivatives': derivatives}
+
+    def derivative_files(self) -> list:
+        return [name for names in (self.derivatives or {}).values() for name in names.values()]
+
     def save(self, *args, **kwargs):
-        """Override save to generate and store thumbnail."""
+        """
+        Override save to store the original upload as-is and queue thumbnail
+        generation on the image pipeline; `processing_status` tracks the job.
+        """
         self.clean()
-        if self.product_image:
-            self.product_image = self.make_thumbnail()
+        new_upload = is_new_upload(self.product_image)
+        if new_upload:
+            self.processing_status = ProcessingStatus.PENDING
         if self.is_primary and self.product:
             ProductImageModel.objects.filter(
                 product=self.product,
                 is_primary=True
             ).exclude(pk=self.pk).update(is_primary=False)
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+        if new_upload:
+            enqueue(self, 'product_image')
@@ -0,0 +1,282 @@
+import re
+from django.conf import settings
+from django.db import connections
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+
+SEARCH_TABLE    = 'xApiProduct_productsearch'
+PRODUCT_TABLE   = 'xApiProduct_productmodel'
+SEARCH_COLUMNS  = ('name', 'title', 'slug', 'description', 'sku', 'uid')
+TOKEN_RE        = re.compile(r'\w+', re.UNICODE)
+
+
+
+def tokenize(terms) -> list:
+    """
+    Split raw search terms into plain word tokens.
+    Everything that is not a word character is dropped, so the tokens are
+    always safe to embed in an FTS5 MATCH or a Postgres tsquery expression.
+    """
+    tokens = []
+    for term in terms:
+        tokens.extend(token.lower() for token in TOKEN_RE.findall(str(term)))
+    return tokens
+
+
+def product_document(product) -> tuple:
+    """Return the indexed column values of a product, in SEARCH_COLUMNS order."""
+    return tuple(str(getattr(product, column) or '') for column in SEARCH_COLUMNS)
+
+
+
+
+class BaseSearchBackend:
+    """
+    Base class for product search backends.
+    A backend owns a side table holding the inverted index, keeps it in sync
+    with ProductModel rows and turns `?search=` terms into a ranked queryset.
+    """
+
+    def __init__(self, using: str = 'default'):
+        self.using = using
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def install(self) -> None:
+        raise NotImplementedError
+
+    def uninstall(self) -> None:
+        raise NotImplementedError
+
+    def index(self, products) -> None:
+        raise NotImplementedError
+
+    def remove(self, pks) -> None:
+        raise NotImplementedError
+
+    def search(self, queryset, terms):
+        raise NotImplementedError
+
+    def reindex(self, pks, batch_size: int = 500) -> None:
+        """Re-index the products whose primary keys are `pks`, `batch_size` rows per query."""
+        from .models import ProductModel
+
+        pks = list(pks)
+        for start in range(0, len(pks), batch_size):
+            self.index(ProductModel.objects.using(self.using).filter(pk__in=pks[start:start + batch_size]).only('pk', *SEARCH_COLUMNS))
+
+    def rebuild(self, batch_size: int = 2000) -> int:
+        """Re-index every product in batches, returning the number of indexed rows."""
+        from .models import ProductModel
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM "{SEARCH_TABLE}"')
+
+        total   = 0
+        batch   = []
+        for product in ProductModel.objects.using(self.using).only('pk', *SEARCH_COLUMNS).iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                self.index(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            self.index(batch)
+            total += len(batch)
+        return total
+
+
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    Search backend using an SQLite FTS5 virtual table.
+    The product id is stored as the FTS rowid, results are ranked with bm25()
+    and every token is matched as a prefix.
+    """
+    # bm25() column weights, in SEARCH_COLUMNS order
+    weights = (10.0, 10.0, 5.0, 1.0, 5.0, 5.0)
+
+    def install(self) -> None:
+        columns     = ', '.join(SEARCH_COLUMNS)
+        coalesced   = ', '.join(f"COALESCE({column}, '')" for column in SEARCH_COLUMNS)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS "{SEARCH_TABLE}" '
+                f"USING fts5({columns}, tokenize='unicode61')"
+            )
+            cursor.execute(f'INSERT INTO "{SEARCH_TABLE}" (rowid, {columns}) SELECT id, {coalesced} FROM "{PRODUCT_TABLE}"')
+
+    def uninstall(self) -> None:
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS "{SEARCH_TABLE}"')
+
+    def index(self, products) -> None:
+        rows = [(product.pk, *product_document(product)) for product in products]
+        if not rows:
+            return
+        placeholders = ', '.join(['%s'] * (len(SEARCH_COLUMNS) + 1))
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM "{SEARCH_TABLE}" WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO "{SEARCH_TABLE}" (rowid, {", ".join(SEARCH_COLUMNS)}) VALUES ({placeholders})',
+                rows,
+            )
+
+    def remove(self, pks) -> None:
+        pks = [(pk,) for pk in pks if pk is not None]
+        if not pks:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM "{SEARCH_TABLE}" WHERE rowid = %s', pks)
+
+    def search(self, queryset, terms):
+        tokens = tokenize(terms)
+        if not tokens:
+            return queryset
+        match   = ' '.join(f'"{token}"*' for token in tokens)
+        weights = ', '.join(str(weight) for weight in self.weights)
+        table   = queryset.model._meta.db_table
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM "{SEARCH_TABLE}" WHERE "{SEARCH_TABLE}" MATCH %s', (match,))
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT bm25("{SEARCH_TABLE}", {weights}) FROM "{SEARCH_TABLE}" '
+                f'WHERE "{SEARCH_TABLE}" MATCH %s AND rowid = "{table}"."id"',
+                (match,),
+                output_field=FloatField(),
+            )
+        ).order_by('search_rank', '-created')
+
+
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Search backend using a Postgres tsvector side table with a GIN index.
+    Results are ranked with ts_rank() and every token is matched as a prefix.
+    """
+    # setweight() label per column: names and titles rank above codes, codes above descriptions
+    weights = {'name': 'A', 'title': 'A', 'slug': 'B', 'sku': 'B', 'uid': 'B', 'description': 'C'}
+
+    @property
+    def config(self) -> str:
+        return getattr(settings, 'PRODUCT_SEARCH_CONFIG', 'simple')
+
+    def _document_sql(self, values) -> str:
+        """Build the weighted tsvector expression from one SQL value per indexed column."""
+        return ' || '.join(
+            f"setweight(to_tsvector('{self.config}', {value}), '{self.weights[column]}')"
+            for column, value in zip(SEARCH_COLUMNS, values)
+        )
+
+    def install(self) -> None:
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS "{SEARCH_TABLE}" ('
+                f'product_id bigint PRIMARY KEY REFERENCES "{PRODUCT_TABLE}" (id) ON DELETE CASCADE, '
+                f'document tsvector NOT NULL)'
+            )
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS "{SEARCH_TABLE}_document_gin" ON "{SEARCH_TABLE}" USING GIN (document)')
+            document = self._document_sql(f"COALESCE({column}, '')" for column in SEARCH_COLUMNS)
+            cursor.execute(
+                f'INSERT INTO "{SEARCH_TABLE}" (product_id, document) '
+                f'SELECT id, {document} FROM "{PRODUCT_TABLE}" ON CONFLICT (product_id) DO NOTHING'
+            )
+
+    def uninstall(self) -> None:
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS "{SEARCH_TABLE}"')
+
+    def index(self, products) -> None:
+        rows = [(product.pk, *product_document(product)) for product in products]
+        if not rows:
+            return
+        document = self._document_sql(['%s'] * len(SEARCH_COLUMNS))
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO "{SEARCH_TABLE}" (product_id, document) VALUES (%s, {document}) '
+                f'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document',
+                rows,
+            )
+
+    def remove(self, pks) -> None:
+        pks = [(pk,) for pk in pks if pk is not None]
+        if not pks:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM "{SEARCH_TABLE}" WHERE product_id = %s', pks)
+
+    def search(self, queryset, terms):
+        tokens = tokenize(terms)
+        if not tokens:
+            return queryset
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        table   = queryset.model._meta.db_table
+        return queryset.filter(
+            pk__in=RawSQL(
+                f'SELECT product_id FROM "{SEARCH_TABLE}" WHERE document @@ to_tsquery(%s, %s)',
+                (self.config, tsquery),
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT ts_rank(document, to_tsquery(%s, %s)) FROM "{SEARCH_TABLE}" '
+                f'WHERE product_id = "{table}"."id"',
+                (self.config, tsquery),
+                output_field=FloatField(),
+            )
+        ).order_by('-search_rank', '-created')
+
+
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+_backends = {}
+
+
+def get_search_backend(using: str = 'default'):
+    """
+    Return the search backend for a database alias, or None when the database
+    has no full-text index and the plain LIKE search should be used.
+    `settings.PRODUCT_SEARCH_BACKEND` may name a backend class explicitly;
+    setting it to an empty string disables the index altogether.
+    """
+    if using not in _backends:
+        backend_path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+        if backend_path is None:
+            backend_class = VENDOR_BACKENDS.get(connections[using].vendor)
+        elif backend_path:
+            backend_class = import_string(backend_path)
+        else:
+            backend_class = None
+        _backends[using] = backend_class(using) if backend_class else None
+    return _backends[using]
+
+
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for DRF's SearchFilter on the product catalog.
+    Keeps the `?search=` contract but answers it from the full-text index,
+    falling back to the `search_fields` LIKE scan when no index is available.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        backend = get_search_backend(queryset.db)
+        if backend is None:
+            return super().filter_queryset(request, queryset, view)
+
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+        return backend.search(queryset, search_terms)
@@ -45,12 +45,27 @@ class ProductMetaTagSerializer(serializers.ModelSerializer):
 class ProductImageSerializer(serializers.ModelSerializer):
     """ 
     Serializer for product images.
+    `srcset` maps each derivative format to a `srcset` attribute value, e.g.
+    {"webp": "https://.../x_160w.webp 160w, https://.../x_400w.webp 400w"}.
     """
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = ProductImageModel
-        fields =  ['id', 'product', 'author', 'product_image', 'is_primary', 'alt_text']
-        read_only_fields = ['id', 'created', 'modified']
+        fields =  ['id', 'product', 'author', 'product_image', 'is_primary', 'alt_text', 'processing_status', 'srcset']
+        read_only_fields = ['id', 'created', 'modified', 'processing_status']
+
+    def get_srcset(self, obj) -> dict:
+        request = self.context.get('request')
+        storage = obj.product_image.storage
+        srcset  = {}
+        for fmt, names in (obj.derivatives or {}).items():
+            urls = []
+            for width, name in sorted(names.items(), key=lambda item: int(item[0])):
+                url = storage.url(name)
+                urls.append(f"{request.build_absolute_uri(url) if request else url} {width}w")
+            srcset[fmt] = ', '.join(urls)
+        return srcset
 
 
 
@@ -99,4 +114,42 @@ class WishListProductSerializer(serializers.ModelSerializer):
         product = attrs.get('product')
         if WishListProduct.objects.filter(user=user, product=product).exists():
             raise serializers.ValidationError('This product is already in your wishlist.')
-        return attrs
\ No newline at end of file
+        return attrs
+
+
+
+class ProductImportSerializer(serializers.Serializer):
+    """
+    Validates one row of a catalog import (see Product.catalog). Field checks only,
+    no database queries: categories, meta tags and existing rows are resolved per chunk.
+    """
+    sku                  = serializers.CharField(max_length=50, required=False, allow_null=True, allow_blank=True)
+    uid                  = serializers.CharField(max_length=255, required=False, allow_null=True, allow_blank=True)
+    name                 = serializers.CharField(max_length=100, required=False, allow_null=True, allow_blank=True)
+    title                = serializers.CharField(max_length=255, required=False, allow_null=True, allow_blank=True)
+    slug                 = serializers.SlugField(max_length=255, required=False, allow_null=True, allow_blank=True)
+    description          = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    weight               = serializers.FloatField(required=False, allow_null=True)
+    price                = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
+    discount_percent     = serializers.FloatField(required=False, allow_null=True, min_value=0, max_value=100)
+    stock                = serializers.IntegerField(required=False, allow_null=True)
+    warranty_information = serializers.CharField(max_length=255, required=False, allow_null=True, allow_blank=True)
+    shipping_information = serializers.CharField(max_length=255, required=False, allow_null=True, allow_blank=True)
+    return_policy        = serializers.CharField(max_length=255, required=False, allow_null=True, allow_blank=True)
+    min_order_quantity   = serializers.IntegerField(required=False, min_value=0)
+    is_available         = serializers.BooleanField(required=False)
+    is_approved          = serializers.BooleanField(required=False)
+    category             = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    meta_tags            = serializers.ListField(child=serializers.CharField(), required=False)
+
+    def to_internal_value(self, data):
+        # CSV cells are strings: empty means "not set", meta tags are '|' separated
+        data = {key: value for key, value in data.items() if key and value not in ('', None)}
+        if isinstance(data.get('meta_tags'), str):
+            data['meta_tags'] = [tag.strip() for tag in data['meta_tags'].split('|') if tag.strip()]
+        return super().to_internal_value(data)
+
+    def validate(self, attrs):
+        if not attrs.get('sku') and not attrs.get('uid'):
+            raise serializers.ValidationError('Each row needs a sku or a uid.')
+        return attrs
@@ -0,0 +1,52 @@
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
+from django.db.models.signals import post_delete
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+
+from core.cache import bump_version
+from core.timestamp import touched
+from core.timestamp import touch_m2m_owners
+
+from .models import ProductCategoryModel
+from .models import ProductMetaTagModel
+from .models import ProductModel
+from .models import ProductImageModel
+from .search import get_search_backend
+
+
+@receiver([post_save, post_delete], sender=ProductModel)
+@receiver([post_save, post_delete], sender=ProductCategoryModel)
+@receiver([post_save, post_delete], sender=ProductMetaTagModel)
+@receiver([post_save, post_delete], sender=ProductImageModel)
+def invalidate_catalog_cache(sender, using, **kwargs):
+    """Expire cached catalog responses that include the changed model."""
+    bump_version(sender, using=using)
+
+
+@receiver(post_delete, sender=ProductModel)
+def remove_from_search(sender, instance, using, **kwargs):
+    """Drop deleted products from the full-text index, including queryset and cascade deletes."""
+    backend = get_search_backend(using)
+    if backend:
+        backend.remove([instance.pk])
+
+
+@receiver(post_delete, sender=ProductMetaTagModel)
+def invalidate_deleted_tag(sender, using, **kwargs):
+    """Deleting a tag removes its m2m rows without m2m_changed, and ProductModels serialize their tag ids."""
+    bump_version(ProductModel, using=using)
+
+
+@receiver(pre_delete, sender=ProductMetaTagModel)
+def touch_deleted_tag_products(sender, instance, using, **kwargs):
+    """The cascade removing a deleted tag's m2m rows sends no m2m_changed either."""
+    ProductModel._default_manager.using(using).filter(meta_tag=instance).update(**touched(ProductModel))
+
+
+@receiver(m2m_changed, sender=ProductModel.meta_tag.through)
+def invalidate_product_tags(sender, instance, action, reverse, pk_set, using, **kwargs):
+    """Products serialize their meta tag ids, so tag assignment changes the product and its ETag."""
+    touch_m2m_owners(ProductModel, 'meta_tag', instance, action, reverse, pk_set, using)
+    if action.startswith('post_'):
+        bump_version(ProductModel, using=using)
@@ -1,3 +1,651 @@
+import json
+import shutil
+import tempfile
+from base64 import b64decode
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+from io import BytesIO
+from io import StringIO
+from unittest import mock
+from PIL import Image
 from django.test import TestCase
+from django.test import override_settings
+from django.core.cache import cache
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .models import ProductCategoryModel
+from .models import ProductMetaTagModel
+from .models import ProductModel
+from .models import ProductImageModel
+from .serializers import ProductImageSerializer
+from .catalog import CatalogImporter
+from .catalog import export_lines
+from . import search
+from .search import SEARCH_TABLE
+from core.imagepipeline import ProcessingStatus
+from core.cache import model_versions
+from core.counters import flush_counters
+from core.counters import get_buffer
+from core.counters import increment_many
+from core.slugs import taken_slugs
+from core.slugs import unique_slugs
+
+
+User = get_user_model()
+
+
+
+class ProductSearchTest(TestCase):
+    """
+    `?search=` is answered from the full-text index, ranked and prefix-matched, and the
+    index follows saves, deletes and queryset updates.
+    """
+
+    def setUp(self):
+        self.hose   = self.create(name='Garden hose', description='Flexible watering')
+        self.reel   = self.create(name='Reel', description='Keeps a garden hose tidy')
+        self.rake   = self.create(name='Rake', description='Steel tines')
+
+    def create(self, **fields):
+        return ProductModel.objects.create(weight=1.0, discount_percent=0, price='10.00', stock=1, **fields)
+
+    def search(self, terms, **params):
+        response = self.client.get('/api/v1/product/', {'search': terms, **params})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()['results']]
+
+    def test_ranked_and_prefix_matched(self):
+        self.assertEqual(self.search('hose'), [self.hose.pk, self.reel.pk])
+        self.assertEqual(self.search('gard ho'), [self.hose.pk, self.reel.pk])
+        self.assertEqual(self.search('hose tidy'), [self.reel.pk])
+        self.assertEqual(self.search('"hose" OR rake*'), [])
+        self.assertEqual(self.search('shovel'), [])
+
+    def test_combines_with_filters(self):
+        ProductModel.objects.filter(pk=self.hose.pk).update(is_available=False)
+        self.assertEqual(self.search('hose', is_available='true'), [self.reel.pk])
+
+    def test_follows_saves_deletes_and_updates(self):
+        self.rake.name = 'Leaf rake'
+        self.rake.save()
+        self.assertEqual(self.search('leaf'), [self.rake.pk])
+
+        ProductModel.objects.filter(pk=self.rake.pk).update(name='Lawn comb')
+        self.assertEqual(self.search('leaf'), [])
+        self.assertEqual(self.search('lawn'), [self.rake.pk])
+
+        self.reel.delete()
+        ProductModel.objects.filter(pk=self.hose.pk).delete()
+        self.assertEqual(self.search('hose'), [])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM "{SEARCH_TABLE}"')
+            self.assertEqual([row[0] for row in cursor.fetchall()], [self.rake.pk])
+
+    def test_rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM "{SEARCH_TABLE}"')
+            cursor.execute('UPDATE "xApiProduct_productmodel" SET name = %s WHERE id = %s', ['Trowel', self.rake.pk])
+        self.assertEqual(self.search('hose'), [])
+
+        output = StringIO()
+        call_command('rebuild_product_search', batch_size=2, stdout=output)
+        self.assertIn('Indexed 3 products.', output.getvalue())
+        self.assertEqual(self.search('hose'), [self.hose.pk, self.reel.pk])
+        self.assertEqual(self.search('trowel'), [self.rake.pk])
+
+    def test_like_fallback_without_index(self):
+        with mock.patch.dict(search._backends, {'default': None}):
+            self.assertEqual(set(self.search('hose')), {self.hose.pk, self.reel.pk})
+
+
+
+class ProductCursorPaginationTest(TestCase):
+    """
+    `?pagination_type=cursor` pages on the compound `(-created, -id)` keyset, so rows sharing
+    `created` are neither repeated nor skipped, and a `?search=` keeps its rank order.
+    """
+
+    def setUp(self):
+        self.products = [self.create(name=f'Garden tool {i}') for i in range(7)]
+        # a bulk import stamps many rows with one `created`
+        ProductModel.objects.filter(pk__in=[p.pk for p in self.products[1:6]]).update(created=self.products[0].created)
+
+    def create(self, **fields):
+        return ProductModel.objects.create(weight=1.0, discount_percent=0, price='10.00', stock=1, **fields)
+
+    def page(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertNotIn('count', body)
+        return [item['id'] for item in body['results']], body['next'], body['previous']
+
+    def walk(self, **params):
+        ids, next_url, previous = self.page('/api/v1/product/', {'pagination_type': 'cursor', 'size': 2, **params})
+        self.assertIsNone(previous)
+        while next_url:
+            page, next_url, _ = self.page(next_url)
+            ids += page
+        return ids
+
+    def decode(self, url):
+        return b64decode(parse_qs(urlparse(url).query)['cursor'][0]).decode()
+
+    def expected(self, queryset=None):
+        return list((queryset or ProductModel.objects.all()).order_by('-created', '-id').values_list('id', flat=True))
+
+    def test_walks_rows_sharing_created_once(self):
+        self.assertEqual(self.walk(), self.expected())
+
+    def test_cursor_carries_no_offset(self):
+        _, next_url, _ = self.page('/api/v1/product/', {'pagination_type': 'cursor', 'size': 2})
+        _, next_url, _ = self.page(next_url)
+        self.assertNotIn('o=', self.decode(next_url))
+
+    def test_previous_link_returns_the_earlier_page(self):
+        first, next_url, _ = self.page('/api/v1/product/', {'pagination_type': 'cursor', 'size': 2})
+        second, next_url, _ = self.page(next_url)
+        third, _, previous = self.page(next_url)
+        self.assertEqual(self.page(previous)[0], second)
+        _, _, previous = self.page(previous)
+        self.assertEqual(self.page(previous)[0], first)
+
+    def test_stable_under_inserts(self):
+        expected = self.expected()
+        first, next_url, _ = self.page('/api/v1/product/', {'pagination_type': 'cursor', 'size': 3})
+        self.create(name='Late arrival')
+        ids = first
+        while next_url:
+            page, next_url, _ = self.page(next_url)
+            ids += page
+        self.assertEqual(ids, expected)
+
+    def test_search_keeps_rank_order(self):
+        hose    = self.create(name='Garden hose', description='Flexible watering')
+        self.create(name='Reel', description='Keeps a garden hose tidy')
+        self.create(name='Tap', description='Fits any hose')
+        ranked  = [item['id'] for item in self.client.get('/api/v1/product/', {'search': 'hose'}).json()['results']]
+        self.assertEqual(ranked[0], hose.pk)
+        self.assertNotEqual(ranked, self.expected(ProductModel.objects.filter(pk__in=ranked)))
+        self.assertEqual(self.walk(search='hose'), ranked)
+
+
+
+class ProductListQueryCountTest(TestCase):
+    """
+    The product list must cost the same number of queries whatever the page size.
+    """
+
+    def setUp(self):
+        self.author     = User.objects.create_user(email='author@xapi.local', password='pass', username='author')
+        self.category   = ProductCategoryModel.objects.create(cate_name='Shoes', author=self.author)
+        self.tags       = [ProductMetaTagModel.objects.create(tag=f'tag-{i}', author=self.author) for i in range(3)]
+
+    def create_products(self, count):
+        for i in range(count):
+            product = ProductModel.objects.create(
+                category=self.category, author=self.author, name=f'Product {i}', title=f'Product {i}',
+                weight=1.0, discount_percent=0, price='10.00', stock=5,
+            )
+            product.meta_tag.set(self.tags)
+            ProductImageModel.objects.create(product=product, author=self.author, alt_text='front')
+            ProductImageModel.objects.create(product=product, author=self.author, alt_text='back')
+
+    def list_query_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/product/', {'size': 200})
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.json()['count']
+
+    def test_query_count_is_constant(self):
+        self.create_products(3)
+        small_count, total = self.list_query_count()
+        self.assertEqual(total, 3)
+
+        self.create_products(20)
+        large_count, total = self.list_query_count()
+        self.assertEqual(total, 23)
+
+        self.assertEqual(small_count, large_count)
+
+
+
+@override_settings(RESPONSE_CACHE=True)
+class ProductResponseCacheTest(TestCase):
+    """
+    Anonymous catalog reads are served from the cache until a product changes.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.product = ProductModel.objects.create(name='Lamp', weight=1.0, discount_percent=0, price='10.00', stock=3)
+
+    def get(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/product/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_hit_and_invalidation(self):
+        first, _ = self.get(page=1)
+        cached, query_count = self.get(page=1)
+        self.assertEqual(cached, first)
+        self.assertEqual(query_count, 0)
+
+        # a different query string is a different entry
+        _, query_count = self.get(page=1, search='lamp')
+        self.assertGreater(query_count, 0)
+
+        self.product.reduce_stock(1)
+        fresh, query_count = self.get(page=1)
+        self.assertGreater(query_count, 0)
+        self.assertEqual(fresh['results'][0]['stock'], 2)
+
+        self.product.name = 'Desk lamp'
+        self.product.save()
+        fresh, _ = self.get(page=1)
+        self.assertEqual(fresh['results'][0]['name'], 'Desk lamp')
+
+    def test_hit_answers_conditional_get(self):
+        etag = self.client.get('/api/v1/product/', {'page': 1})['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/product/', {'page': 1}, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+            response = self.client.get('/api/v1/product/', {'page': 1}, HTTP_IF_NONE_MATCH='W/"other"')
+            self.assertEqual((response.status_code, response['ETag']), (200, etag))
+        self.assertEqual(len(queries), 0)
+
+        self.product.reduce_stock(1)
+        response = self.client.get('/api/v1/product/', {'page': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_deleted_tag_expires_products(self):
+        tag = ProductMetaTagModel.objects.create(tag='sale')
+        self.product.meta_tag.add(tag)
+        self.assertEqual(self.get(page=1)[0]['results'][0]['meta_tag'], [tag.pk])
+        tag.delete()
+        self.assertEqual(self.get(page=1)[0]['results'][0]['meta_tag'], [])
+
+    @override_settings(RESPONSE_CACHE=False)
+    def test_off_for_per_process_cache(self):
+        self.get(page=1)
+        _, query_count = self.get(page=1)
+        self.assertGreater(query_count, 1)
+
+
+
+class ProductImagePipelineTest(TestCase):
+    """
+    Saving an image stores the original at once; the thumbnail is built after commit.
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.author     = User.objects.create_user(email='images@xapi.local', password='pass', username='images')
+        self.product    = ProductModel.objects.create(name='Camera', weight=1.0, discount_percent=0, price='10.00', stock=1)
+
+    def upload(self, size=(1600, 1200)):
+        buffer = BytesIO()
+        Image.new('RGB', size, (200, 80, 40)).save(buffer, format='JPEG')
+        return SimpleUploadedFile('camera.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_thumbnail_is_generated_after_commit(self):
+        with override_settings(MEDIA_ROOT=self.media_root, IMAGE_PIPELINE_BACKEND='sync'):
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                image = ProductImageModel.objects.create(product=self.product, author=self.author, product_image=self.upload())
+            self.assertEqual(image.processing_status, ProcessingStatus.PENDING)
+            with Image.open(image.product_image.path) as original:
+                self.assertEqual(original.size, (1600, 1200))
+
+            for callback in callbacks:
+                callback()
+
+            image.refresh_from_db()
+            self.assertEqual(image.processing_status, ProcessingStatus.READY)
+            with Image.open(image.product_image.path) as thumbnail:
+                self.assertEqual(thumbnail.size, (800, 600))
+
+    def test_responsive_derivatives(self):
+        with override_settings(MEDIA_ROOT=self.media_root, IMAGE_PIPELINE_BACKEND='sync'):
+            with self.captureOnCommitCallbacks(execute=True):
+                image = ProductImageModel.objects.create(product=self.product, author=self.author, product_image=self.upload())
+            image.refresh_from_db()
+
+            self.assertEqual(set(image.derivatives), {'webp', 'jpeg'})
+            for fmt, names in image.derivatives.items():
+                self.assertEqual(set(names), {'160', '400', '800'})
+                for width, name in names.items():
+                    self.assertTrue(name.startswith(f'product_images/{self.product.pk}/'))
+                    with Image.open(image.product_image.storage.path(name)) as rendition:
+                        self.assertEqual((rendition.format, rendition.width), (fmt.upper(), int(width)))
+
+            srcset = ProductImageSerializer(image).data['srcset']
+            self.assertEqual(srcset['webp'].count('w,'), 2)
+            self.assertTrue(srcset['jpeg'].endswith('_800w.jpeg 800w'))
+
+            # portrait sources keep every width, with proportional heights
+            with self.captureOnCommitCallbacks(execute=True):
+                portrait = ProductImageModel.objects.create(product=self.product, author=self.author, product_image=self.upload((1200, 1600)))
+            portrait.refresh_from_db()
+            for names in portrait.derivatives.values():
+                self.assertEqual(set(names), {'160', '400', '800'})
+                for width, name in names.items():
+                    with Image.open(portrait.product_image.storage.path(name)) as rendition:
+                        self.assertEqual(rendition.width, int(width))
+                        self.assertAlmostEqual(rendition.height, int(width) * 4 / 3, delta=1)
+
+    def test_small_source_is_not_upscaled(self):
+        with override_settings(MEDIA_ROOT=self.media_root, IMAGE_PIPELINE_BACKEND='sync'):
+            with self.captureOnCommitCallbacks(execute=True):
+                image = ProductImageModel.objects.create(product=self.product, author=self.author, product_image=self.upload((300, 200)))
+            image.refresh_from_db()
+
+            for names in image.derivatives.values():
+                self.assertEqual(set(names), {'160', '300'})
+                for width, name in names.items():
+                    with Image.open(image.product_image.storage.path(name)) as rendition:
+                        self.assertEqual(rendition.width, int(width))
+            self.assertTrue(ProductImageSerializer(image).data['srcset']['jpeg'].endswith('_300w.jpeg 300w'))
+
+    def test_processing_changes_etag(self):
+        with override_settings(MEDIA_ROOT=self.media_root, IMAGE_PIPELINE_BACKEND='sync'):
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                ProductImageModel.objects.create(product=self.product, author=self.author, product_image=self.upload())
+            url  = f'/api/v1/product/{self.product.pk}/'
+            etag = self.client.get(url)['ETag']
+            self.addCleanup(get_buffer().drain)
+
+            for callback in callbacks:
+                callback()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['images'][0]['processing_status'], ProcessingStatus.READY)
+
+    def test_invalid_image_is_marked_failed(self):
+        with override_settings(MEDIA_ROOT=self.media_root, IMAGE_PIPELINE_BACKEND='sync'):
+            broken = SimpleUploadedFile('broken.jpg', b'not an image', content_type='image/jpeg')
+            with self.assertLogs('core.imagepipeline', level='ERROR'), self.captureOnCommitCallbacks(execute=True):
+                image = ProductImageModel.objects.create(product=self.product, author=self.author, product_image=broken)
+            image.refresh_from_db()
+            self.assertEqual(image.processing_status, ProcessingStatus.FAILED)
+
+
+
+class ProductConditionalGetTest(TestCase):
+    """
+    Unchanged product lists and details answer 304 without serializing.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.product = ProductModel.objects.create(name='Kettle', weight=1.0, discount_percent=0, price='10.00', stock=3)
+
+    def test_list_etag(self):
+        response = self.client.get('/api/v1/product/')
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('Last-Modified', response)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/product/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+
+        # other query params are other representations
+        response = self.client.get('/api/v1/product/', {'page': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        ProductModel.objects.create(name='Toaster', weight=1.0, discount_percent=0, price='10.00', stock=3)
+        response = self.client.get('/api/v1/product/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_if_modified_since(self):
+        url         = f'/api/v1/product/{self.product.pk}/'
+        response    = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        ProductImageModel.objects.create(product=self.product, alt_text='side')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_meta_tag_changes_etag(self):
+        url = f'/api/v1/product/{self.product.pk}/'
+        tag = ProductMetaTagModel.objects.create(tag='sale')
+        etag = self.client.get(url)['ETag']
+
+        for change in (lambda: self.product.meta_tag.add(tag), lambda: tag.productmodel_set.clear(),
+                       lambda: self.product.meta_tag.set([tag]), tag.delete):
+            change()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            etag = response['ETag']
+        self.assertEqual(response.json()['meta_tag'], [])
+
+
+
+@override_settings(COUNTER_FLUSH_INTERVAL=0)
+class ProductCounterTest(TestCase):
+    """
+    Views and sales are buffered, flushed in bulk and ranked by the top/trending actions.
+    """
+
+    def setUp(self):
+        cache.clear()
+        get_buffer().drain()    # increments buffered by other tests
+        self.products = [
+            ProductModel.objects.create(name=f'Chair {i}', weight=1.0, discount_percent=0, price='10.00', stock=10)
+            for i in range(3)
+        ]
+
+    def test_views_are_buffered_and_ranked(self):
+        quiet, popular, busy = self.products
+        for product, views in ((popular, 3), (busy, 1)):
+            for _ in range(views):
+                self.assertEqual(self.client.get(f'/api/v1/product/{product.pk}/').status_code, 200)
+
+        # nothing is written per request
+        popular.refresh_from_db()
+        self.assertEqual(popular.views_count, 0)
+
+        versions = model_versions([ProductModel])
+        modified = popular.modified
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(flush_counters(), 2)
+        self.assertLessEqual(len(queries), 5)
+        # counters are not validated: cache entries and ETags survive a flush
+        self.assertEqual(model_versions([ProductModel]), versions)
+
+        popular.refresh_from_db()
+        self.assertEqual(popular.views_count, 3)
+        self.assertEqual(popular.modified, modified)
+
+        top = self.client.get('/api/v1/product/top/', {'by': 'views', 'limit': 2}).json()
+        self.assertEqual([(item['id'], item['score']) for item in top], [(popular.pk, 3), (busy.pk, 1)])
+
+        busy_views = {busy.pk: 5}
+        increment_many(ProductModel, 'views_count', busy_views)
+        flush_counters()
+        trending = self.client.get('/api/v1/product/trending/', {'by': 'views', 'hours': 1}).json()
+        self.assertEqual([item['id'] for item in trending], [busy.pk, popular.pk])
+
+        response = self.client.get('/api/v1/product/top/', {'by': 'likes'})
+        self.assertEqual(response.status_code, 400)
+
+
+
+class ProductSlugTest(TestCase):
+    """
+    Duplicate titles get numbered slugs with one lookup query, however many duplicates exist.
+    """
+
+    def create(self, title):
+        return ProductModel.objects.create(name=title, title=title, weight=1.0, discount_percent=0, price='10.00', stock=1)
+
+    def test_numbered_slugs(self):
+        slugs = [self.create('Office Chair').slug for _ in range(3)]
+        self.assertEqual(slugs, ['office-chair', 'office-chair-1', 'office-chair-2'])
+
+        with CaptureQueriesContext(connection) as queries:
+            product = self.create('Office Chair')
+        self.assertEqual(product.slug, 'office-chair-3')
+        self.assertEqual(len([q for q in queries if 'LIKE' in q['sql'] and '"slug"' in q['sql']]), 1)
+
+    def test_bulk_slugs_are_unique(self):
+        self.create('Desk')
+        self.assertEqual(unique_slugs(ProductModel, ['Desk', 'Desk', 'Lamp']), ['desk-1', 'desk-2', 'lamp'])
+
+    def test_lookup_skips_unrelated_slugs(self):
+        for title in ('Desk', 'Desk 2', 'Desktop', 'Desktop stand'):
+            self.create(title)
+        self.assertEqual(taken_slugs(ProductModel.objects, ['desk']), {'desk', 'desk-2'})
+        self.assertEqual(self.create('Desk').slug, 'desk-1')
+
+
+
+class CatalogImportExportTest(TestCase):
+    """
+    CSV/JSONL imports upsert by sku in chunks and report bad rows; exports stream them back.
+    """
+
+    def setUp(self):
+        self.category = ProductCategoryModel.objects.create(cate_name='Garden')
+        for tag in ('outdoor', 'sale'):
+            ProductMetaTagModel.objects.create(tag=tag)
+        self.existing = ProductModel.objects.create(
+            sku='A1', name='Hose', title='Garden Hose', weight=2.0, discount_percent=0, price='15.00', stock=4,
+        )
+
+    def test_csv_upsert_and_errors(self):
+        rows = (
+            'sku,name,title,weight,discount_percent,price,stock,category,meta_tags\n'
+            'A1,,,,,12.50,,garden,outdoor|sale\n'
+            'B2,Rake,Garden Hose,1.5,10,20.00,7,Garden,sale\n'
+            'C3,Spade,Spade,heavy,0,5.00,1,,\n'
+            'D4,Pot,Pot,1,0,5.00,1,kitchen,\n'
+            'E5,Seeds,Seeds,,0,1.00,100,,\n'
+        )
+        report = CatalogImporter(chunk_size=2).run(BytesIO(rows.encode()), 'csv')
+
+        self.assertEqual((report.created, report.updated), (1, 1))
+        self.assertEqual([error['line'] for error in report.errors], [4, 5, 6])
+
+        self.existing.refresh_from_db()
+        self.assertEqual((str(self.existing.price), self.existing.name, self.existing.stock), ('12.50', 'Hose', 4))
+        self.assertEqual(self.existing.category, self.category)
+        self.assertEqual(set(self.existing.meta_tag.values_list('tag', flat=True)), {'outdoor', 'sale'})
+
+        rake = ProductModel.objects.get(sku='B2')
+        self.assertEqual(rake.slug, 'garden-hose-1')
+        self.assertEqual(list(rake.meta_tag.values_list('tag', flat=True)), ['sale'])
+        self.assertEqual(self.client.get('/api/v1/product/', {'search': 'rake'}).json()['count'], 1)
+
+    def test_jsonl_roundtrip(self):
+        exported = ''.join(export_lines(ProductModel.objects.all(), 'jsonl'))
+        ProductModel.objects.filter(sku='A1').update(price='1.00')
+
+        report = CatalogImporter().run(BytesIO(exported.encode()), 'jsonl')
+        self.assertEqual((report.created, report.updated, report.errors), (0, 1, []))
+        self.existing.refresh_from_db()
+        self.assertEqual(str(self.existing.price), '15.00')
+
+        lines = list(export_lines(ProductModel.objects.all(), 'csv'))
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith('A1,'))
+
+    def test_sku_match_with_other_uid(self):
+        rows = 'sku,uid,name,meta_tags\nA1,not-the-stored-uid,Sprinkler,outdoor\n'
+        report = CatalogImporter().run(BytesIO(rows.encode()), 'csv')
+
+        self.assertEqual((report.created, report.updated, report.errors), (0, 1, []))
+        self.existing.refresh_from_db()
+        self.assertNotEqual(self.existing.uid, 'not-the-stored-uid')
+        self.assertEqual(list(self.existing.meta_tag.values_list('tag', flat=True)), ['outdoor'])
+        self.assertEqual(self.client.get('/api/v1/product/', {'search': 'sprinkler'}).json()['count'], 1)
+
+    def test_import_and_export_endpoints(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/v1/product/export/').status_code, 401)
+        client.force_authenticate(User.objects.create_user(username='shopper', email='shopper@example.com', password='pass1234'))
+        self.assertEqual(client.get('/api/v1/product/export/').status_code, 403)
+
+        client.force_authenticate(User.objects.create_user(username='admin', email='admin@example.com', password='pass1234', is_staff=True))
+        upload = SimpleUploadedFile('products.csv', b'sku,name,title,weight,discount_percent,price\nB2,Rake,Rake,1.5,0,20.00\n')
+        response = client.post('/api/v1/product/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['failed']), (1, 0, 0))
+
+        upload = SimpleUploadedFile('products.txt', b'sku\nC3\n')
+        self.assertEqual(client.post('/api/v1/product/import/', {'file': upload}, format='multipart').status_code, 400)
+
+        response = client.get('/api/v1/product/export/', {'file_format': 'jsonl'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        skus = [json.loads(line)['sku'] for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(skus, ['A1', 'B2'])
+
+
+
+class ProductFacetTest(TestCase):
+    """
+    Catalog filters narrow the list; facet counts come from a fixed number of queries.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.chairs = ProductCategoryModel.objects.create(cate_name='Chairs')
+        self.tables = ProductCategoryModel.objects.create(cate_name='Tables')
+        self.sale   = ProductMetaTagModel.objects.create(tag='sale')
+        specs = [
+            (self.chairs, '20.00', True, 4.5, True),
+            (self.chairs, '80.00', True, 3.0, False),
+            (self.chairs, '300.00', False, 2.0, True),
+            (self.tables, '120.00', True, 4.0, False),
+        ]
+        for i, (category, price, available, rating, on_sale) in enumerate(specs):
+            product = ProductModel.objects.create(
+                name=f'Item {i}', title=f'Item {i}', category=category, price=price, is_available=available,
+                rating=rating, weight=1.0, discount_percent=0, stock=1,
+            )
+            if on_sale:
+                product.meta_tag.add(self.sale)
+
+    def get(self, **params):
+        response = self.client.get('/api/v1/product/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_filters(self):
+        self.assertEqual(self.get(category=self.chairs.pk)['count'], 3)
+        self.assertEqual(self.get(category=self.chairs.pk, is_available='true')['count'], 2)
+        self.assertEqual(self.get(price_min='50', price_max='150')['count'], 2)
+        self.assertEqual(self.get(rating_min='4')['count'], 2)
+        self.assertEqual(self.get(meta_tag=self.sale.pk, is_available='true')['count'], 1)
+        self.assertEqual(self.client.get('/api/v1/product/', {'rating_min': 'high'}).status_code, 400)
+
+    def test_facets(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get(facets='true', is_available='true')
+        facet_queries = [q for q in queries if 'GROUP BY' in q['sql']]
+        self.assertEqual(len(facet_queries), 2)
+
+        facets = data['facets']
+        self.assertEqual(facets['count'], 3)
+        self.assertEqual(facets['category'], {str(self.chairs.pk): 2, str(self.tables.pk): 1})
+        self.assertEqual(facets['price']['0-25'], 1)
+        self.assertEqual(facets['price']['100-250'], 1)
+        self.assertEqual(facets['rating_min']['4'], 2)
+        self.assertEqual(facets['meta_tag'], {str(self.sale.pk): 1})
+        self.assertNotIn('facets', self.get())
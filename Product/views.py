@@ -5,6 +5,9 @@ from rest_framework import status
 from rest_framework import permissions 
 from rest_framework import filters
 from rest_framework import throttling  
+from rest_framework import parsers
+from rest_framework.decorators import action
+from django.http import StreamingHttpResponse
 
 
 
@@ -21,7 +24,19 @@ from .serializers import ProductSerializer
 from .serializers import WishListProductSerializer 
 from .serializers import ProductImageSerializer 
 
+from .search import ProductSearchFilter 
+from .facets import ProductFacetFilter
+from .facets import compute_facets
+from .catalog import CatalogImporter
+from .catalog import detect_format
+from .catalog import export_lines
+
+from core.cache import CachedResponseMixin
+from core.conditional import ConditionalGetMixin
+from core.counters import ViewCountMixin
+from core.counters import CounterRankingMixin
 from core.pagepagination import DynamicPagination
+from core.queryoptimizer import QueryOptimizerMixin 
 from core.core_permissions import IsOwnerOrReadOnly 
 from core.core_permissions import IsOwnerStaffOrSuperUser 
 
@@ -30,7 +45,7 @@ from core.core_permissions import IsOwnerStaffOrSuperUser
 logger = logging.getLogger(__name__) 
 
 
-class ProductCategoryViewSet(viewsets.ModelViewSet):
+class ProductCategoryViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet for product categories.
     """
@@ -87,16 +102,19 @@ class ProductMetaTagViewSet(viewsets.ModelViewSet):
 
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ViewCountMixin, CounterRankingMixin, CachedResponseMixin, ConditionalGetMixin, QueryOptimizerMixin, viewsets.ModelViewSet):
     """
     ViewSet for products.
     """
     queryset            = ProductModel.objects.all()
+    cache_models        = (ProductModel, ProductImageModel)
+    conditional_related = ('images',)
+    ranking_fields      = {'views': 'views_count', 'sold': 'sold_count'}
     serializer_class    = ProductSerializer
     permission_classes  = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
     http_method_names   = ['get', 'post', 'delete']  
-    filter_backends     = [filters.SearchFilter]
-    search_fields       = ['name', 'title', 'slug', 'description', 'sku', 'uid']
+    filter_backends     = [ProductSearchFilter, ProductFacetFilter]
+    search_fields       = ['name', 'title', 'slug', 'description', 'sku', 'uid']  # LIKE fallback when no full-text index
     pagination_class    = DynamicPagination 
     throttle_classes    = [throttling.UserRateThrottle]
 
@@ -113,6 +131,46 @@ class ProductViewSet(viewsets.ModelViewSet):
         
         return super().get_queryset()
 
+    def get_paginated_response(self, data):
+        """Add facet counts for the filtered products when `?facets=true`."""
+        response = super().get_paginated_response(data)
+        if ProductFacetFilter().parse_bool(self.request, 'facets'):
+            response.data['facets'] = compute_facets(self.faceted_queryset)
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[permissions.IsAdminUser],
+            parser_classes=[parsers.MultiPartParser, parsers.FileUploadParser])
+    def import_catalog(self, request, *args, **kwargs):
+        """
+        Upsert products from an uploaded CSV or JSONL file (`file`), matched by sku or uid.
+        The format comes from `?file_format=csv|jsonl` or the file extension.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"detail": "Upload the catalog as 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            file_format = detect_format(upload.name, request.query_params.get('file_format'))
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = CatalogImporter(author=request.user).run(upload, file_format)
+        logger.info("Catalog import by %s: %s created, %s updated, %s failed",
+                    request.user, report.created, report.updated, len(report.errors))
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='export', permission_classes=[permissions.IsAdminUser])
+    def export_catalog(self, request, *args, **kwargs):
+        """ Stream the whole catalog as CSV or JSONL (`?file_format=`, default csv). """
+        try:
+            file_format = detect_format('', request.query_params.get('file_format') or 'csv')
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(export_lines(ProductModel.objects.all(), file_format), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="products.{file_format}"'
+        return response
+
 
 
 
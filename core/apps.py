@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class XapicoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+    label = "xApiCore"  # This label is used to avoid conflicts with other apps 
@@ -0,0 +1,140 @@
+import time
+import hashlib
+from urllib.parse import urlencode
+from django.conf import settings
+from django.db import transaction
+from django.db import DEFAULT_DB_ALIAS
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+
+
+VERSION_PREFIX  = 'xapi:version'
+RESPONSE_PREFIX = 'xapi:response'
+# response headers stored with a cached body, so cache hits can answer conditional GETs
+VALIDATOR_HEADERS = ('ETag', 'Last-Modified')
+
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def version_key(model) -> str:
+    return f'{VERSION_PREFIX}:{model._meta.label_lower}'
+
+
+
+def model_versions(models) -> list:
+    """
+    Current version counter of every model, fetched in one cache round trip.
+    A counter evicted by the LRU restarts from the clock, so it never goes back
+    to a value that cached responses were stored under.
+    """
+    cache   = get_cache()
+    keys    = [version_key(model) for model in models]
+    found   = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        for key, value in missing.items():
+            cache.add(key, value, timeout=None)
+        found.update(cache.get_many(list(missing)))
+    return [found.get(key, missing.get(key)) for key in keys]
+
+
+def bump_version(*models, using: str = DEFAULT_DB_ALIAS) -> None:
+    """
+    Invalidate every cached response that depends on `models`.
+    Called from post_save/post_delete signals, and explicitly after bulk
+    `update()`/`bulk_create()` calls, which send no signals.
+
+    Inside a transaction the counters are bumped again on commit, so a response
+    cached from the old rows while the transaction was open is not served either.
+    """
+    def bump():
+        cache = get_cache()
+        for model in models:
+            key = version_key(model)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, time.time_ns(), timeout=None)
+
+    bump()
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(bump, using=using)
+
+
+def response_cache_key(request, models) -> str:
+    """
+    Key for a GET response: host, path, every query parameter in a stable order
+    (`q`, `search`, `page`, `pagination_type`, `size`, ...) and the negotiated
+    renderer, plus the model versions.
+    """
+    params  = sorted((name, value) for name, values in request.query_params.lists() for value in values)
+    raw     = f'{request.get_host()}{request.path}?{urlencode(params)}|{request.accepted_renderer.format}'
+    digest  = hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+    versions = '.'.join(str(version) for version in model_versions(models))
+    return f'{RESPONSE_PREFIX}:{digest}:{versions}'
+
+
+
+class CachedResponseMixin:
+    """
+    Read-through cache for anonymous list/retrieve responses of a viewset.
+
+    `cache_models` lists every model whose rows appear in the response (the viewset's
+    model plus nested serializers); saving or deleting any of them bumps its version
+    counter, which changes the key of every dependent response. Stale entries are never
+    read again and age out of the cache's LRU.
+
+    The ETag and Last-Modified of a response are stored with it, so put this mixin
+    before ConditionalGetMixin: a hit then answers 200 or 304 without any query, and
+    only misses compute the validators.
+    """
+    cache_models    = ()
+    cache_timeout   = None
+
+    def get_cache_models(self):
+        return self.cache_models or (self.queryset.model,)
+
+    def get_cache_timeout(self):
+        if self.cache_timeout is not None:
+            return self.cache_timeout
+        return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        # off with a per-process cache, whose invalidations other workers would not see
+        if request.user.is_authenticated or not getattr(settings, 'RESPONSE_CACHE', True):
+            return handler(request, *args, **kwargs)
+
+        cache   = get_cache()
+        key     = response_cache_key(request, self.get_cache_models())
+        entry   = cache.get(key)
+        if entry is not None:
+            return self.cached_hit(request, *entry)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            headers = {name: response[name] for name in VALIDATOR_HEADERS if response.has_header(name)}
+            cache.set(key, (response.data, headers), timeout=self.get_cache_timeout())
+        return response
+
+    def cached_hit(self, request, data, headers: dict):
+        """ The cached body, or a 304 when the request's validators still match it. """
+        response = None
+        if headers:
+            response = get_conditional_response(
+                request, etag=headers.get('ETag'), last_modified=parse_http_date_safe(headers.get('Last-Modified', '')),
+            )
+        response = response or Response(data)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
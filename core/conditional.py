@@ -0,0 +1,65 @@
+import hashlib
+from urllib.parse import urlencode
+from django.db.models import Max
+from django.db.models import Count
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.utils.http import quote_etag
+
+
+
+class ConditionalGetMixin:
+    """
+    Weak ETag / Last-Modified support for list and retrieve.
+
+    The validators come from one aggregate over the filtered queryset:
+    `Max('modified')` and the row count, plus the same for each relation in
+    `conditional_related` (e.g. nested images). A request whose `If-None-Match` or
+    `If-Modified-Since` still matches gets a 304 before anything is serialized.
+
+    Deleting a row changes the count and therefore the ETag; `If-Modified-Since` alone
+    cannot see deletions, which is why `If-None-Match` takes precedence when both are sent.
+
+    Many-to-many changes do not show in these aggregates; the model's `m2m_changed`
+    receiver touches `modified` instead (core.timestamp.touch_m2m_owners).
+    """
+    conditional_related = ()
+
+    def get_conditional_state(self, queryset) -> tuple:
+        aggregates = {'last': Max('modified'), 'count': Count('pk', distinct=True)}
+        for index, relation in enumerate(self.conditional_related):
+            aggregates[f'last_{index}'] = Max(f'{relation}__modified')
+            aggregates[f'count_{index}'] = Count(relation, distinct=True)
+        state = queryset.order_by().aggregate(**aggregates)
+        last_modified = max((value for key, value in state.items() if key.startswith('last') and value), default=None)
+        return state, last_modified
+
+    def make_etag(self, request, state) -> str:
+        params  = sorted((name, value) for name, values in request.query_params.lists() for value in values)
+        values  = [request.path, urlencode(params), request.accepted_renderer.format]
+        values += [f'{key}={value.isoformat() if hasattr(value, "isoformat") else value}' for key, value in sorted(state.items())]
+        return 'W/' + quote_etag(hashlib.md5('|'.join(values).encode(), usedforsecurity=False).hexdigest())
+
+    def conditional_response(self, handler, queryset, request, *args, **kwargs):
+        state, last_modified = self.get_conditional_state(queryset)
+        if not state['count']:
+            return handler(request, *args, **kwargs)
+
+        etag            = self.make_etag(request, state)
+        last_modified   = int(last_modified.timestamp()) if last_modified else None
+        not_modified    = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        response        = not_modified or handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_response(super().list, queryset, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+        return self.conditional_response(super().retrieve, queryset, request, *args, **kwargs)
@@ -0,0 +1,278 @@
+import os
+import time
+import atexit
+import logging
+import threading
+from datetime import timedelta
+from collections import Counter
+from collections import defaultdict
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models import Sum
+from django.db.models import Case
+from django.db.models import When
+from django.db.models import Value
+from django.db.models import BigIntegerField
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+
+logger = logging.getLogger(__name__)
+
+FLUSH_CHUNK_SIZE = 500
+
+
+
+class MemoryCounterBuffer:
+    """ Increments buffered in this worker process until the next flush. """
+
+    def __init__(self):
+        self._lock      = threading.Lock()
+        self._pid       = os.getpid()
+        self._pending   = defaultdict(Counter)      # (model label, field) -> {pk: amount}
+
+    def add(self, label: str, field: str, amounts: dict) -> None:
+        with self._lock:
+            if self._pid != os.getpid():
+                # forked worker: the parent's increments are the parent's to flush
+                self._pid, self._pending = os.getpid(), defaultdict(Counter)
+            self._pending[(label, field)].update(amounts)
+
+    def drain(self) -> dict:
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(Counter)
+        return pending
+
+
+class RedisCounterBuffer:
+    """
+    Increments buffered in Redis hashes shared by all workers, one hash per counter.
+    A flush renames each hash before reading it, so increments arriving meanwhile
+    land in a fresh hash and are never lost or counted twice.
+    """
+    index_key = 'xapi:counters'
+
+    def __init__(self):
+        import redis
+
+        self.client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.COUNTER_REDIS_DB)
+
+    def add(self, label: str, field: str, amounts: dict) -> None:
+        key = f'{self.index_key}:{label}:{field}'
+        pipe = self.client.pipeline(transaction=False)
+        for pk, amount in amounts.items():
+            pipe.hincrby(key, pk, amount)
+        pipe.sadd(self.index_key, key)
+        pipe.execute()
+
+    def drain(self) -> dict:
+        import redis
+
+        pending = defaultdict(Counter)
+        for key in self.client.smembers(self.index_key):
+            key = key.decode()
+            flushing = f'{key}:flushing:{os.getpid()}:{time.monotonic_ns()}'
+            try:
+                self.client.rename(key, flushing)
+            except redis.ResponseError:
+                continue    # nothing buffered since the last flush
+            _, label, field = key.rsplit(':', 2)
+            pipe = self.client.pipeline()
+            pipe.hgetall(flushing)
+            pipe.delete(flushing)
+            values, _ = pipe.execute()
+            pending[(label, field)].update({int(pk): int(amount) for pk, amount in values.items()})
+        return pending
+
+
+
+_buffer         = None
+_buffer_lock    = threading.Lock()
+_flush_lock     = threading.Lock()
+_last_flush     = time.monotonic()
+
+
+def get_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            backend = getattr(settings, 'COUNTER_BACKEND', 'memory')
+            _buffer = RedisCounterBuffer() if backend == 'redis' else MemoryCounterBuffer()
+            if backend != 'redis':
+                atexit.register(flush_counters)
+        return _buffer
+
+
+def increment_many(model, field: str, amounts: dict) -> None:
+    """
+    Buffer `field += amount` for every `{pk: amount}`; nothing is written until
+    the next flush. Flushes inline once COUNTER_FLUSH_INTERVAL has passed.
+    """
+    amounts = {int(pk): int(amount) for pk, amount in amounts.items() if amount}
+    if not amounts:
+        return
+    get_buffer().add(model._meta.label, field, amounts)
+
+    interval = getattr(settings, 'COUNTER_FLUSH_INTERVAL', 30)
+    if interval and time.monotonic() - _last_flush >= interval:
+        flush_counters(blocking=False)
+
+
+def increment(model, pk, field: str, amount: int = 1) -> None:
+    increment_many(model, field, {pk: amount})
+
+
+def hour_bucket(moment=None):
+    return (moment or timezone.now()).replace(minute=0, second=0, microsecond=0)
+
+
+def amount_case(amounts: dict, field_name: str = 'pk') -> Case:
+    return Case(
+        *[When(**{field_name: pk}, then=Value(amount)) for pk, amount in amounts.items()],
+        default=Value(0),
+        output_field=BigIntegerField(),
+    )
+
+
+def write_counters(label: str, field: str, amounts: dict) -> None:
+    """
+    Add `amounts` to the counter column with one `F()` UPDATE per chunk of rows,
+    and to this hour's CounterBucketModel rows (created empty first, so concurrent
+    flushes from other workers only ever add).
+
+    Counters are left out of the validated representation: a flush neither touches
+    `modified` nor invalidates cached responses, so popular rows keep their ETags and
+    cache entries. Counts in a response lag by up to COUNTER_FLUSH_INTERVAL plus
+    RESPONSE_CACHE_TIMEOUT, and a client revalidating with `If-None-Match` keeps the
+    counts it has until the row changes otherwise.
+    """
+    from .models import CounterBucketModel
+
+    model   = apps.get_model(label)
+    bucket  = hour_bucket()
+    pks     = list(amounts)
+    with transaction.atomic():
+        for start in range(0, len(pks), FLUSH_CHUNK_SIZE):
+            chunk = {pk: amounts[pk] for pk in pks[start:start + FLUSH_CHUNK_SIZE]}
+            model._default_manager.filter(pk__in=chunk).update(**{field: F(field) + amount_case(chunk)})
+
+            buckets = CounterBucketModel.objects.filter(model_label=label, field=field, bucket=bucket)
+            CounterBucketModel.objects.bulk_create(
+                [CounterBucketModel(model_label=label, field=field, bucket=bucket, object_id=pk) for pk in chunk],
+                ignore_conflicts=True,
+            )
+            buckets.filter(object_id__in=chunk).update(count=F('count') + amount_case(chunk, 'object_id'))
+
+
+def flush_counters(blocking: bool = True) -> int:
+    """
+    Write every buffered increment to the database. Returns the number of
+    (object, counter) pairs written. Increments that fail to write go back to the buffer.
+    """
+    global _last_flush
+    if not _flush_lock.acquire(blocking=blocking):
+        return 0    # another thread is flushing
+    try:
+        _last_flush = time.monotonic()
+        buffer      = get_buffer()
+        written     = 0
+        for (label, field), amounts in buffer.drain().items():
+            try:
+                write_counters(label, field, amounts)
+                written += len(amounts)
+            except Exception as e:
+                logger.error("Counter flush failed for %s.%s: %s", label, field, e, exc_info=True)
+                buffer.add(label, field, amounts)
+        return written
+    finally:
+        _flush_lock.release()
+
+
+def prune_buckets(older_than: timedelta) -> int:
+    """ Delete CounterBucketModel rows outside every trending window. """
+    from .models import CounterBucketModel
+
+    deleted, _ = CounterBucketModel.objects.filter(bucket__lt=hour_bucket() - older_than).delete()
+    return deleted
+
+
+
+class ViewCountMixin:
+    """
+    Count successful retrieves in `view_count_field` through the counter buffer,
+    including responses served from the cache.
+    """
+    view_count_field = 'views_count'
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        if response.status_code == 200:
+            increment(self.queryset.model, kwargs[self.lookup_url_kwarg or self.lookup_field], self.view_count_field)
+        return response
+
+
+
+class CounterRankingMixin:
+    """
+    `top` and `trending` list actions for a viewset whose model has buffered counters.
+
+    `ranking_fields` maps the `?by=` value to a counter column, first entry is the default:
+        /top/?by=views&limit=10             highest all-time counter
+        /trending/?by=sold&hours=24         largest increase over the last `hours`
+    """
+    ranking_fields  = {'views': 'views_count'}
+    max_ranking     = 100
+
+    def ranking_params(self, request):
+        by = request.query_params.get('by') or next(iter(self.ranking_fields))
+        if by not in self.ranking_fields:
+            return None, None, Response(
+                {"detail": f"'by' must be one of: {', '.join(self.ranking_fields)}."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), self.max_ranking)
+        except ValueError:
+            return None, None, Response({"detail": "'limit' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        return self.ranking_fields[by], limit, None
+
+    def ranked_response(self, ranked: list):
+        """ Serialize `[(pk, score), ...]` in rank order, each item with its `score`. """
+        objects = self.filter_queryset(self.get_queryset()).in_bulk([pk for pk, _ in ranked])
+        results = []
+        for pk, score in ranked:
+            if pk in objects:
+                data = self.get_serializer(objects[pk]).data
+                data['score'] = score
+                results.append(data)
+        return Response(results)
+
+    @action(detail=False, methods=['get'])
+    def top(self, request, *args, **kwargs):
+        field, limit, error = self.ranking_params(request)
+        if error:
+            return error
+        ranked = self.filter_queryset(self.get_queryset()).order_by(f'-{field}', '-pk').values_list('pk', field)[:limit]
+        return self.ranked_response(list(ranked))
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request, *args, **kwargs):
+        from .models import CounterBucketModel
+
+        field, limit, error = self.ranking_params(request)
+        if error:
+            return error
+        try:
+            hours = min(max(int(request.query_params.get('hours', 24)), 1), 24 * 30)
+        except ValueError:
+            return Response({"detail": "'hours' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        ranked = CounterBucketModel.objects.filter(
+            model_label=self.get_queryset().model._meta.label, field=field, bucket__gte=hour_bucket() - timedelta(hours=hours - 1),
+        ).values('object_id').annotate(score=Sum('count')).filter(score__gt=0).order_by('-score', '-object_id')
+        visible = self.filter_queryset(self.get_queryset()).values('pk')
+        ranked = ranked.filter(object_id__in=visible).values_list('object_id', 'score')[:limit]
+        return self.ranked_response(list(ranked))
@@ -0,0 +1,185 @@
+import os
+import time
+import random
+import logging
+import threading
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS  = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+# requests carrying one of these are safe to repeat; the gateway dedupes them
+IDEMPOTENCY_HEADERS = ('Idempotency-Key', 'PayPal-Request-Id')
+RETRY_STATUSES      = (429, 500, 502, 503, 504)
+
+DEFAULTS = {
+    'connect_timeout':      3.05,
+    'read_timeout':         10,
+    'deadline':             15,     # seconds for the whole call, retries included
+    'pool_size':            10,
+    'retries':              2,
+    'retry_backoff':        0.25,
+    'breaker_threshold':    5,
+    'breaker_reset':        30,
+}
+
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """ The gateway failed too often recently; the call was not attempted. """
+
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast after `threshold` consecutive failures. After `reset_timeout`
+    seconds one probe call is let through (half-open): success closes the circuit,
+    failure opens it again.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30):
+        self.threshold      = threshold
+        self.reset_timeout  = reset_timeout
+        self.failures       = 0
+        self.opened_at      = None
+        self._probing       = False
+        self._lock          = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        return self.HALF_OPEN if time.monotonic() - self.opened_at >= self.reset_timeout else self.OPEN
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures, self.opened_at, self._probing = 0, None, False
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.threshold:
+                self.opened_at, self._probing = time.monotonic(), False
+
+
+
+class GatewayClient:
+    """
+    HTTP client for one payment gateway:
+
+    - keep-alive connection pools (one requests.Session per thread and process)
+    - a connect timeout, a read timeout and a deadline for the whole call
+    - retries with jittered exponential backoff, for idempotent calls only (safe methods,
+      or requests carrying an idempotency key), on connection errors and 429/5xx
+    - a circuit breaker shared by all threads, raising CircuitOpenError while open
+    - `gateway.<name>.*` counters and latency histogram in core.metrics
+    """
+
+    def __init__(self, name: str, **options):
+        self.name       = name
+        self.options    = {**DEFAULTS, **options}
+        self.breaker    = CircuitBreaker(self.options['breaker_threshold'], self.options['breaker_reset'])
+        self._local     = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        # forked workers must not share the parent's sockets
+        if getattr(self._local, 'pid', None) != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.options['pool_size'], pool_maxsize=self.options['pool_size'], max_retries=0)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._local.session, self._local.pid = session, os.getpid()
+        return self._local.session
+
+    def is_idempotent(self, method: str, headers) -> bool:
+        return method.upper() in IDEMPOTENT_METHODS or any(header in (headers or {}) for header in IDEMPOTENCY_HEADERS)
+
+    def request(self, method: str, url: str, deadline: float = None, idempotent: bool = None, **kwargs) -> requests.Response:
+        """
+        Send one call; returns the last response (also an error one once retries are used
+        up) and raises requests exceptions for connection errors and timeouts.
+        """
+        deadline    = time.monotonic() + (deadline or self.options['deadline'])
+        idempotent  = self.is_idempotent(method, kwargs.get('headers')) if idempotent is None else idempotent
+        attempts    = 1 + (self.options['retries'] if idempotent else 0)
+        for attempt in range(1, attempts + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise requests.exceptions.Timeout(f"{self.name} call exceeded its deadline.")
+            if not self.breaker.allow():
+                metrics.incr(f'gateway.{self.name}.rejected')
+                raise CircuitOpenError(f"{self.name} circuit is open.")
+
+            timeout = (min(self.options['connect_timeout'], remaining), min(self.options['read_timeout'], remaining))
+            metrics.incr(f'gateway.{self.name}.requests')
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except requests.exceptions.RequestException as e:
+                metrics.observe(f'gateway.{self.name}.seconds', time.perf_counter() - started)
+                metrics.incr(f'gateway.{self.name}.errors')
+                self.breaker.failure()
+                if attempt == attempts or not isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+                    raise
+                logger.warning("%s %s %s failed (%s), retrying.", self.name, method, url, e)
+            else:
+                metrics.observe(f'gateway.{self.name}.seconds', time.perf_counter() - started)
+                if response.status_code < 500:
+                    self.breaker.success()
+                else:
+                    metrics.incr(f'gateway.{self.name}.errors')
+                    self.breaker.failure()
+                if response.status_code not in RETRY_STATUSES or attempt == attempts:
+                    return response
+                logger.warning("%s %s %s answered %s, retrying.", self.name, method, url, response.status_code)
+
+            metrics.incr(f'gateway.{self.name}.retries')
+            pause = self.options['retry_backoff'] * 2 ** (attempt - 1)
+            time.sleep(min(random.uniform(0, pause), max(deadline - time.monotonic(), 0)))
+
+    def close(self) -> None:
+        session = getattr(self._local, 'session', None)
+        if session is not None:
+            session.close()
+            self._local.session = self._local.pid = None
+
+
+
+_clients        = {}
+_clients_lock   = threading.Lock()
+
+
+def get_client(name: str) -> GatewayClient:
+    """ The process-wide client of a gateway, configured by GATEWAY_DEFAULTS and GATEWAYS[name]. """
+    with _clients_lock:
+        if name not in _clients:
+            options = {**getattr(settings, 'GATEWAY_DEFAULTS', {}), **getattr(settings, 'GATEWAYS', {}).get(name, {})}
+            _clients[name] = GatewayClient(name, **options)
+        return _clients[name]
+
+
+def gateway_stats() -> dict:
+    """ Circuit state of every gateway used by this process. """
+    with _clients_lock:
+        clients = dict(_clients)
+    return {
+        name: {'state': client.breaker.state, 'consecutive_failures': client.breaker.failures}
+        for name, client in sorted(clients.items())
+    }
@@ -0,0 +1,106 @@
+from io import BytesIO
+from collections import namedtuple
+from PIL import Image
+
+
+
+EncodedImage = namedtuple('EncodedImage', ['buffer', 'quality', 'attempts'])
+
+# formats whose size is controlled by the `quality` option
+QUALITY_FORMATS = {'JPEG', 'WEBP'}
+
+
+class ImageBudgetError(ValueError):
+    """ Raised when an image cannot be encoded within its size budget. """
+
+
+
+def load_thumbnail(source, size: tuple, resample=Image.Resampling.LANCZOS) -> Image.Image:
+    """
+    Open `source` and shrink it to fit `size`, returned as an RGB image. A `size` of
+    `(width, None)` bounds the width only and keeps the aspect ratio.
+
+    JPEG sources are decoded with `draft()`, which lets libjpeg scale by 1/2, 1/4 or 1/8
+    while decoding, so a large camera image never has to be decoded at full resolution.
+    The draft keeps the image at least as large as `size`; the final resize is exact.
+    """
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    image = Image.open(source)
+    source_format = image.format
+    if size[1] is None:
+        size = (size[0], max(1, round(image.height * size[0] / image.width)))
+    if source_format == 'JPEG':
+        image.draft('RGB', size)
+    if image.mode != 'RGB':
+        converted = image.convert('RGB')
+        image.close()
+        image = converted
+    image.thumbnail(size, resample)
+    image.format = source_format
+    return image
+
+
+def encode_within(image: Image.Image, max_bytes: int, format: str = 'JPEG', quality: int = 95, min_quality: int = 30,
+                  step: int = 5, buffer: BytesIO = None, strict: bool = True, **options) -> EncodedImage:
+    """
+    Encode `image` at the highest quality of `quality`, `quality - step`, ... `min_quality`
+    that fits in `max_bytes`.
+
+    File size grows with quality, so the candidates are searched with a galloping
+    bisection instead of one by one: O(log n) encodes instead of one per step, all
+    written to the same buffer. Formats outside QUALITY_FORMATS are encoded once, whatever their size.
+
+    If even `min_quality` is too large, raises ImageBudgetError, or returns the
+    `min_quality` encoding when `strict` is False.
+    """
+    buffer      = buffer if buffer is not None else BytesIO()
+    attempts    = 0
+    lossy       = format in QUALITY_FORMATS
+
+    def encode(q):
+        nonlocal attempts
+        attempts += 1
+        buffer.seek(0)
+        buffer.truncate()
+        if lossy:
+            image.save(buffer, format=format, quality=q, **options)
+        else:
+            image.save(buffer, format=format, **options)
+        return buffer.tell()
+
+    if encode(quality) <= max_bytes or not lossy:
+        buffer.seek(0)
+        return EncodedImage(buffer, quality, attempts)
+
+    # candidates below `quality`, best first. Most images fit a few steps down, so
+    # gallop (1, 2, 4, .. steps) to bracket the answer, then bisect inside the bracket.
+    candidates  = list(range(quality - step, min_quality - 1, -step))
+    low, gap    = 0, 1
+    best = last = None
+    while low < len(candidates):
+        probe   = min(low + gap - 1, len(candidates) - 1)
+        last    = candidates[probe]
+        if encode(last) <= max_bytes:
+            best = last
+            break
+        low, gap = probe + 1, gap * 2
+
+    high = probe - 1 if best is not None else -1
+    while low <= high:
+        middle  = (low + high) // 2
+        last    = candidates[middle]
+        if encode(last) <= max_bytes:
+            best, high = last, middle - 1
+        else:
+            low = middle + 1
+
+    if best is None:
+        if strict:
+            raise ImageBudgetError(f"Could not reduce image size below {max_bytes // 1024} KB.")
+        best = candidates[-1] if candidates else quality
+
+    if best != last:
+        encode(best)
+    buffer.seek(0)
+    return EncodedImage(buffer, best, attempts)
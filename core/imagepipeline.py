@@ -0,0 +1,147 @@
+import os
+import logging
+import threading
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
+from django.apps import apps
+from django.conf import settings
+from django.db import models
+from django.db import connections
+from django.db import transaction
+from django.core.files import File
+from django.core.files.base import ContentFile
+
+from .cache import bump_version
+from .timestamp import touched
+
+
+logger = logging.getLogger(__name__)
+
+
+
+class ProcessingStatus(models.TextChoices):
+    PENDING     = 'pending', 'Pending'
+    PROCESSING  = 'processing', 'Processing'
+    READY       = 'ready', 'Ready'
+    FAILED      = 'failed', 'Failed'
+
+
+
+class SyncExecutor:
+    """
+    In-process stand-in for a worker pool: runs every job immediately.
+    Used by tests and by `IMAGE_PIPELINE_BACKEND = 'sync'`.
+    """
+    def submit(self, fn, *args, **kwargs):
+        fn(*args, **kwargs)
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def _init_process_worker():
+    import django
+    django.setup()
+
+
+_executor       = None
+_executor_key   = None
+_executor_lock  = threading.Lock()
+
+
+def get_executor():
+    """
+    Return the process-wide worker pool for derivative generation, chosen by
+    `settings.IMAGE_PIPELINE_BACKEND`: 'thread' (default), 'process' or 'sync'.
+    """
+    global _executor, _executor_key
+    backend = getattr(settings, 'IMAGE_PIPELINE_BACKEND', 'thread')
+    workers = getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2)
+    key     = (os.getpid(), backend, workers)
+    with _executor_lock:
+        if _executor is None or _executor_key != key:
+            if backend == 'sync':
+                _executor = SyncExecutor()
+            elif backend == 'process':
+                _executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_process_worker,
+                )
+            else:
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-pipeline')
+            _executor_key = key
+        return _executor
+
+
+
+def is_new_upload(field_file) -> bool:
+    """ True when the field holds a file that has not been written to storage yet. """
+    return bool(field_file) and not field_file._committed
+
+
+def enqueue(instance, field_name: str, status_field: str = 'processing_status') -> None:
+    """
+    Queue derivative generation for an image field once the current transaction commits.
+    The original upload is already stored; the worker replaces it with the processed image
+    and flips `status_field` to ready (or failed).
+    """
+    job = (instance._meta.label, instance.pk, field_name, status_field)
+
+    def submit():
+        executor = get_executor()
+        executor.submit(process_image, *job, close_connections=not isinstance(executor, SyncExecutor))
+
+    transaction.on_commit(submit, using=instance._state.db)
+
+
+def process_image(model_label: str, pk, field_name: str, status_field: str, close_connections: bool = True) -> None:
+    """
+    Worker job: build the derivative with the model's `make_thumbnail()`, store it and
+    update only the image and status columns, so no save() signals or recursion happen.
+
+    Models may also define `make_derivatives()`, returning extra column values for
+    additional renditions, and `derivative_files()`, listing the storage names those
+    columns reference. Files no longer referenced afterwards are deleted.
+    """
+    model   = apps.get_model(model_label)
+    rows    = model._default_manager.filter(pk=pk)
+    try:
+        if not rows.update(**touched(model, **{status_field: ProcessingStatus.PROCESSING})):
+            return
+        instance        = rows.get()
+        field_file      = getattr(instance, field_name)
+        original_name   = field_file.name
+
+        derivative = instance.make_thumbnail()
+        if derivative is None:
+            raise ValueError("Thumbnail generation returned no image.")
+        if not isinstance(derivative, File):
+            derivative = ContentFile(derivative.getvalue() if isinstance(derivative, BytesIO) else derivative)
+        name = os.path.basename(getattr(derivative, 'name', None) or 'thumb.jpg')
+
+        # models with extra renditions build them from the original, before it is replaced
+        changes = {status_field: ProcessingStatus.READY}
+        stale   = {original_name}
+        if hasattr(instance, 'make_derivatives'):
+            stale.update(instance.derivative_files())
+            changes.update(instance.make_derivatives())
+            stale.difference_update(instance.derivative_files())
+
+        field_file.save(name, derivative, save=False)
+        changes[field_name] = field_file.name
+        rows.update(**touched(model, **changes))
+        bump_version(model)
+
+        stale.discard(field_file.name)
+        for stale_name in filter(None, stale):
+            field_file.storage.delete(stale_name)
+    except Exception as e:
+        logger.error("Image processing failed for %s %s: %s", model_label, pk, e, exc_info=True)
+        rows.update(**touched(model, **{status_field: ProcessingStatus.FAILED}))
+        bump_version(model)
+    finally:
+        if close_connections:
+            connections.close_all()
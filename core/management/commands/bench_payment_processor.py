@@ -0,0 +1,102 @@
+import time
+from statistics import median
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from core.paymentprocessor import flatten
+from core.paymentprocessor import PaymentProcessor
+from core.paymentprocessor import STRIPE_CHECKOUT_SPEC
+
+
+
+def flattened_payment_data(data: dict) -> dict:
+    """ The previous processor: flatten the whole session, then read the fields by dotted key. """
+    flat_data = flatten(data)
+    return {
+        "order_id": int(flat_data.get("metadata.order_id", 0)),
+        "user_id": int(flat_data.get("metadata.user_id", 0)),
+        "amount_paid": int(flat_data.get("amount_total", 0)),
+        "currency": flat_data.get("currency", "usd"),
+        "stripe_checkout_id": flat_data.get("id"),
+        "stripe_payment_intent": flat_data.get("payment_intent"),
+        "stripe_payment_status": flat_data.get("payment_status"),
+        "payment_method": flat_data.get("payment_method_types[0]", "unknown"),
+        "receipt_url": flat_data.get("receipt_url", None),
+        "customer_email": flat_data.get("customer_details.email", None),
+        "customer_name": flat_data.get("customer_details.name", None)
+    }
+
+
+def checkout_session(index: int, line_items: int) -> dict:
+    """ A completed checkout session with expanded line items, shaped like Stripe's. """
+    return {
+        'id': f'cs_test_{index:08d}',
+        'object': 'checkout.session',
+        'amount_subtotal': 1000 * line_items,
+        'amount_total': 1000 * line_items,
+        'currency': 'usd',
+        'customer_details': {
+            'address': {'city': 'Springfield', 'country': 'US', 'line1': '1 Main St', 'line2': None, 'postal_code': '12345', 'state': 'IL'},
+            'email': f'payer{index}@example.com', 'name': f'Payer {index}', 'phone': None, 'tax_exempt': 'none', 'tax_ids': [],
+        },
+        'metadata': {'order_id': str(index + 1), 'user_id': str(index + 1)},
+        'mode': 'payment',
+        'payment_intent': f'pi_test_{index:08d}',
+        'payment_method_types': ['card', 'link'],
+        'payment_status': 'paid',
+        'status': 'complete',
+        'line_items': {
+            'object': 'list',
+            'has_more': False,
+            'data': [
+                {
+                    'id': f'li_{index}_{item}', 'object': 'item', 'amount_total': 1000, 'currency': 'usd',
+                    'description': f'Product {item}', 'quantity': 1,
+                    'price': {
+                        'id': f'price_{item}', 'object': 'price', 'currency': 'usd', 'unit_amount': 1000,
+                        'product': {'id': f'prod_{item}', 'name': f'Product {item}', 'metadata': {'sku': f'SKU-{item}'}},
+                    },
+                    'discounts': [], 'taxes': [],
+                }
+                for item in range(line_items)
+            ],
+        },
+    }
+
+
+
+class Command(BaseCommand):
+    help = "Benchmark the extraction spec of core.paymentprocessor against flattening the whole checkout session."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--payloads', type=int, default=1000, help="Checkout sessions per run.")
+        parser.add_argument('--line-items', default='0,10,100', help="Comma separated line item counts to compare.")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per variant; the median time is reported.")
+
+    def time_runs(self, fn, repeat: int) -> float:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        return median(timings)
+
+    def handle(self, *args, **options):
+        count = options['payloads']
+        self.stdout.write(f"{'line items':>10} {'variant':<10} {'µs/payload':>11} {'speedup':>8}")
+        for line_items in (int(n) for n in options['line_items'].split(',')):
+            payloads = [checkout_session(index, line_items) for index in range(count)]
+            if [flattened_payment_data(p) for p in payloads[:10]] != PaymentProcessor.batch(payloads[:10]):
+                raise CommandError("The extraction spec and the flattening disagree.")
+
+            baseline = self.time_runs(lambda: [flattened_payment_data(p) for p in payloads], options['repeat'])
+            for variant, fn in (
+                ('flatten', None),
+                ('spec', lambda: [PaymentProcessor(p).get_payment_data() for p in payloads]),
+                ('batch', lambda: STRIPE_CHECKOUT_SPEC.extract_many(payloads)),
+            ):
+                elapsed = baseline if fn is None else self.time_runs(fn, options['repeat'])
+                self.stdout.write(
+                    f"{line_items:>10} {variant:<10} {elapsed / count * 1e6:>11.1f} {baseline / elapsed:>7.1f}x"
+                )
+        self.stdout.write(self.style.SUCCESS(f"{count} payloads per run, median of {options['repeat']} runs."))
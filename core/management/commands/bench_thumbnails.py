@@ -0,0 +1,115 @@
+import time
+from io import BytesIO
+from pathlib import Path
+from statistics import median
+from PIL import Image
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from core.imageencoding import ImageBudgetError
+from core.imageencoding import encode_within
+from core.imageencoding import load_thumbnail
+
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png'}
+
+
+
+def linear_thumbnail(data: bytes, size: tuple, max_bytes: int):
+    """ The previous encoder: full decode, then step quality down from 95 by 5. """
+    with Image.open(BytesIO(data)) as image:
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+        attempts = 0
+        for quality in range(95, 29, -5):
+            buffer = BytesIO()
+            image.save(buffer, format='JPEG', quality=quality)
+            attempts += 1
+            if buffer.tell() <= max_bytes:
+                return quality, attempts, buffer.tell()
+        return None, attempts, buffer.tell()
+
+
+def bisect_thumbnail(data: bytes, size: tuple, max_bytes: int, buffer: BytesIO):
+    """ The shared encoder: draft decode, bisected quality, one reused buffer. """
+    with load_thumbnail(BytesIO(data), size) as image:
+        try:
+            encoded = encode_within(image, max_bytes, buffer=buffer)
+        except ImageBudgetError:
+            return None, None, buffer.tell()
+        return encoded.quality, encoded.attempts, encoded.buffer.getbuffer().nbytes
+
+
+def synthetic_image(index: int, size: tuple) -> bytes:
+    """ A noisy gradient photo stand-in, saved as a high quality JPEG. """
+    width, height   = size
+    sigma           = 20 + 15 * index
+    channels        = [
+        Image.blend(Image.linear_gradient('L').resize(size), Image.effect_noise(size, sigma), 0.5),
+        Image.blend(Image.radial_gradient('L').resize(size), Image.effect_noise(size, sigma), 0.5),
+        Image.effect_noise(size, sigma / 2),
+    ]
+    buffer = BytesIO()
+    Image.merge('RGB', channels).save(buffer, format='JPEG', quality=95)
+    return buffer.getvalue()
+
+
+
+class Command(BaseCommand):
+    help = "Benchmark the thumbnail encoder against the previous linear quality search over a corpus of images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', help="Directory of .jpg/.jpeg/.png sample images (searched recursively).")
+        parser.add_argument('--synthetic', type=int, default=6, help="Generated images to use when no corpus is given.")
+        parser.add_argument('--source-size', default='4000x3000', help="Size of generated images, WxH.")
+        parser.add_argument('--thumb-size', type=int, default=800, help="Thumbnail bounding box.")
+        parser.add_argument('--budget-kb', type=int, default=200, help="Target file size in KB.")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per image; the median time is reported.")
+
+    def load_corpus(self, options) -> list:
+        if options['corpus']:
+            root = Path(options['corpus'])
+            if not root.is_dir():
+                raise CommandError(f"{root} is not a directory.")
+            paths = sorted(p for p in root.rglob('*') if p.suffix.lower() in IMAGE_SUFFIXES)
+            if not paths:
+                raise CommandError(f"No images found in {root}.")
+            return [(p.name, p.read_bytes()) for p in paths]
+
+        width, height = (int(n) for n in options['source_size'].lower().split('x'))
+        return [(f'synthetic-{i}.jpg', synthetic_image(i, (width, height))) for i in range(options['synthetic'])]
+
+    def time_runs(self, fn, repeat: int):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result  = fn()
+            timings.append(time.perf_counter() - started)
+        return median(timings), result
+
+    def handle(self, *args, **options):
+        corpus      = self.load_corpus(options)
+        size        = (options['thumb_size'], options['thumb_size'])
+        max_bytes   = options['budget_kb'] * 1024
+        buffer      = BytesIO()
+        totals      = {'linear': 0.0, 'bisect': 0.0}
+
+        self.stdout.write(f"{'image':<24} {'encoder':<7} {'ms':>8} {'encodes':>8} {'quality':>8} {'KB':>7}")
+        for name, data in corpus:
+            for encoder, fn in (
+                ('linear', lambda: linear_thumbnail(data, size, max_bytes)),
+                ('bisect', lambda: bisect_thumbnail(data, size, max_bytes, buffer)),
+            ):
+                elapsed, (quality, attempts, nbytes) = self.time_runs(fn, options['repeat'])
+                totals[encoder] += elapsed
+                self.stdout.write(
+                    f"{name[:24]:<24} {encoder:<7} {elapsed * 1000:>8.1f} {attempts or '-':>8} "
+                    f"{quality or 'fail':>8} {nbytes / 1024:>7.1f}"
+                )
+
+        speedup = totals['linear'] / totals['bisect'] if totals['bisect'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(corpus)} images: linear {totals['linear'] * 1000:.0f} ms, "
+            f"bisect {totals['bisect'] * 1000:.0f} ms ({speedup:.1f}x faster)."
+        ))
@@ -0,0 +1,17 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+
+from core.counters import flush_counters
+from core.counters import prune_buckets
+
+
+class Command(BaseCommand):
+    help = "Write buffered view/sold counter increments to the database (all workers with COUNTER_BACKEND=redis) and prune old trending buckets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=30, help="Trending buckets older than this are deleted.")
+
+    def handle(self, *args, **options):
+        written = flush_counters()
+        pruned  = prune_buckets(timedelta(days=options['keep_days']))
+        self.stdout.write(self.style.SUCCESS(f"Flushed {written} counters, pruned {pruned} trending buckets."))
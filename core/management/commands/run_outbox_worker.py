@@ -0,0 +1,51 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+
+from core.metrics import metrics
+
+from core.outbox import drain
+from core.outbox import purge
+from core.outbox import requeue_dead
+from core.outbox import run_worker
+from core.outbox import outbox_stats
+
+
+class Command(BaseCommand):
+    help = "Process the transactional outbox (payment emails, journal entries, ...) with retries and backoff. Needs nothing but the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the due messages and exit instead of polling.")
+        parser.add_argument('--batch-size', type=int, default=None, help="Messages leased per batch (default OUTBOX_BATCH_SIZE).")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to wait while the outbox is empty.")
+        parser.add_argument('--purge-days', type=int, default=None, help="Delete done messages older than this many days first.")
+        parser.add_argument('--requeue-dead', action='store_true', help="Retry dead messages again before starting.")
+
+    def report_timings(self):
+        """ The handler timings of this worker; the metrics endpoint only sees the web process. """
+        for name, histogram in metrics.snapshot()['histograms'].items():
+            if name.startswith('outbox.'):
+                self.stdout.write(f"{name}: {histogram['count']} observed, p50 {histogram['p50']}s, p95 {histogram['p95']}s")
+
+    def handle(self, *args, **options):
+        if options['purge_days'] is not None:
+            purged = purge(timedelta(days=options['purge_days']))
+            self.stdout.write(f"Purged {purged} done messages.")
+        if options['requeue_dead']:
+            self.stdout.write(f"Requeued {requeue_dead()} dead messages.")
+
+        if options['once']:
+            result = drain(options['batch_size'])
+            stats  = outbox_stats()
+            self.stdout.write(self.style.SUCCESS(
+                f"{result['done']} done, {result['failed']} failed; "
+                f"{stats['pending']} pending, {stats['dead']} dead, lag {stats['lag_seconds']}s."
+            ))
+            self.report_timings()
+            return
+
+        self.stdout.write("Outbox worker started, Ctrl+C to stop.")
+        try:
+            run_worker(options['poll_interval'], options['batch_size'], log=self.stdout.write)
+        except KeyboardInterrupt:
+            self.stdout.write("Outbox worker stopped.")
+            self.report_timings()
@@ -0,0 +1,96 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from collections import defaultdict
+
+
+# upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+
+class Histogram:
+    """ Counts of observed values per bucket, plus their count and sum. """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets    = tuple(buckets)
+        self.counts     = [0] * (len(self.buckets) + 1)     # the last one is +Inf
+        self.count      = 0
+        self.sum        = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count  += 1
+        self.sum    += value
+
+    def quantile(self, q: float):
+        """ Upper bound of the bucket holding the `q` quantile (None above the last bucket). """
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets + (None,), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def as_dict(self) -> dict:
+        labels = [str(bound) for bound in self.buckets] + ['+Inf']
+        return {
+            'count':    self.count,
+            'sum':      round(self.sum, 6),
+            'p50':      self.quantile(0.5),
+            'p95':      self.quantile(0.95),
+            'p99':      self.quantile(0.99),
+            'buckets':  dict(zip(labels, self.counts)),
+        }
+
+
+
+class MetricsRegistry:
+    """
+    Counters and latency histograms of this process, for the metrics endpoint and
+    management commands. Names are dotted strings, e.g. 'outbox.done.payment.email'.
+    """
+
+    def __init__(self):
+        self._lock          = threading.Lock()
+        self._counters      = defaultdict(int)
+        self._histograms    = {}
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str):
+        """ Observe the seconds spent in the block, also when it raises. """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'counters':     dict(sorted(self._counters.items())),
+                'histograms':   {name: histogram.as_dict() for name, histogram in sorted(self._histograms.items())},
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+
+metrics = MetricsRegistry()
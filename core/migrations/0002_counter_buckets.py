@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('xApiCore', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CounterBucketModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=100)),
+                ('field', models.CharField(max_length=50)),
+                ('object_id', models.BigIntegerField()),
+                ('bucket', models.DateTimeField()),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-bucket'],
+                'constraints': [models.UniqueConstraint(fields=('model_label', 'field', 'bucket', 'object_id'), name='unique_counter_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+from django.db import models 
+from django.utils import timezone
+
+from .timestamp import TimeStampModel 
+
+
+
+class SequenceModel(TimeStampModel):
+    """
+    Counter row backing core.sequence.NumberAllocator on databases without native sequences.
+    `value` is the last number handed out.
+    """
+    name            = models.CharField(max_length=100, unique=True)
+    value           = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self) -> str:
+        return f"{self.name} - {self.value}"
+
+
+
+class CounterBucketModel(models.Model):
+    """
+    Hourly totals of the increments flushed by core.counters, per object and counter.
+    Trending rankings sum the buckets of a recent window.
+    """
+    model_label     = models.CharField(max_length=100)
+    field           = models.CharField(max_length=50)
+    object_id       = models.BigIntegerField()
+    bucket          = models.DateTimeField()
+    count           = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['model_label', 'field', 'bucket', 'object_id'], name='unique_counter_bucket'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.model_label}.{self.field} #{self.object_id} @ {self.bucket:%Y-%m-%d %H:00} - {self.count}"
+
+
+
+class OutboxMessageModel(TimeStampModel):
+    """
+    A side effect (email, journal entry, ...) written in the same transaction as the change
+    that causes it and carried out later by core.outbox workers, with retries.
+    `available_at` is when the message may next be attempted; `locked_until` is the lease
+    of the worker holding it.
+    """
+    class STATUS(models.TextChoices):
+        PENDING     = 'pending', 'Pending'
+        PROCESSING  = 'processing', 'Processing'
+        DONE        = 'done', 'Done'
+        DEAD        = 'dead', 'Dead'
+
+    topic           = models.CharField(max_length=100)
+    payload         = models.JSONField(default=dict, blank=True)
+    status          = models.CharField(max_length=20, choices=STATUS.choices, default=STATUS.PENDING)
+    attempts        = models.PositiveIntegerField(default=0)
+    available_at    = models.DateTimeField(default=timezone.now)
+    locked_by       = models.CharField(max_length=100, blank=True, default='')
+    locked_until    = models.DateTimeField(null=True, blank=True)
+    processed_at    = models.DateTimeField(null=True, blank=True)
+    last_error      = models.TextField(blank=True, default='')
+
+    class Meta:
+        ordering = ['available_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='outbox_status_available_idx'),
+            models.Index(fields=['status', 'processed_at'], name='outbox_status_processed_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.topic} #{self.pk} - {self.status}"
@@ -0,0 +1,241 @@
+import os
+import time
+import uuid
+import random
+import socket
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections
+from django.db import transaction
+from django.db.models import F
+from django.db.models import Q
+from django.db.models import Min
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import OutboxMessageModel
+from .metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+STATUS      = OutboxMessageModel.STATUS
+_handlers   = {}
+_own_transactions = set()       # topics whose handlers run outside the `done` transaction
+
+
+
+class LeaseLostError(Exception):
+    """ The lease of a message expired and another worker claimed it while its handler ran. """
+
+
+
+def setting(name: str, default):
+    return getattr(settings, f'OUTBOX_{name}', default)
+
+
+def register(topic: str, atomic: bool = True):
+    """
+    Decorator registering the handler of `topic`; it is called with the message payload.
+
+    By default the handler runs in the transaction that marks the message done. A handler
+    that commits its own work in several transactions, and can safely run again, passes
+    `atomic=False`: it then runs before that transaction, so its commits are neither held
+    open until it returns nor rolled back when a later step fails or the lease is lost.
+    """
+    def decorator(handler):
+        _handlers[topic] = handler
+        if atomic:
+            _own_transactions.discard(topic)
+        else:
+            _own_transactions.add(topic)
+        return handler
+    return decorator
+
+
+def get_handler(topic: str):
+    return _handlers.get(topic)
+
+
+def enqueue(topic: str, payload: dict = None, using: str = 'default', delay: timedelta = None) -> OutboxMessageModel:
+    """
+    Write a message for the workers. The row is part of the caller's transaction, so it
+    is only seen by a worker once the change that caused it commits, and vanishes with
+    it on rollback. Raises LookupError for a topic without a handler.
+    """
+    if topic not in _handlers:
+        raise LookupError(f"No outbox handler registered for '{topic}'.")
+    message = OutboxMessageModel.objects.using(using).create(
+        topic=topic, payload=payload or {}, available_at=timezone.now() + (delay or timedelta()),
+    )
+    metrics.incr('outbox.enqueued')
+    return message
+
+
+def backoff(attempts: int) -> timedelta:
+    """ Delay before retry number `attempts`: exponential and capped, jittered over the upper half so failed batches spread out. """
+    ceiling = min(setting('BACKOFF_MAX', 3600), setting('BACKOFF_BASE', 10) * 2 ** max(attempts - 1, 0))
+    return timedelta(seconds=random.uniform(ceiling / 2, ceiling))
+
+
+def worker_name() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+
+def claim(worker: str, batch_size: int, using: str = 'default') -> list:
+    """
+    Lease up to `batch_size` due messages to `worker`: pending ones whose `available_at`
+    has passed, and processing ones whose lease expired (their worker died).
+
+    Rows are picked with SELECT ... FOR UPDATE SKIP LOCKED where supported, so concurrent
+    workers take disjoint batches; elsewhere (SQLite) writes are serialized and the
+    conditional UPDATE only takes rows nobody leased in the meantime.
+    """
+    now      = timezone.now()
+    messages = OutboxMessageModel.objects.using(using)
+    due      = Q(status=STATUS.PENDING, available_at__lte=now) | Q(status=STATUS.PROCESSING, locked_until__lt=now)
+    with transaction.atomic(using=using):
+        candidates = messages.filter(due).order_by('available_at', 'pk')
+        if connections[using].features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        ids = list(candidates.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return []
+        messages.filter(due, pk__in=ids).update(
+            status=STATUS.PROCESSING, locked_by=worker, attempts=F('attempts') + 1,
+            locked_until=now + timedelta(seconds=setting('LEASE_SECONDS', 300)), modified=now,
+        )
+    return list(messages.filter(pk__in=ids, status=STATUS.PROCESSING, locked_by=worker).order_by('available_at', 'pk'))
+
+
+def process(message: OutboxMessageModel, using: str = 'default') -> bool:
+    """
+    Run the handler of a claimed message. The handler's database writes and the `done`
+    mark commit together, so a retry never repeats them; anything else a handler does
+    (sending an email) is at-least-once. When the lease was lost to another worker in the
+    meantime, the handler's writes are rolled back and the message is left to that worker.
+    Handlers registered with `atomic=False` commit on their own and are not rolled back.
+    Returns True on success.
+    """
+    handler = get_handler(message.topic)
+    atomic  = message.topic not in _own_transactions
+    leased  = OutboxMessageModel.objects.using(using).filter(pk=message.pk, status=STATUS.PROCESSING, locked_by=message.locked_by)
+    started = time.perf_counter()
+    try:
+        if handler is None:
+            raise LookupError(f"No outbox handler registered for '{message.topic}'.")
+        if not atomic:
+            handler(message.payload)
+        with transaction.atomic(using=using):
+            if atomic:
+                handler(message.payload)
+            now = timezone.now()
+            if not leased.update(status=STATUS.DONE, processed_at=now, locked_until=None, last_error='', modified=now):
+                raise LeaseLostError(f"Outbox message {message.pk} is no longer leased to {message.locked_by}.")
+    except LeaseLostError as e:
+        metrics.incr('outbox.lease_lost')
+        logger.warning("%s %s", e, "Its handler's writes were rolled back." if atomic else "Its handler committed on its own.")
+        return False
+    except Exception as e:
+        metrics.observe(f'outbox.handler_seconds.{message.topic}', time.perf_counter() - started)
+        fail(message, e, leased)
+        return False
+
+    metrics.observe(f'outbox.handler_seconds.{message.topic}', time.perf_counter() - started)
+    metrics.observe('outbox.lag_seconds', (now - message.created).total_seconds())
+    metrics.incr('outbox.done')
+    metrics.incr(f'outbox.done.{message.topic}')
+    return True
+
+
+def fail(message: OutboxMessageModel, error: Exception, leased) -> None:
+    """ Schedule a retry with backoff, or park the message as dead after OUTBOX_MAX_ATTEMPTS. """
+    now   = timezone.now()
+    error = f'{type(error).__name__}: {error}'
+    if message.attempts >= setting('MAX_ATTEMPTS', 8):
+        leased.update(status=STATUS.DEAD, locked_until=None, last_error=error, modified=now)
+        metrics.incr('outbox.dead')
+        logger.error("Outbox message %s (%s) is dead after %s attempts: %s", message.pk, message.topic, message.attempts, error)
+        return
+    leased.update(
+        status=STATUS.PENDING, locked_until=None, last_error=error, modified=now,
+        available_at=now + backoff(message.attempts),
+    )
+    metrics.incr('outbox.retried')
+    logger.warning("Outbox message %s (%s) failed, attempt %s: %s", message.pk, message.topic, message.attempts, error)
+
+
+def drain(batch_size: int = None, worker: str = None, using: str = 'default', limit: int = None) -> dict:
+    """
+    Process due messages batch by batch until none is left (or `limit` were handled).
+    Returns the number of messages that succeeded and failed.
+    """
+    batch_size  = batch_size or setting('BATCH_SIZE', 100)
+    worker      = worker or worker_name()
+    result      = {'done': 0, 'failed': 0}
+    while limit is None or result['done'] + result['failed'] < limit:
+        size  = batch_size if limit is None else min(batch_size, limit - result['done'] - result['failed'])
+        batch = claim(worker, size, using)
+        if not batch:
+            break
+        for message in batch:
+            result['done' if process(message, using) else 'failed'] += 1
+    return result
+
+
+def run_worker(poll_interval: float = 1.0, batch_size: int = None, using: str = 'default', stop=None, log=None) -> None:
+    """
+    Drain the outbox forever, polling every `poll_interval` seconds while it is empty.
+    `stop` is an optional threading.Event ending the loop.
+    """
+    worker = worker_name()
+    while stop is None or not stop.is_set():
+        result = drain(batch_size, worker, using)
+        if log and (result['done'] or result['failed']):
+            log(f"{result['done']} done, {result['failed']} failed.")
+        if not (result['done'] or result['failed']):
+            if stop is not None:
+                stop.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+
+
+
+def outbox_stats(using: str = 'default') -> dict:
+    """
+    Backlog and throughput of the outbox across all workers, read from the table:
+    messages per status, how far the oldest due message is behind (`lag_seconds`), and
+    messages done over the last minute and hour.
+    """
+    now         = timezone.now()
+    messages    = OutboxMessageModel.objects.using(using).order_by()
+    counts      = dict(messages.values_list('status').annotate(count=Count('pk')))
+    oldest      = messages.filter(status=STATUS.PENDING, available_at__lte=now).aggregate(due=Min('available_at'))['due']
+    done        = messages.filter(status=STATUS.DONE)
+    last_minute = done.filter(processed_at__gte=now - timedelta(minutes=1)).count()
+    return {
+        **{status: counts.get(status, 0) for status in STATUS.values},
+        'lag_seconds':          round((now - oldest).total_seconds(), 3) if oldest else 0,
+        'done_last_minute':     last_minute,
+        'done_last_hour':       done.filter(processed_at__gte=now - timedelta(hours=1)).count(),
+        'per_second':           round(last_minute / 60, 3),
+    }
+
+
+def purge(older_than: timedelta, using: str = 'default') -> int:
+    """ Delete done messages processed before `older_than` ago; dead ones are kept for inspection. """
+    deleted, _ = OutboxMessageModel.objects.using(using).filter(
+        status=STATUS.DONE, processed_at__lt=timezone.now() - older_than,
+    ).delete()
+    return deleted
+
+
+def requeue_dead(topic: str = None, using: str = 'default') -> int:
+    """ Give dead messages (of `topic`) a fresh set of attempts, e.g. after fixing their cause. """
+    dead = OutboxMessageModel.objects.using(using).filter(status=STATUS.DEAD)
+    if topic:
+        dead = dead.filter(topic=topic)
+    now = timezone.now()
+    return dead.update(status=STATUS.PENDING, attempts=0, available_at=now, modified=now)
@@ -1,6 +1,15 @@
+import json
+import operator
+from functools import reduce
+from django.db.models import Q
+from django.core.exceptions import FieldDoesNotExist
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination 
 from rest_framework.pagination import LimitOffsetPagination 
+from rest_framework.pagination import CursorPagination 
 from rest_framework.pagination import BasePagination 
+from rest_framework.pagination import _reverse_ordering
 
 
 class StandardPageNumberPagination(PageNumberPagination):
@@ -22,6 +31,99 @@ class StandardLimitPagination(LimitOffsetPagination):
     offset_query_param      = 'offset' 
 
 
+class StandardCursorPagination(CursorPagination):
+    """
+    Keyset pagination over `-created, -id`, or over the ordering the view already applied
+    (e.g. the `?search=` rank) with `-id` appended as tie-breaker.
+
+    DRF's CursorPagination keys the cursor on the first ordering field only and walks rows
+    sharing that value with an OFFSET (capped at `offset_cutoff`), so thousands of
+    bulk-created rows with one `created` would page slowly and then repeat. Here the cursor
+    holds every ordering value of the boundary row and the next page is the rows after that
+    compound position (`created < c OR (created = c AND id < i)`): positions are unique, the
+    offset stays 0, every page is one seek whatever its depth, and no COUNT query is run.
+    Rows inserted while a client pages never shift the rows after its cursor.
+    """
+    page_size               = 20 
+    max_page_size           = 200 
+    page_size_query_param   = 'size' 
+    cursor_query_param      = 'cursor' 
+    ordering                = ('-created', '-id') 
+
+    def get_ordering(self, request, queryset, view):
+        """ Keep an explicit order_by of the view, else newest first; models without `created` use their Meta ordering. """
+        ordering = tuple(queryset.query.order_by)
+        if not ordering:
+            opts = queryset.model._meta
+            if any(field.name == 'created' for field in opts.concrete_fields):
+                return self.ordering
+            ordering = tuple(opts.ordering)
+        if ordering and ordering[-1].lstrip('-') in ('id', 'pk'):
+            return ordering
+        return ordering + ('-id',)
+
+    def _get_position_from_instance(self, instance, ordering):
+        """ Every ordering value of the row, so positions are unique and the cursor offset stays 0. """
+        get = instance.get if isinstance(instance, dict) else lambda name: getattr(instance, name)
+        return json.dumps([str(get(field.lstrip('-'))) for field in ordering])
+
+    def keyset_filter(self, queryset, position: str, reverse: bool) -> Q:
+        """ Rows after `position` in the (possibly reversed) ordering, as OR-ed prefixes of equal values; ordering fields must be non-null. """
+        try:
+            values = json.loads(position)
+            fields = [
+                queryset.query.annotations[name].output_field if name in queryset.query.annotations else queryset.model._meta.get_field(name)
+                for name in (field.lstrip('-') for field in self.ordering)
+            ]
+            values = [field.to_python(value) for field, value in zip(fields, values)]
+        except (TypeError, ValueError, LookupError, FieldDoesNotExist, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        after, equal = [], Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            after.append(equal & Q(**{f"{name}__{'lt' if field.startswith('-') != reverse else 'gt'}": value}))
+            equal &= Q(**{name: value})
+        return reduce(operator.or_, after)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """ CursorPagination.paginate_queryset with the compound keyset filter in place of position + offset. """
+        self.request    = request
+        self.page_size  = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url   = request.build_absolute_uri()
+        self.ordering   = self.get_ordering(request, queryset, view)
+        self.cursor     = self.decode_cursor(request)
+        reverse, position = (self.cursor.reverse, self.cursor.position) if self.cursor else (False, None)
+
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(queryset, position, reverse))
+
+        # one extra row tells whether a page follows
+        results     = list(queryset[:self.page_size + 1])
+        self.page   = results[:self.page_size]
+        following   = self._get_position_from_instance(results[-1], self.ordering) if len(results) > len(self.page) else None
+
+        if reverse:
+            self.page           = list(reversed(self.page))
+            self.has_next       = position is not None
+            self.has_previous   = following is not None
+            self.next_position, self.previous_position = position, following
+        else:
+            self.has_next       = following is not None
+            self.has_previous   = position is not None
+            self.next_position, self.previous_position = following, position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+
 class DynamicPagination(BasePagination):
     """    Custom pagination class that allows for dynamic pagination based on query parameters. """
     def paginate_queryset(self, queryset, request, view=None):
@@ -29,6 +131,8 @@ class DynamicPagination(BasePagination):
 
         if pagination_type == 'limit':
             self.paginator = StandardLimitPagination() 
+        elif pagination_type == 'cursor':
+            self.paginator = StandardCursorPagination() 
         else:
             self.paginator = StandardPageNumberPagination() 
 
@@ -1,51 +1,174 @@
+import re
 import json
-from typing import Dict, Any
+import logging
+from decimal import Decimal
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple, Union
+
+
+logger = logging.getLogger(__name__)
+
+_STEP = re.compile(r'([^.\[\]]+)|\[(\d+)\]')
+
+
+
+def flatten(d: Dict[str, Any], sep: str = '.', parent_key: str = '') -> Dict[str, Any]:
+    """ Every leaf of a nested payload under a dotted key, e.g. 'payment_method_types[0]'. """
+    items = []
+    for k, v in d.items():
+        new_key = f"{parent_key}{sep}{k}" if parent_key else k
+        if isinstance(v, dict):
+            items.extend(flatten(v, sep, new_key).items())
+        elif isinstance(v, list):
+            for idx, item in enumerate(v):
+                if isinstance(item, dict):
+                    items.extend(flatten(item, sep, f"{new_key}[{idx}]").items())
+                else:
+                    items.append((f"{new_key}[{idx}]", item))
+        else:
+            items.append((new_key, v))
+    return dict(items)
+
+
+def parse_path(path: str) -> Tuple[Union[str, int], ...]:
+    """ 'transactions[0].amount.total' -> ('transactions', 0, 'amount', 'total') """
+    return tuple(key if key else int(index) for key, index in _STEP.findall(path))
+
+
+
+class Field:
+    """
+    One value of an ExtractionSpec: the dotted `path` to read (with a tuple of paths,
+    `coerce` gets every value), the `coerce` callable applied to the value, and the
+    `default` taken, and coerced like a found value, when the path is missing.
+    """
+    __slots__ = ('name', 'paths', 'coerce', 'default')
+
+    def __init__(self, name: str, path: Union[str, Tuple[str, ...]], coerce: Optional[Callable] = None, default: Any = None):
+        self.name       = name
+        self.paths      = tuple(parse_path(p) for p in ((path,) if isinstance(path, str) else path))
+        self.coerce     = coerce
+        self.default    = default
+
+    def read(self, data, steps):
+        for step in steps:
+            try:
+                data = data[step]
+            except (KeyError, IndexError, TypeError):
+                return self.default
+        return data
+
+    def extract(self, data):
+        if len(self.paths) == 1:
+            value = self.read(data, self.paths[0])
+            return self.coerce(value) if self.coerce is not None else value
+        values = [self.read(data, steps) for steps in self.paths]
+        return self.coerce(*values) if self.coerce is not None else values
+
+
+
+class ExtractionSpec:
+    """
+    Declarative payload -> payment dict mapping. Only the declared paths are walked,
+    so the cost does not depend on the size of the payload (line items, ...).
+    """
+
+    def __init__(self, name: str, fields: Iterable[Field]):
+        self.name   = name
+        self.fields = tuple(fields)
+
+    def extract(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """ The payment dict of one payload; raises if a value cannot be coerced. """
+        return {field.name: field.extract(data) for field in self.fields}
+
+    def extract_many(self, payloads: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """ The payment dicts of a batch of payloads, `{}` for a payload that cannot be read. """
+        results = []
+        for data in payloads:
+            try:
+                results.append(self.extract(data))
+            except Exception as e:
+                logger.error("Error processing %s payment data: %s", self.name, e)
+                results.append({})
+        return results
+
+
+
+def sku_order_id(sku) -> int:
+    """ Order id of a PayPal item sku, 'order_42' -> 42. """
+    return int(str(sku).rsplit('_', 1)[-1]) if sku else 0
+
+
+def full_name(first, last) -> Optional[str]:
+    return ' '.join(part for part in (first, last) if part) or None
+
+
+def to_amount(value) -> Decimal:
+    return Decimal(str(value))
+
+
+# a Stripe checkout.session; amounts are in the smallest currency unit
+STRIPE_CHECKOUT_SPEC = ExtractionSpec('stripe', [
+    Field('order_id',               'metadata.order_id', int, 0),
+    Field('user_id',                'metadata.user_id', int, 0),
+    Field('amount_paid',            'amount_total', int, 0),
+    Field('currency',               'currency', default='usd'),
+    Field('stripe_checkout_id',     'id'),
+    Field('stripe_payment_intent',  'payment_intent'),
+    Field('stripe_payment_status',  'payment_status'),
+    Field('payment_method',         'payment_method_types[0]', default='unknown'),
+    Field('receipt_url',            'receipt_url'),
+    Field('customer_email',         'customer_details.email'),
+    Field('customer_name',          'customer_details.name'),
+])
+
+# a PayPal v1 payment (paypalrestsdk.Payment.to_dict()); amounts are decimal strings
+PAYPAL_PAYMENT_SPEC = ExtractionSpec('paypal', [
+    Field('order_id',               'transactions[0].item_list.items[0].sku', sku_order_id),
+    Field('amount_paid',            'transactions[0].amount.total', to_amount, '0'),
+    Field('currency',               'transactions[0].amount.currency', default='USD'),
+    Field('paypal_payment_id',      'id'),
+    Field('paypal_payer_id',        'payer.payer_info.payer_id'),
+    Field('paypal_payment_status',  'state'),
+    Field('customer_email',         'payer.payer_info.email'),
+    Field('customer_name',          ('payer.payer_info.first_name', 'payer.payer_info.last_name'), full_name),
+])
+
 
 
 class PaymentProcessor:
-    def __init__(self, data: Dict[str, Any], sep: str = '.'):
+    """
+    The payment fields of a gateway payload, read with an ExtractionSpec
+    (a Stripe checkout session by default). `get_payment_data()` is `{}` when the
+    payload cannot be read.
+    """
+
+    def __init__(self, data: Dict[str, Any], sep: str = '.', spec: ExtractionSpec = STRIPE_CHECKOUT_SPEC):
         self.sep = sep
-        self.flat_data = self._flatten(data)
+        self.data = data
+        self.spec = spec
+        self._flat_data = None
         self.payment_data = self._build_payment_dict()
 
+    @classmethod
+    def batch(cls, payloads: Iterable[Dict[str, Any]], spec: ExtractionSpec = STRIPE_CHECKOUT_SPEC) -> List[Dict[str, Any]]:
+        """ The payment data of many payloads at once (webhooks, reconciliation). """
+        return spec.extract_many(payloads)
+
+    @property
+    def flat_data(self) -> Dict[str, Any]:
+        """ The whole payload under dotted keys, built on first use only. """
+        if self._flat_data is None:
+            self._flat_data = self._flatten(self.data)
+        return self._flat_data
+
     def _flatten(self, d: Dict[str, Any], parent_key: str = '') -> Dict[str, Any]:
-        items = []
-        for k, v in d.items():
-            new_key = f"{parent_key}{self.sep}{k}" if parent_key else k
-            if isinstance(v, dict):
-                items.extend(self._flatten(v, new_key).items())
-            elif isinstance(v, list):
-                for idx, item in enumerate(v):
-                    if isinstance(item, dict):
-                        items.extend(self._flatten(item, f"{new_key}[{idx}]").items())
-                    else:
-                        items.append((f"{new_key}[{idx}]", item))
-            else:
-                items.append((new_key, v))
-        return dict(items)
+        return flatten(d, self.sep, parent_key)
 
     def _build_payment_dict(self) -> Dict[str, Any]:
-        try:
-            return {
-                "order_id": int(self.flat_data.get("metadata.order_id", 0)),
-                "user_id": int(self.flat_data.get("metadata.user_id", 0)),
-                "amount_paid": int(self.flat_data.get("amount_total", 0)),
-                "currency": self.flat_data.get("currency", "usd"),
-                "stripe_checkout_id": self.flat_data.get("id"),
-                "stripe_payment_intent": self.flat_data.get("payment_intent"),
-                "stripe_payment_status": self.flat_data.get("payment_status"),
-                "payment_method": self.flat_data.get("payment_method_types[0]", "unknown"),
-                "receipt_url": self.flat_data.get("receipt_url", None),
-                "customer_email": self.flat_data.get("customer_details.email", None),
-                "customer_name": self.flat_data.get("customer_details.name", None)
-            }
-        except Exception as e:
-            print(f"Error processing payment data: {e}")
-            return {}
+        return self.spec.extract_many([self.data])[0]
 
     def get_payment_data(self) -> Dict[str, Any]:
         return self.payment_data
 
     def __str__(self) -> str:
-        return json.dumps(self.payment_data, indent=2)
-
+        return json.dumps(self.payment_data, indent=2, default=str)
@@ -0,0 +1,91 @@
+from functools import lru_cache
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.relations import RelatedField
+
+
+def _relation(model, name):
+    """ Return the relation field called `name` on `model`, or None if it is not a relation. """
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if field.is_relation else None
+
+
+def _collect(serializer, model, prefix, in_prefetch, select_related, prefetch_related):
+    """ Walk the declared serializer fields and record the relation lookups they will touch. """
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+
+        path            = list(prefix)
+        to_many         = False
+        related_model   = model
+        for attr in field.source_attrs:
+            relation = _relation(related_model, attr)
+            if relation is None:
+                break
+            path.append(attr)
+            to_many = to_many or relation.many_to_many or relation.one_to_many
+            related_model = relation.related_model
+
+        if len(path) == len(prefix):
+            continue
+
+        # A plain FK rendered as its primary key is read from the `<name>_id` column.
+        pk_only = (
+            isinstance(field, RelatedField)
+            and not to_many
+            and len(path) == len(prefix) + 1
+            and field.use_pk_only_optimization()
+        )
+        many = in_prefetch or to_many
+        if not pk_only:
+            lookup = '__'.join(path)
+            if many:
+                prefetch_related.append(lookup)
+            else:
+                select_related.append(lookup)
+
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if isinstance(nested, serializers.BaseSerializer):
+            _collect(nested, related_model, path, many, select_related, prefetch_related)
+
+
+@lru_cache(maxsize=None)
+def get_related_lookups(serializer_class) -> tuple:
+    """
+    Return the (select_related, prefetch_related) lookups needed to render a serializer.
+    Forward FK / one-to-one relations are joined, reverse FK and M2M relations
+    (including nested list serializers) are prefetched.
+    """
+    serializer = serializer_class()
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    if model is None:
+        return (), ()
+
+    select_related, prefetch_related = [], []
+    _collect(serializer, model, [], False, select_related, prefetch_related)
+    return tuple(dict.fromkeys(select_related)), tuple(dict.fromkeys(prefetch_related))
+
+
+def optimize_queryset(queryset, serializer_class):
+    """ Apply the select_related / prefetch_related lookups a serializer needs to a queryset. """
+    select_related, prefetch_related = get_related_lookups(serializer_class)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
+
+
+class QueryOptimizerMixin:
+    """
+    ViewSet mixin that loads every relation the serializer renders up front,
+    so list and detail responses cost a constant number of queries.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return optimize_queryset(queryset, self.get_serializer_class())
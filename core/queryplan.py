@@ -0,0 +1,51 @@
+import re
+from django.db import connections
+from django.db import transaction
+
+
+# SQLite: "SCAN xApiCart_ordermodel" (optionally "USING INDEX ..."); SEARCH lines use an index
+SQLITE_SCAN     = re.compile(r'\bSCAN (?:TABLE )?"?(?P<table>\w+)"?(?: AS \w+)?(?P<using> USING (?:COVERING )?INDEX)?')
+# Postgres: "Seq Scan on "xApiCart_ordermodel""
+POSTGRES_SCAN   = re.compile(r'Seq Scan on "?(?P<table>\w+)"?')
+
+
+
+def explain(queryset) -> str:
+    """
+    The database's plan for `queryset`: `EXPLAIN QUERY PLAN` on SQLite, `EXPLAIN` on Postgres.
+
+    Postgres plans from statistics, and on the handful of rows a test creates a sequential
+    scan is always cheapest; sequential scans are disabled for the EXPLAIN so the plan
+    shows whether an index *can* serve the query.
+    """
+    using = queryset.db
+    if connections[using].vendor != 'postgresql':
+        return queryset.explain()
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+
+def full_scans(queryset, allow_index_scan: bool = False) -> list:
+    """
+    Tables `queryset` reads in full, e.g. ['xApiCart_ordermodel'].
+
+    On SQLite a `SCAN ... USING INDEX` walks a whole index in order (an ORDER BY served
+    by an index, or a covering index), which costs as much as a Postgres Seq Scan, so it
+    is counted too; pass `allow_index_scan=True` for a query that is meant to walk one.
+    Subqueries, constant rows and temporary B-trees are never counted.
+    """
+    plan    = explain(queryset)
+    vendor  = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        return [match['table'] for match in POSTGRES_SCAN.finditer(plan)]
+    if vendor != 'sqlite':
+        return []
+
+    tables = []
+    for match in SQLITE_SCAN.finditer(plan):
+        if match['table'] in ('SUBQUERY', 'CONSTANT') or (match['using'] and allow_index_scan):
+            continue
+        tables.append(match['table'])
+    return tables
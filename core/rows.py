@@ -0,0 +1,44 @@
+import io
+import csv
+import json
+
+
+FORMATS = ('csv', 'jsonl')
+
+
+
+def detect_format(filename: str, file_format: str = None) -> str:
+    file_format = (file_format or filename.rsplit('.', 1)[-1]).lower()
+    if file_format == 'json':
+        file_format = 'jsonl'
+    if file_format not in FORMATS:
+        raise ValueError(f"Unsupported format '{file_format}'. Use one of: {', '.join(FORMATS)}.")
+    return file_format
+
+
+def read_rows(stream, file_format: str):
+    """
+    Yield `(line number, row dict or None, error or None)` from a CSV or JSONL stream,
+    one line at a time. Binary streams (uploads, files opened 'rb') are decoded as UTF-8.
+    """
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f'Invalid JSON: {e}'
+            continue
+        if isinstance(row, dict):
+            yield line_number, row, None
+        else:
+            yield line_number, None, 'Each line must be a JSON object.'
@@ -0,0 +1,166 @@
+import os
+import threading
+from django.conf import settings
+from django.db import connections
+from django.db import transaction
+from django.db import IntegrityError
+from django.db.models import F
+
+
+
+def sequence_name(name: str) -> str:
+    """ Database sequence backing the allocator called `name`. """
+    return f'xapi_{name.lower()}_seq'
+
+
+def create_sequence(connection, name: str, start: int, block_size: int = None) -> None:
+    """
+    Create the native sequence for an allocator (Postgres only), starting at `start`.
+    Called from migrations; every nextval() hands out a whole block of numbers.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    block_size = block_size or getattr(settings, 'NUMBER_ALLOCATOR_BLOCK_SIZE', 50)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE SEQUENCE IF NOT EXISTS "{sequence_name(name)}" INCREMENT BY {int(block_size)} START WITH {int(start)}'
+        )
+
+
+def drop_sequence(connection, name: str) -> None:
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP SEQUENCE IF EXISTS "{sequence_name(name)}"')
+
+
+def create_counter(apps, connection, name: str, start: int) -> None:
+    """
+    Create the counter row of an allocator on databases without native sequences, so the
+    first allocation does not have to seed it (and cost extra queries). Called from migrations.
+    """
+    if connection.vendor == 'postgresql':
+        return
+    SequenceModel = apps.get_model('xApiCore', 'SequenceModel')
+    SequenceModel.objects.using(connection.alias).get_or_create(name=name, defaults={'value': start - 1})
+
+
+def drop_counter(apps, connection, name: str) -> None:
+    SequenceModel = apps.get_model('xApiCore', 'SequenceModel')
+    SequenceModel.objects.using(connection.alias).filter(name=name).delete()
+
+
+
+
+class NumberAllocator:
+    """
+    Hands out unique, increasing-per-worker numbers (order numbers, journal entry numbers)
+    without scanning the target table for its current maximum.
+
+    Each worker reserves a block of numbers at a time and serves later calls from memory,
+    so concurrent inserts never fight over the same value:
+
+    - Postgres: a native sequence whose INCREMENT is the block size. nextval() is not
+      transactional, so a block stays reserved even if the caller rolls back.
+    - Other databases: a counter row in core.SequenceModel bumped with an F() update.
+      A counter bump inside the caller's transaction would be undone by a rollback, so
+      blocks are only cached when the bump runs in autocommit mode; inside a transaction
+      exactly the requested numbers are reserved, and the counter row stays locked until
+      that transaction ends. Hot paths therefore allocate before opening their
+      transaction (Cart.checkout.place_order, Ledger.posting.post_entries); a number
+      reserved for a transaction that then rolls back is skipped, as with a sequence.
+
+    `seed` is a callable returning the first number, used if the counter row does not
+    exist yet (e.g. max(existing) + 1); migrations create it with `create_counter`.
+    """
+
+    def __init__(self, name: str, seed=None, block_size: int = None):
+        self.name           = name
+        self.seed           = seed
+        self._block_size    = block_size
+        self._lock          = threading.Lock()
+        self._pid           = os.getpid()
+        self._blocks        = {}     # database alias -> [next, end)
+        self._increments    = {}     # database alias -> native sequence increment
+
+    @property
+    def block_size(self) -> int:
+        return self._block_size or getattr(settings, 'NUMBER_ALLOCATOR_BLOCK_SIZE', 50)
+
+    def next(self, using: str = 'default') -> int:
+        """ Return the next number. """
+        return self.allocate(1, using=using)[0]
+
+    def allocate(self, count: int, using: str = 'default') -> list:
+        """ Return `count` unused numbers in increasing order. """
+        if count <= 0:
+            return []
+        with self._lock:
+            if self._pid != os.getpid():
+                # forked worker: blocks cached by the parent belong to the parent
+                self._pid, self._blocks = os.getpid(), {}
+            numbers = self._take_cached(count, using)
+            if len(numbers) < count:
+                numbers.extend(self._reserve(count - len(numbers), using))
+        return numbers
+
+    def _take_cached(self, count: int, using: str) -> list:
+        block = self._blocks.get(using)
+        if not block:
+            return []
+        start, end  = block
+        taken       = min(count, end - start)
+        block[0]    = start + taken
+        return list(range(start, start + taken))
+
+    def _reserve(self, count: int, using: str) -> list:
+        connection = connections[using]
+        if self._has_sequence(connection, using):
+            numbers = self._reserve_from_sequence(connection, count, using)
+            cacheable = True
+        else:
+            cacheable = not connection.in_atomic_block
+            size = max(count, self.block_size) if cacheable else count
+            numbers = list(self._reserve_from_counter(size, using))
+
+        if cacheable and len(numbers) > count:
+            self._blocks[using] = [numbers[count], numbers[-1] + 1]
+        return numbers[:count]
+
+    def _has_sequence(self, connection, using: str) -> bool:
+        if connection.vendor != 'postgresql':
+            return False
+        if using not in self._increments:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT increment_by FROM pg_sequences WHERE sequencename = %s', [sequence_name(self.name)])
+                row = cursor.fetchone()
+            if row is None:
+                return False
+            self._increments[using] = row[0]
+        return True
+
+    def _reserve_from_sequence(self, connection, count: int, using: str) -> list:
+        increment   = self._increments[using]
+        blocks      = -(-count // increment)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(%s) FROM generate_series(1, %s)', [sequence_name(self.name), blocks])
+            starts = sorted(row[0] for row in cursor.fetchall())
+        # only the tail of the last block can be left over, so the cached part stays contiguous
+        return [number for start in starts for number in range(start, start + increment)]
+
+    def _reserve_from_counter(self, size: int, using: str) -> range:
+        from .models import SequenceModel
+
+        counters = SequenceModel.objects.using(using).filter(name=self.name)
+        with transaction.atomic(using=using):
+            if not counters.update(value=F('value') + size):
+                start = int(self.seed()) if self.seed else 1
+                try:
+                    with transaction.atomic(using=using):
+                        SequenceModel.objects.using(using).create(name=self.name, value=start - 1 + size)
+                    return range(start, start + size)
+                except IntegrityError:
+                    # another worker created the row first
+                    counters.update(value=F('value') + size)
+            end = counters.values_list('value', flat=True).get()
+        return range(end - size + 1, end + 1)
@@ -0,0 +1,83 @@
+import uuid
+from django.db import transaction
+from django.db import IntegrityError
+from django.db.models import Q
+from django.utils.text import slugify
+
+
+SUFFIX_ROOM = 8     # room left in the column for a "-<n>" suffix
+
+
+
+def slug_base(model, value: str, field: str = 'slug') -> str:
+    """ Slugified `value`, short enough for the column to take a numeric suffix. """
+    max_length = model._meta.get_field(field).max_length
+    base = slugify(value or '')[:max_length - SUFFIX_ROOM].strip('-')
+    return base or uuid.uuid4().hex[:8]
+
+
+def next_free(base: str, taken: set) -> str:
+    """ `base`, or `base-1`, `base-2`, ... whichever is the first not in `taken`. """
+    if base not in taken:
+        return base
+    counter = 1
+    while f'{base}-{counter}' in taken:
+        counter += 1
+    return f'{base}-{counter}'
+
+
+def taken_slugs(queryset, bases, field: str = 'slug') -> set:
+    """ Every existing slug equal to one of `bases` or numbered from it (`base-...`), fetched in a single query. """
+    condition = Q()
+    for base in set(bases):
+        condition |= Q(**{field: base}) | Q(**{f'{field}__startswith': f'{base}-'})
+    return set(queryset.filter(condition).values_list(field, flat=True))
+
+
+
+def unique_slug(instance, value: str, field: str = 'slug') -> str:
+    """
+    A slug for `value` that no other row of the instance's model uses,
+    found with one `startswith` query instead of one query per collision.
+    """
+    model       = type(instance)
+    base        = slug_base(model, value, field)
+    queryset    = model._default_manager.using(instance._state.db or 'default').exclude(pk=instance.pk)
+    return next_free(base, taken_slugs(queryset, [base], field))
+
+
+def unique_slugs(model, values, field: str = 'slug', using: str = 'default') -> list:
+    """
+    Bulk variant for imports: a slug for every value, unique against the table and
+    against each other, with one query for the whole batch.
+    """
+    bases = [slug_base(model, value, field) for value in values]
+    taken = taken_slugs(model._default_manager.using(using), bases, field) if bases else set()
+    slugs = []
+    for base in bases:
+        slug = next_free(base, taken)
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def save_with_unique_slug(instance, value: str, save, field: str = 'slug', attempts: int = 3) -> None:
+    """
+    Allocate a slug for `value` if the instance has none, then run `save()`.
+
+    Two concurrent creates can pick the same free slug; the loser hits the unique
+    constraint, and its save is retried with a freshly allocated slug.
+    """
+    if getattr(instance, field) or not value:
+        return save()
+
+    using = instance._state.db or 'default'
+    for attempt in range(attempts):
+        setattr(instance, field, unique_slug(instance, value, field))
+        try:
+            with transaction.atomic(using=using):
+                return save()
+        except IntegrityError:
+            queryset = type(instance)._default_manager.using(using).exclude(pk=instance.pk)
+            if attempt + 1 == attempts or not queryset.filter(**{field: getattr(instance, field)}).exists():
+                raise
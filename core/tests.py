@@ -0,0 +1,487 @@
+import json
+import time
+from unittest import mock
+import random
+import threading
+from io import BytesIO
+from datetime import timedelta
+from decimal import Decimal
+from http.server import ThreadingHTTPServer
+from http.server import BaseHTTPRequestHandler
+import stripe
+from PIL import Image
+import requests
+import paypalrestsdk
+from django.apps import apps
+from django.db import connection
+from django.db import transaction
+from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import SimpleTestCase
+from django.test import override_settings
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from rest_framework.test import APIRequestFactory
+
+from Cart.views import CartModelViewSet
+from Cart.views import CartItemModelViewSet
+from Cart.views import OrderModelViewSet
+from Cart.views import OrderItemModelViewSet
+from Cart.models import CartItemModel
+from Cart.models import OrderModel
+from Ledger.models import JournalEntryModel
+from ChatBot.views import ChatSessionViewSet
+from ChatBot.views import ChatBotViewSet
+from ChatBot.models import ChatSession
+from ChatBot.models import ChatMessage
+from Product.views import ProductViewSet
+from Article.views import ArticleViewSet
+from Payment.gateways import StripeGatewayClient
+from Payment.gateways import PayPalGatewayApi
+
+from . import outbox
+from .gateway import GatewayClient
+from .gateway import CircuitOpenError
+from .metrics import metrics
+from .models import SequenceModel
+from .sequence import NumberAllocator
+from .sequence import create_counter
+from .paymentprocessor import PaymentProcessor
+from .paymentprocessor import PAYPAL_PAYMENT_SPEC
+from .management.commands.bench_payment_processor import checkout_session
+from .management.commands.bench_payment_processor import flattened_payment_data
+from .models import OutboxMessageModel
+from .imageencoding import ImageBudgetError
+from .imageencoding import encode_within
+from .imageencoding import load_thumbnail
+from .queryplan import explain
+from .queryplan import full_scans
+
+
+User = get_user_model()
+
+
+
+class QueryPlanTest(TestCase):
+    """
+    The hot queries of every viewset must be served by an index. A new filter, or a
+    dropped index, that turns one of them into a full table scan fails here with its plan.
+    """
+    # queries meant to walk a whole index (an ORDER BY over every row, ...), by name
+    INDEX_WALKS = set()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='planner', email='planner@example.com', password='pass1234')
+
+    def view_queryset(self, viewset, params=None):
+        """ The filtered queryset `viewset` lists for a regular user. """
+        request         = Request(APIRequestFactory().get('/', params or {}))
+        request.user    = self.user
+        view            = viewset(request=request, format_kwarg=None, action='list', kwargs={})
+        return view.filter_queryset(view.get_queryset())
+
+    def assertIndexed(self, name, queryset):
+        scans = full_scans(queryset, allow_index_scan=name in self.INDEX_WALKS)
+        self.assertEqual(scans, [], f'{name} scans {", ".join(scans)}:\n{explain(queryset)}')
+
+    def test_viewset_queries(self):
+        now = timezone.now()
+        queries = {
+            'cart list':                self.view_queryset(CartModelViewSet),
+            'cart item list':           self.view_queryset(CartItemModelViewSet),
+            'cart item lookup':         CartItemModel.objects.filter(cart_id=1, product_id=1),
+            'order list':               self.view_queryset(OrderModelViewSet),
+            'open order':               OrderModel.objects.filter(author=self.user).exclude(ord_status='completed'),
+            'unpaid orders':            OrderModel.objects.filter(author=self.user, payment_status='unpaid'),
+            'order item list':          self.view_queryset(OrderItemModelViewSet),
+            'trial balance':            JournalEntryModel.objects.filter(status='posted', created__gte=now - timedelta(days=30), created__lte=now),
+            'chat session list':        self.view_queryset(ChatSessionViewSet),
+            "today's chat session":     ChatSession.objects.filter(author=self.user, created__date=now.date()),
+            'chat message list':        self.view_queryset(ChatBotViewSet),
+            'session messages':         ChatMessage.objects.filter(session=1).order_by('created'),
+            'product by uid':           self.view_queryset(ProductViewSet, {'q': 'abc'}),
+            'products in category':     self.view_queryset(ProductViewSet, {'category': '1', 'is_available': 'true'}),
+            'article by uid':           self.view_queryset(ArticleViewSet, {'q': 'abc'}),
+        }
+        for name, queryset in queries.items():
+            with self.subTest(name):
+                self.assertIndexed(name, queryset)
+
+    def test_detects_full_scan(self):
+        self.assertEqual(full_scans(OrderModel.objects.filter(shipping_status='pending')), [OrderModel._meta.db_table])
+        if connection.vendor == 'sqlite':
+            # every order read in order_num order is a full walk of its unique index
+            walk = OrderModel.objects.order_by('order_num').values('order_num')
+            self.assertEqual(full_scans(walk), [OrderModel._meta.db_table])
+            self.assertEqual(full_scans(walk, allow_index_scan=True), [])
+
+
+
+class OutboxTest(TestCase):
+    """ Messages are written with the caller's transaction, retried with backoff and parked when dead. """
+
+    def setUp(self):
+        self.calls = []
+        outbox.register('test.record')(self.calls.append)
+        outbox.register('test.broken')(self.broken)
+        for topic in ('test.record', 'test.broken'):
+            self.addCleanup(outbox._handlers.pop, topic, None)
+
+    def broken(self, payload):
+        OutboxMessageModel.objects.create(topic='test.side-effect')
+        raise ConnectionError('smtp down')
+
+    def test_enqueue_follows_transaction(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                outbox.enqueue('test.record', {'n': 1})
+                raise RuntimeError
+        self.assertFalse(OutboxMessageModel.objects.exists())
+        with self.assertRaises(LookupError):
+            outbox.enqueue('test.unknown')
+
+    def test_drain_in_batches(self):
+        for n in range(5):
+            outbox.enqueue('test.record', {'n': n})
+        self.assertEqual(outbox.drain(batch_size=2), {'done': 5, 'failed': 0})
+        self.assertEqual([call['n'] for call in self.calls], [0, 1, 2, 3, 4])
+
+        stats = outbox.outbox_stats()
+        self.assertEqual((stats['done'], stats['pending'], stats['done_last_minute'], stats['lag_seconds']), (5, 0, 5, 0))
+        self.assertEqual(outbox.drain(), {'done': 0, 'failed': 0})
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2, OUTBOX_BACKOFF_BASE=60)
+    def test_retry_then_dead(self):
+        message = outbox.enqueue('test.broken')
+        self.assertEqual(outbox.drain(), {'done': 0, 'failed': 1})
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('pending', 1))
+        self.assertIn('smtp down', message.last_error)
+        self.assertGreaterEqual(message.available_at, message.modified + timedelta(seconds=30))
+        # the handler's own writes were rolled back with the failure
+        self.assertFalse(OutboxMessageModel.objects.filter(topic='test.side-effect').exists())
+
+        # not due yet, then due
+        self.assertEqual(outbox.drain(), {'done': 0, 'failed': 0})
+        OutboxMessageModel.objects.filter(pk=message.pk).update(available_at=timezone.now())
+        self.assertEqual(outbox.drain(), {'done': 0, 'failed': 1})
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('dead', 2))
+
+        self.assertEqual(outbox.requeue_dead('test.broken'), 1)
+        self.assertEqual(OutboxMessageModel.objects.get(pk=message.pk).status, 'pending')
+
+    def test_expired_lease_is_reclaimed(self):
+        message = outbox.enqueue('test.record', {'n': 1})
+        self.assertEqual(len(outbox.claim('worker-a', 10)), 1)
+        self.assertEqual(outbox.claim('worker-b', 10), [])
+
+        OutboxMessageModel.objects.filter(pk=message.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(outbox.drain(worker='worker-b'), {'done': 1, 'failed': 0})
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts, message.locked_by), ('done', 2, 'worker-b'))
+
+    def test_lost_lease_rolls_back_handler(self):
+        outbox.register('test.write')(lambda payload: OutboxMessageModel.objects.create(topic='test.side-effect'))
+        self.addCleanup(outbox._handlers.pop, 'test.write', None)
+        message = outbox.enqueue('test.write')
+        stale, = outbox.claim('worker-a', 10)
+        OutboxMessageModel.objects.filter(pk=message.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(outbox.claim('worker-b', 10)), 1)
+
+        with self.assertLogs('core.outbox', level='WARNING'):
+            self.assertFalse(outbox.process(stale))
+        self.assertFalse(OutboxMessageModel.objects.filter(topic='test.side-effect').exists())
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.locked_by, message.last_error), ('processing', 'worker-b', ''))
+
+    def test_own_transaction_handler_keeps_its_commits(self):
+        outbox.register('test.own', atomic=False)(self.broken)
+        self.addCleanup(outbox._handlers.pop, 'test.own', None)
+        self.addCleanup(outbox._own_transactions.discard, 'test.own')
+        message = outbox.enqueue('test.own')
+
+        self.assertEqual(outbox.drain(limit=1), {'done': 0, 'failed': 1})
+        self.assertTrue(OutboxMessageModel.objects.filter(topic='test.side-effect').exists())
+        message.refresh_from_db()
+        self.assertEqual(message.status, 'pending')
+
+    def test_metrics_endpoint(self):
+        outbox.enqueue('test.record')
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='staff', email='staff@example.com', password='pass1234', is_staff=True))
+        self.assertEqual(client.get('/api/v1/metrics/').status_code, 403)
+
+        client.force_authenticate(User.objects.create_superuser(username='root', email='root@example.com', password='pass1234'))
+        response = client.get('/api/v1/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['outbox']['pending'], 1)
+        self.assertIn('counters', response.data['process'])
+
+
+
+
+class FakeGatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        self.server.calls.append((self.command, self.path.split('?')[0], self.client_address[1]))
+        script = self.server.routes.get(self.path.split('?')[0], [(404, {}, 0)])
+        status, body, delay = script.pop(0) if len(script) > 1 else script[0]
+        time.sleep(delay)
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+
+class FakeGateway(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass    # clients hanging up on slow answers (deadline tests)
+
+
+
+class GatewayTest(SimpleTestCase):
+    """
+    The gateway client against a local fake server: `routes[path]` lists the
+    (status, body, delay) answers of consecutive calls, the last one repeating.
+    """
+
+    def setUp(self):
+        self.server = FakeGateway(('127.0.0.1', 0), FakeGatewayHandler)
+        self.server.calls, self.server.routes = [], {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url    = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.client = GatewayClient('fake', retry_backoff=0.01, breaker_threshold=3, breaker_reset=0.2)
+        self.addCleanup(self.client.close)
+
+    def test_keep_alive_and_latency(self):
+        self.server.routes['/ok'] = [(200, {'ok': True}, 0)]
+        for _ in range(3):
+            self.assertEqual(self.client.request('GET', f'{self.url}/ok').json(), {'ok': True})
+        # one pooled connection served every call
+        self.assertEqual(len({port for _, _, port in self.server.calls}), 1)
+        self.assertGreaterEqual(metrics.snapshot()['histograms']['gateway.fake.seconds']['count'], 3)
+
+    def test_deadline(self):
+        self.server.routes['/slow'] = [(200, {}, 1)]
+        started = time.monotonic()
+        with self.assertRaises(requests.exceptions.Timeout):
+            self.client.request('POST', f'{self.url}/slow', deadline=0.2)
+        self.assertLess(time.monotonic() - started, 0.9)
+
+    def test_retries_only_idempotent_calls(self):
+        self.server.routes['/flaky'] = [(503, {}, 0), (502, {}, 0), (200, {'ok': True}, 0)]
+        self.assertEqual(self.client.request('GET', f'{self.url}/flaky').status_code, 200)
+        self.assertEqual(len(self.server.calls), 3)
+
+        self.server.routes['/flaky'] = [(503, {}, 0), (200, {}, 0)]
+        self.assertEqual(self.client.request('POST', f'{self.url}/flaky').status_code, 503)
+        self.assertEqual(self.client.request('POST', f'{self.url}/flaky', headers={'Idempotency-Key': 'k1'}).status_code, 200)
+
+    def test_circuit_breaker(self):
+        self.server.routes['/down'] = [(500, {}, 0)]
+        self.server.routes['/ok'] = [(200, {}, 0)]
+        for _ in range(3):
+            self.client.request('POST', f'{self.url}/down')
+        with self.assertRaises(CircuitOpenError):
+            self.client.request('GET', f'{self.url}/ok')
+        self.assertEqual(len(self.server.calls), 3)
+
+        # after the reset timeout one probe goes through and closes the circuit
+        time.sleep(0.25)
+        self.assertEqual(self.client.request('GET', f'{self.url}/ok').status_code, 200)
+        self.assertEqual(self.client.breaker.state, 'closed')
+
+    def test_sdk_adapters(self):
+        self.server.routes['/v1/checkout/sessions/cs_test_1'] = [(200, {'id': 'cs_test_1', 'object': 'checkout.session'}, 0)]
+        self.server.routes['/v1/oauth2/token'] = [(200, {'access_token': 'token', 'token_type': 'Bearer', 'expires_in': 3600}, 0)]
+        self.server.routes['/v1/payments/payment/PAY-1'] = [(200, {'id': 'PAY-1', 'state': 'approved'}, 0)]
+
+        client  = stripe.StripeClient('sk_test', http_client=StripeGatewayClient(), base_addresses={'api': self.url})
+        session = client.checkout.sessions.retrieve('cs_test_1')
+        self.assertEqual(session.id, 'cs_test_1')
+
+        api     = PayPalGatewayApi(mode='sandbox', client_id='id', client_secret='secret', endpoint=self.url)
+        payment = paypalrestsdk.Payment.find('PAY-1', api=api)
+        self.assertEqual(payment.state, 'approved')
+        self.assertIn('gateway.stripe.seconds', metrics.snapshot()['histograms'])
+        self.assertIn('gateway.paypal.seconds', metrics.snapshot()['histograms'])
+
+
+
+
+class PaymentProcessorTest(SimpleTestCase):
+    """ The extraction specs read the same fields the whole-payload flattening did. """
+
+    def test_stripe_session(self):
+        payloads = [checkout_session(index, line_items) for index, line_items in enumerate((0, 3, 50))]
+        payloads.append({'id': 'cs_test_bare'})
+        self.assertEqual(PaymentProcessor.batch(payloads), [flattened_payment_data(payload) for payload in payloads])
+        self.assertEqual(PaymentProcessor(payloads[1]).get_payment_data()['amount_paid'], 3000)
+        self.assertEqual(PaymentProcessor(payloads[1]).flat_data['line_items.data[2].price.product.name'], 'Product 2')
+
+        # a value that cannot be coerced empties that payload only
+        self.assertEqual(PaymentProcessor.batch([{'metadata': {'order_id': 'x'}}, payloads[0]])[0], {})
+
+    def test_paypal_payment(self):
+        payment = {
+            'id': 'PAYID-1', 'state': 'approved',
+            'payer': {'payer_info': {'payer_id': 'PAYER1', 'email': 'payer@example.com', 'first_name': 'Pat', 'last_name': 'Payer'}},
+            'transactions': [{
+                'amount': {'total': '42.50', 'currency': 'USD'},
+                'item_list': {'items': [{'name': 'Order #7', 'sku': 'order_7', 'price': '42.50', 'currency': 'USD', 'quantity': 1}]},
+            }],
+        }
+        self.assertEqual(PaymentProcessor(payment, spec=PAYPAL_PAYMENT_SPEC).get_payment_data(), {
+            'order_id': 7, 'amount_paid': Decimal('42.50'), 'currency': 'USD', 'paypal_payment_id': 'PAYID-1',
+            'paypal_payer_id': 'PAYER1', 'paypal_payment_status': 'approved', 'customer_email': 'payer@example.com',
+            'customer_name': 'Pat Payer',
+        })
+
+
+
+class FakeSequenceCursor:
+    """ Answers the two queries of NumberAllocator's Postgres path like a sequence with INCREMENT `increment`. """
+
+    def __init__(self, increment: int, start: int):
+        self.increment, self.next_value, self.rows, self.queries = increment, start, [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self.queries.append(sql)
+        if 'pg_sequences' in sql:
+            self.rows = [(self.increment,)]
+            return
+        self.rows = [(self.next_value + block * self.increment,) for block in range(params[1])]
+        self.next_value += params[1] * self.increment
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+
+
+class NumberAllocatorTest(TransactionTestCase):
+    """ Numbers come in per-worker blocks outside transactions and exactly inside them. """
+
+    def test_blocks_are_reused(self):
+        worker_a = NumberAllocator('test_blocks', seed=lambda: 100, block_size=10)
+        worker_b = NumberAllocator('test_blocks', block_size=10)
+        self.assertEqual(worker_a.next(), 100)
+        self.assertEqual(worker_b.next(), 110)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(worker_a.allocate(9), list(range(101, 110)))
+        self.assertEqual(worker_a.allocate(3), [120, 121, 122])
+        self.assertEqual(SequenceModel.objects.get(name='test_blocks').value, 129)
+
+    def test_seed_is_read_once(self):
+        seed = mock.Mock(return_value=5000)
+        allocator = NumberAllocator('test_seed', seed=seed, block_size=2)
+        self.assertEqual(allocator.allocate(5), [5000, 5001, 5002, 5003, 5004])
+        self.assertEqual(NumberAllocator('test_seed', seed=seed).next(), 5005)
+        seed.assert_called_once_with()
+
+    def test_exact_inside_transaction(self):
+        allocator = NumberAllocator('test_atomic', seed=lambda: 1, block_size=10)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.assertEqual(allocator.allocate(2), [1, 2])
+                raise RuntimeError
+        # nothing was cached from the rolled-back bump, so the numbers are handed out again
+        self.assertEqual(allocator.next(), 1)
+        with transaction.atomic():
+            self.assertEqual(allocator.next(), 2)
+
+    def test_counter_created_by_migration(self):
+        create_counter(apps, connection, 'test_migrated', start=700)
+        create_counter(apps, connection, 'test_migrated', start=1)
+        seed = mock.Mock(return_value=1)
+        self.assertEqual(NumberAllocator('test_migrated', seed=seed).next(), 700)
+        seed.assert_not_called()
+
+    def test_postgres_sequence_blocks(self):
+        cursor      = FakeSequenceCursor(increment=10, start=500)
+        allocator   = NumberAllocator('test_pg')
+        with mock.patch('core.sequence.connections', {'default': mock.Mock(vendor='postgresql', cursor=lambda: cursor)}):
+            with transaction.atomic():
+                self.assertEqual(allocator.allocate(3), [500, 501, 502])
+            self.assertEqual(allocator.allocate(10), [503, 504, 505, 506, 507, 508, 509, 510, 511, 512])
+            self.assertEqual(allocator.allocate(25), list(range(513, 538)))
+        self.assertEqual(sum('pg_sequences' in query for query in cursor.queries), 1)
+        self.assertEqual(len(cursor.queries), 4)
+
+
+
+class ImageEncodingTest(SimpleTestCase):
+    """
+    encode_within returns the highest quality under the byte cap, stops at the quality
+    floor, and leaves sources already under the cap at full quality.
+    """
+
+    def noise(self, size=(256, 256)):
+        return Image.frombytes('RGB', size, random.Random(0).randbytes(size[0] * size[1] * 3))
+
+    def size_at(self, image, quality):
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', quality=quality)
+        return buffer.tell()
+
+    def test_highest_quality_within_cap(self):
+        image   = self.noise()
+        cap     = (self.size_at(image, 95) + self.size_at(image, 50)) // 2
+        result  = encode_within(image, cap)
+        self.assertLessEqual(len(result.buffer.getvalue()), cap)
+        self.assertLess(result.quality, 95)
+        self.assertGreater(self.size_at(image, result.quality + 5), cap)
+        self.assertEqual(result.buffer.tell(), 0)
+        self.assertLess(result.attempts, len(range(95, 29, -5)))
+
+    def test_quality_floor(self):
+        image = self.noise()
+        with self.assertRaises(ImageBudgetError):
+            encode_within(image, 100)
+        result = encode_within(image, 100, min_quality=30, strict=False)
+        self.assertEqual(result.quality, 30)
+        self.assertEqual(len(result.buffer.getvalue()), self.size_at(image, 30))
+
+    def test_source_under_cap(self):
+        image   = Image.new('RGB', (64, 64), 'white')
+        result  = encode_within(image, 100 * 1024)
+        self.assertEqual((result.quality, result.attempts), (95, 1))
+
+    def test_load_thumbnail(self):
+        source = BytesIO()
+        Image.new('RGBA', (400, 800), (255, 0, 0, 128)).save(source, format='PNG')
+        with load_thumbnail(source, (300, 300)) as image:
+            self.assertEqual((image.mode, image.size, image.format), ('RGB', (150, 300), 'PNG'))
+
+        source = BytesIO()
+        self.noise((1200, 600)).save(source, format='JPEG')
+        with load_thumbnail(source, (300, None)) as image:
+            self.assertEqual((image.size, image.format), ((300, 150), 'JPEG'))
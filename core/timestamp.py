@@ -1,4 +1,5 @@
 from django.db import models 
+from django.db.models.functions import Now
 
 
 class TimeStampModel(models.Model):
@@ -9,4 +10,34 @@ class TimeStampModel(models.Model):
     modified = models.DateTimeField(auto_now=True)
 
     class Meta:
-        abstract = True 
\ No newline at end of file
+        abstract = True 
+
+
+
+def touched(model, **changes) -> dict:
+    """
+    `changes` plus `modified=Now()` on timestamped models, for queryset UPDATEs (which
+    bypass auto_now), so ETags and Last-Modified see the update.
+    """
+    if any(field.name == 'modified' for field in model._meta.concrete_fields):
+        changes['modified'] = Now()
+    return changes
+
+
+
+def touch_m2m_owners(model, field: str, instance, action: str, reverse: bool, pk_set, using: str) -> None:
+    """
+    `m2m_changed` handler for `model.<field>`: touch `modified` of the `model` rows whose
+    set changed, so their ETags change with it. Called from either side of the relation;
+    a reverse `clear()` is handled on `pre_clear`, while its rows can still be found.
+    """
+    rows = model._default_manager.using(using)
+    if action in ('post_add', 'post_remove') and pk_set:
+        rows = rows.filter(pk__in=pk_set) if reverse else rows.filter(pk=instance.pk)
+    elif action == 'post_clear' and not reverse:
+        rows = rows.filter(pk=instance.pk)
+    elif action == 'pre_clear' and reverse:
+        rows = rows.filter(**{field: instance})
+    else:
+        return
+    rows.update(**touched(model))
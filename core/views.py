@@ -0,0 +1,22 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+
+from .core_permissions import IsSuperUser
+from .gateway import gateway_stats
+from .metrics import metrics
+from .outbox import outbox_stats
+
+
+
+class MetricsView(APIView):
+    """
+    Operational metrics (superusers only): the outbox backlog, lag and throughput
+    across all workers (read from the table), the circuit state of the payment gateways,
+    and the counters and latency histograms (`gateway.<name>.seconds`, ...) of this web
+    process only. Handler timings are recorded by the worker processes, which report
+    them from `run_outbox_worker`.
+    """
+    permission_classes = [IsSuperUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response({'outbox': outbox_stats(), 'gateways': gateway_stats(), 'process': metrics.snapshot()})
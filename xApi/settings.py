@@ -19,6 +19,8 @@ ALLOWED_HOSTS =  config('ALLOWED_HOSTS', default='localhost,127.0.0.1').split(',
 
 # for payment gateway 
 stripe.api_key = config('STRIPE_TEST_SECRET_KEY') 
+# signing secret of the /api/v1/stripe/webhook/ endpoint (whsec_...)
+STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
 
 # for paypal payment gateway 
 PAYPAL_MODE = 'sandbox'
@@ -54,6 +56,7 @@ INSTALLED_APPS = [
     'channels',
     # 'daphne',
     'corsheaders',
+    'core',
     'Authentication',
     'Product',
     'Cart',
@@ -143,16 +146,92 @@ TEMPLATES = [
 WSGI_APPLICATION = 'xApi.wsgi.application'
 
 ASGI_APPLICATION = 'xApi.asgi.application'
+REDIS_HOST = config('REDIS_HOST', default='localhost')
+REDIS_PORT = config('REDIS_PORT', default=6379, cast=int)
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channelS_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [(config('REDIS_HOST', default='localhost'), config('REDIS_PORT', default=6379, cast=int))],
+            "hosts": [(REDIS_HOST, REDIS_PORT)],
         },
     },
 }
 
 
+# Response cache for the catalog endpoints (core.cache). Writes invalidate it by bumping
+# version counters in the cache, so it has to be shared by every worker process:
+# CACHE_BACKEND defaults to redis when REDIS_HOST is configured (configure
+# `maxmemory-policy allkeys-lru` there for LRU eviction); 'file' (one host) and 'db'
+# (run `createcachetable` first) share it too, under CACHE_LOCATION. 'locmem' is per
+# process, so responses are only cached with it when RESPONSE_CACHE=True (one process).
+CACHE_BACKEND = config('CACHE_BACKEND', default='redis' if config('REDIS_HOST', default='') else 'locmem')
+CACHE_MAX_ENTRIES = config('CACHE_MAX_ENTRIES', default=5000, cast=int)
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': f"redis://{REDIS_HOST}:{REDIS_PORT}/{config('REDIS_CACHE_DB', default=1, cast=int)}",
+        },
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / '.cache')),
+            'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+        },
+    }
+elif CACHE_BACKEND == 'db':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': config('CACHE_LOCATION', default='xapi_cache'),
+            'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'xapi-response-cache',
+            'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+        },
+    }
+RESPONSE_CACHE = config('RESPONSE_CACHE', default=CACHE_BACKEND != 'locmem', cast=bool)
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+
+# View/sold counters (core.counters): buffered per worker ('memory') or shared ('redis'),
+# written to the database every COUNTER_FLUSH_INTERVAL seconds (0 = only by `flush_counters`)
+COUNTER_BACKEND = config('COUNTER_BACKEND', default='memory')
+COUNTER_REDIS_DB = config('COUNTER_REDIS_DB', default=2, cast=int)
+COUNTER_FLUSH_INTERVAL = config('COUNTER_FLUSH_INTERVAL', default=30, cast=int)
+
+# Transactional outbox (core.outbox), drained by `python manage.py run_outbox_worker`. A failed
+# message is retried after OUTBOX_BACKOFF_BASE * 2**(attempt - 1) seconds (jittered, capped at
+# OUTBOX_BACKOFF_MAX) and marked dead after OUTBOX_MAX_ATTEMPTS; a worker's lease on a batch
+# expires after OUTBOX_LEASE_SECONDS
+OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', default=100, cast=int)
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=8, cast=int)
+OUTBOX_BACKOFF_BASE = config('OUTBOX_BACKOFF_BASE', default=10, cast=int)
+OUTBOX_BACKOFF_MAX = config('OUTBOX_BACKOFF_MAX', default=3600, cast=int)
+OUTBOX_LEASE_SECONDS = config('OUTBOX_LEASE_SECONDS', default=300, cast=int)
+
+# Payment gateway HTTP clients (core.gateway): timeouts and deadline in seconds, keep-alive
+# pool size, retries of idempotent calls, and the circuit breaker (opens after
+# `breaker_threshold` consecutive failures, probes again after `breaker_reset` seconds).
+# GATEWAYS overrides them per gateway, e.g. {'paypal': {'read_timeout': 20}}
+GATEWAY_DEFAULTS = {
+    'connect_timeout': config('GATEWAY_CONNECT_TIMEOUT', default=3.05, cast=float),
+    'read_timeout': config('GATEWAY_READ_TIMEOUT', default=10, cast=float),
+    'deadline': config('GATEWAY_DEADLINE', default=15, cast=float),
+    'pool_size': config('GATEWAY_POOL_SIZE', default=10, cast=int),
+    'retries': config('GATEWAY_RETRIES', default=2, cast=int),
+    'breaker_threshold': config('GATEWAY_BREAKER_THRESHOLD', default=5, cast=int),
+    'breaker_reset': config('GATEWAY_BREAKER_RESET', default=30, cast=float),
+}
+GATEWAYS = {}
+
+
 # for any cloude database 
 DATABASES = {
     'default': {
@@ -201,6 +280,18 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Image pipeline: 'thread', 'process' or 'sync' (inline, for tests/debugging)
+IMAGE_PIPELINE_BACKEND = config('IMAGE_PIPELINE_BACKEND', default='thread')
+IMAGE_PIPELINE_WORKERS = config('IMAGE_PIPELINE_WORKERS', default=2, cast=int)
+
+# Responsive product image renditions: widths in px and formats, best format first
+PRODUCT_IMAGE_WIDTHS = [160, 400, 800]
+PRODUCT_IMAGE_FORMATS = ['WEBP', 'JPEG']
+PRODUCT_IMAGE_QUALITY = 80
+
+# Price range edges for the product `price` facet
+PRODUCT_PRICE_FACETS = [0, 25, 50, 100, 250, 500]
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
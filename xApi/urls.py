@@ -39,6 +39,7 @@ urlpatterns = api_dcoumentaion_urls + [
     path(API_URL, include('Ledger.urls')), 
     path(API_URL, include('Message.urls')), 
     path(API_URL, include('ChatBot.urls')), 
+    path(API_URL, include('core.urls')),
 ]
 
 